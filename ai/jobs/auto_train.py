@@ -1,29 +1,19 @@
 import sys
 
-from ai.src.train_price import train_price_model
-from ai.src.train_direction import train_direction_model
 from ai.src.market_cap import get_supported
+from ai.src.train_pool import run
 
 INTERVALS = ["1h", "1d", "1w"]
 DEFAULT_HORIZON = 1
 
 
-def train_symbol_all(symbol: str, horizons):
-    print(f"[TRAIN] {symbol}")
-
-    for interval in INTERVALS:
-        for h in horizons:
-            print(f"  -> interval={interval} horizon={h}")
-            train_price_model(symbol, interval, h)
-            train_direction_model(symbol, interval, h)
-
-    print(f"[TRAINED] {symbol}")
-
-
 if __name__ == "__main__":
 
-    if len(sys.argv) > 1:
-        horizons = [int(sys.argv[1])]
+    force = "--force" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--force"]
+
+    if args:
+        horizons = [int(args[0])]
     else:
         horizons = [DEFAULT_HORIZON]
 
@@ -33,5 +23,9 @@ if __name__ == "__main__":
 
     print(f"[AUTO TRAIN] symbols={len(symbols)} horizons={horizons}")
 
-    for symbol in symbols:
-        train_symbol_all(symbol, horizons)
\ No newline at end of file
+    # 銘柄 × インターバルごとのジョブをプロセスプールで学習する
+    run([
+        {"symbol": symbol, "interval": interval, "horizons": horizons, "force": force}
+        for symbol in symbols
+        for interval in INTERVALS
+    ])
\ No newline at end of file
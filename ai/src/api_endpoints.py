@@ -0,0 +1,33 @@
+# ai/src/api_endpoints.py
+#
+# 外部 API のベース URL。
+#
+# 個別に BINANCE_API_URL などで上書きできる。
+# API_STANDIN_URL を設定すると全 API をローカルのスタンドイン
+# （ai.src.replay_server）に向ける: {API_STANDIN_URL}/binance/... など。
+
+import os
+
+
+API_STANDIN_URL = os.getenv("API_STANDIN_URL", "").rstrip("/")
+
+
+def _base(name: str, env: str, default: str) -> str:
+    if os.getenv(env):
+        return os.getenv(env).rstrip("/")
+    if API_STANDIN_URL:
+        return f"{API_STANDIN_URL}/{name}"
+    return default
+
+
+BINANCE_API_URL = _base("binance", "BINANCE_API_URL", "https://api.binance.com")
+COINGECKO_API_URL = _base("coingecko", "COINGECKO_API_URL", "https://api.coingecko.com")
+COINBASE_API_URL = _base("coinbase", "COINBASE_API_URL", "https://api.coinbase.com")
+KRAKEN_API_URL = _base("kraken", "KRAKEN_API_URL", "https://api.kraken.com")
+
+UPSTREAMS = {
+    "binance": "https://api.binance.com",
+    "coingecko": "https://api.coingecko.com",
+    "coinbase": "https://api.coinbase.com",
+    "kraken": "https://api.kraken.com",
+}
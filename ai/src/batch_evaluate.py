@@ -1,11 +1,7 @@
-import pandas as pd
-import os
+from ai.src.kline_store import has_klines, read_klines
 from ai.src.repository.db import get_connection
 
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "ai", "data", "raw")
-
 INTERVAL_MS = {
     "1h": 60 * 60 * 1000,
     "1d": 24 * 60 * 60 * 1000,
@@ -13,11 +9,10 @@ INTERVAL_MS = {
 }
 
 
-def load_csv(symbol, timeframe):
-    path = f"{DATA_DIR}/{symbol}_{timeframe}.csv"
-    if not os.path.exists(path):
+def load_klines(symbol, timeframe):
+    if not has_klines(symbol, timeframe):
         return None
-    return pd.read_csv(path)
+    return read_klines(symbol, timeframe)
 
 
 def evaluate_predictions():
@@ -40,17 +35,11 @@ def evaluate_predictions():
         horizon = row["horizon"]
         predict_time = row["predict_time"]  # これはミリ秒
 
-        df = load_csv(symbol, timeframe)
+        df = load_klines(symbol, timeframe)
         if df is None:
             continue
 
-        # 🔥 open_time を確実にミリ秒へ変換
-        df["open_time"] = pd.to_datetime(df["open_time"], utc=True)
-        df["open_time"] = df["open_time"].apply(
-            lambda x: int(x.timestamp() * 1000)
-        )
-
-        df = df.sort_values("open_time").reset_index(drop=True)
+        # open_time はストア側で epoch ms・昇順に正規化済み
 
         interval_ms = INTERVAL_MS.get(timeframe)
         if interval_ms is None:
@@ -1,17 +1,13 @@
 # ai/src/binance_symbols.py
 
-import json
-from pathlib import Path
+from ai.src import universe
 
-PATH = Path("ai/data/binance_symbols.json")
 
-
-def load_binance_symbols() -> set[str]:
-    if not PATH.exists():
+def load_binance_symbols() -> frozenset[str]:
+    try:
+        return universe.usdt_trading_symbols()
+    except FileNotFoundError:
         raise FileNotFoundError(
             "Binance symbols cache not found. "
             "Run ai/src/cache_binance_symbols.py first."
         )
-
-    data = json.loads(PATH.read_text())
-    return set(data.get("symbols", []))
@@ -1,42 +1,18 @@
 # ai/src/cache_binance_symbols.py
 
-import json
-import requests
-from pathlib import Path
-
-OUTPUT = Path("ai/data/binance_symbols.json")
-BINANCE_EXCHANGE_INFO = "https://api.binance.com/api/v3/exchangeInfo"
+from ai.src import universe
 
 
 def main():
     print("[BINANCE] fetching exchangeInfo")
 
-    r = requests.get(BINANCE_EXCHANGE_INFO, timeout=30)
-    r.raise_for_status()
-
-    data = r.json()
-
-    symbols = [
-        s["symbol"]
-        for s in data["symbols"]
-        if s["status"] == "TRADING"
-        and s["quoteAsset"] == "USDT"
-        and s["symbol"].endswith("USDT")
-    ]
-
-    OUTPUT.parent.mkdir(parents=True, exist_ok=True)
-    OUTPUT.write_text(
-        json.dumps(
-            {
-                "count": len(symbols),
-                "symbols": symbols,
-            },
-            indent=2,
-        )
-    )
+    # TTL 内ならスナップショットを再利用（ETag による条件付き取得）
+    universe.refresh("exchange_info")
+
+    symbols = universe.usdt_trading_symbols()
 
     print(f"[BINANCE] cached {len(symbols)} USDT symbols")
-    print(f"[BINANCE] output => {OUTPUT}")
+    print(f"[BINANCE] output => {universe.snapshot_path('exchange_info')}")
 
 
 if __name__ == "__main__":
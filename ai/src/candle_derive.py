@@ -0,0 +1,151 @@
+# ai/src/candle_derive.py
+#
+# 上位足の導出エンジン（1h → 4h / 1d / 1w）。
+#
+# 全銘柄の 1h 足を1枚のパネル（銘柄順 × 時刻順）に並べ、
+# (銘柄, バケット) の境界で np.*.reduceat をかけて全上位足を一括で集計する。
+#
+# 増分更新:
+#   各上位足のウォーターマーク（最終 open_time = 未確定かもしれない最後のバケット）以降だけを
+#   元データから読み直して集計し、upsert する。過去のバケットには触れない。
+#
+# バケットの境界は Binance と同じ（UTC 0時基準、週足は月曜始まり）。
+# 元データが途中からしか無いバケット（先頭の不完全なバケット）は作らない。
+
+import sys
+
+import numpy as np
+
+from ai.src.kline_store import (
+    INTERVAL_MS,
+    KLINE_DTYPE,
+    first_open_time,
+    last_open_time,
+    list_symbols,
+    read_since,
+    write_klines,
+)
+
+
+DERIVED_INTERVALS = {
+    "1h": ["4h", "1d", "1w"],
+    "1d": ["1w"],
+}
+
+# 1970-01-01 は木曜。最初の月曜は 1970-01-05
+WEEK_OFFSET_MS = 4 * INTERVAL_MS["1d"]
+
+
+def bucket_start(open_time: np.ndarray, interval: str) -> np.ndarray:
+    step = INTERVAL_MS[interval]
+    offset = WEEK_OFFSET_MS if interval == "1w" else 0
+    return (open_time - offset) // step * step + offset
+
+
+def _ceil_bucket(ms: int, interval: str) -> int:
+    start = int(bucket_start(np.array([ms], dtype=np.int64), interval)[0])
+    return start if start == ms else start + INTERVAL_MS[interval]
+
+
+def aggregate(rows: np.ndarray, group: np.ndarray, buckets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    連続する (group, bucket) ごとに OHLCV を集計する。
+    rows は group → open_time の順に並んでいること。
+
+    Returns:
+        (集計した足, 各足の group)
+    """
+    n = len(rows)
+    if n == 0:
+        return np.empty(0, dtype=KLINE_DTYPE), np.empty(0, dtype=group.dtype)
+
+    change = (group[1:] != group[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(np.r_[True, change])
+    ends = np.r_[starts[1:], n] - 1
+
+    out = np.empty(len(starts), dtype=KLINE_DTYPE)
+    out["open_time"] = buckets[starts]
+    out["open"] = rows["open"][starts]
+    out["high"] = np.maximum.reduceat(rows["high"], starts)
+    out["low"] = np.minimum.reduceat(rows["low"], starts)
+    out["close"] = rows["close"][ends]
+    out["volume"] = np.add.reduceat(rows["volume"], starts)
+
+    return out, group[starts]
+
+
+def derive(source: str = "1h", targets: list[str] | None = None, symbols: list[str] | None = None) -> dict:
+    """
+    source 足から targets 足を導出してストアへ upsert する。
+
+    Returns:
+        {target: 更新したバケット数}
+    """
+    targets = targets or DERIVED_INTERVALS[source]
+    symbols = symbols if symbols is not None else list_symbols(source)
+
+    # ---- 銘柄ごとの開始位置（ターゲットごとのしきい値） ----
+    thresholds = {t: np.zeros(len(symbols), dtype=np.int64) for t in targets}
+    panel = []
+    group = []
+
+    for i, symbol in enumerate(symbols):
+        first = first_open_time(symbol, source)
+        if first is None:
+            for t in targets:
+                thresholds[t][i] = np.iinfo(np.int64).max
+            continue
+
+        read_from = None
+        for t in targets:
+            thr = _ceil_bucket(first, t)
+            wm = last_open_time(symbol, t)
+            if wm is not None:
+                thr = max(thr, wm)
+            thresholds[t][i] = thr
+            read_from = thr if read_from is None else min(read_from, thr)
+
+        rows = read_since(symbol, source, read_from)
+        panel.append(rows)
+        group.append(np.full(len(rows), i, dtype=np.int32))
+
+    if not panel:
+        return {t: 0 for t in targets}
+
+    rows = np.concatenate(panel)
+    group = np.concatenate(group)
+
+    # ---- 全ターゲットを一括集計 ----
+    updated = {}
+    for t in targets:
+        buckets = bucket_start(rows["open_time"], t)
+        keep = buckets >= thresholds[t][group]
+
+        out, out_group = aggregate(rows[keep], group[keep], buckets[keep])
+
+        starts = np.flatnonzero(np.r_[True, out_group[1:] != out_group[:-1]]) if len(out) else []
+        ends = list(starts[1:]) + [len(out)]
+        for a, b in zip(starts, ends):
+            write_klines(symbols[out_group[a]], t, out[a:b])
+
+        updated[t] = len(out)
+
+    return updated
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "1h"
+
+    symbols = list_symbols(source)
+    print(f"Deriving {DERIVED_INTERVALS[source]} from {source} for {len(symbols)} symbols...\n")
+
+    updated = derive(source, symbols=symbols)
+
+    for interval, n in updated.items():
+        print(f"[OK] {interval}: {n} buckets updated")
+
+    print("\nDerivation completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# ai/src/candle_mmap.py
+#
+# API ワーカー用の読み取り専用ローソク足ビュー。
+#
+# kline_store.publish_snapshot() が書き出したスナップショットを np.load(mmap_mode="r")
+# でマップし、プロセス内で使い回す。複数ワーカーが同じファイルを mmap するため、
+# データはページキャッシュ上の1コピーだけを共有する。
+#
+# スナップショットは os.replace で差し替えられるので、stat の (inode, mtime) が
+# 変わったときだけマップし直す。
+
+import os
+import threading
+
+import numpy as np
+
+from ai.src.kline_store import read_array, snapshot_path
+
+
+_lock = threading.Lock()
+_maps: dict[tuple[str, str], tuple[tuple[int, int], np.ndarray]] = {}
+
+
+def _stat_key(path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def load_candles(symbol: str, interval: str) -> np.ndarray:
+    """
+    全期間のローソク足（構造化配列, 読み取り専用）を返す。
+    スナップショットが無い場合はストアから直接読む。
+    """
+    key = (symbol, interval)
+    path = snapshot_path(symbol, interval)
+    stat_key = _stat_key(path)
+
+    if stat_key is None:
+        return read_array(symbol, interval)
+
+    cached = _maps.get(key)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    with _lock:
+        cached = _maps.get(key)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+        arr = np.load(path, mmap_mode="r", allow_pickle=False)
+        _maps[key] = (stat_key, arr)
+        return arr
+
+
+def tail_candles(symbol: str, interval: str, points: int) -> np.ndarray:
+    """
+    末尾 points 本のビュー（コピーなし）。
+    """
+    return load_candles(symbol, interval)[-points:]
+
+
+def clear():
+    with _lock:
+        _maps.clear()
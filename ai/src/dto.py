@@ -1,11 +1,7 @@
-from pathlib import Path
 from datetime import datetime, timezone
-import pandas as pd
+from ai.src.candle_mmap import tail_candles
 from ai.src.repository.db import get_connection
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-DATA_DIR = BASE_DIR / "ai" / "data" / "raw"
-
 def get_actual_performance(symbol: str, interval: str):
     conn = get_connection()
     cur = conn.cursor(dictionary=True)
@@ -62,37 +58,26 @@ def get_actual_performance(symbol: str, interval: str):
         conn.close()
 
 def load_price_history(symbol: str, interval: str, points: int = 30):
-    path = DATA_DIR / f"{symbol}_{interval}.csv"
-    if not path.exists():
-        raise FileNotFoundError(f"CSV not found: {path}")
-    df = pd.read_csv(path)
-    if df.empty:
-        raise ValueError("Not enough price history")
-    prices = df["close"].astype(float).tolist()
-    if len(prices) < 2:
+    arr = tail_candles(symbol, interval, points)
+    if len(arr) < 2:
         raise ValueError("Not enough price history")
-    return prices[-points:]
+    return arr["close"].tolist()
 
 def build_candles_with_time(symbol: str, interval: str, points: int = 30):
-    path = DATA_DIR / f"{symbol}_{interval}.csv"
-    if not path.exists():
-        raise FileNotFoundError(f"CSV not found: {path}")
-    df = pd.read_csv(path)
-    if df.empty:
-        raise ValueError("CSV is empty")
-    df = df.tail(points)
-    candles = []
-    for _, row in df.iterrows():
-        ts = int(pd.Timestamp(row["open_time"]).timestamp() * 1000)
-        candles.append({
-            "time": ts,
+    arr = tail_candles(symbol, interval, points)
+    if len(arr) == 0:
+        raise ValueError("Klines are empty")
+    return [
+        {
+            "time": int(row["open_time"]),
             "open": float(row["open"]),
             "high": float(row["high"]),
             "low": float(row["low"]),
             "close": float(row["close"]),
             "volume": float(row["volume"]),
-        })
-    return candles
+        }
+        for row in arr
+    ]
 
 def build_prediction_dto(result: dict):
     history = load_price_history(result["symbol"], result["interval"])
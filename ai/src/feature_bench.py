@@ -0,0 +1,177 @@
+# ai/src/feature_bench.py
+#
+# make_features のバックエンド（pandas / numpy）の一致確認とマイクロベンチマーク。
+#
+#   python -m ai.src.feature_bench            # 合成データで一致確認 + 速度比較
+#   python -m ai.src.feature_bench 1h         # 保存済みの 1h 全銘柄でも一致確認
+#
+# 同じ基準のテストは tests/test_feature_kernels.py（numpy / pandas）と tests/test_features.py（tail / 全履歴）。
+#
+# 一致の基準: 同じ行（index）・同じ列・同じ dtype で、値は相対誤差 RTOL 以内
+# （rolling の和の取り方が pandas と違うので丸め誤差程度の差は出る）。
+# 窓内が同じ値だけの std は pandas 側に 1e-10 程度の残差が出て numpy 側は 0 になるので ATOL まで許す。
+#
+# tail モード（推論用）は同じバックエンドの全履歴の計算と比べる:
+#   EMA の列 … |差| / close が EMA_TOLERANCE 以内（feature_lookback の定義）
+#   その他   … 相対誤差 TAIL_RTOL 以内（pandas の rolling は開始行によって累積和の丸めが変わる）
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from ai.src.features import EMA_COLUMNS, EMA_TOLERANCE, make_features
+from ai.src.kline_store import INTERVAL_MS, KLINE_DTYPE, list_symbols, read_klines, to_frame
+
+
+RTOL = 1e-8
+ATOL = 1e-9
+TAIL_RTOL = 1e-6
+TAIL_ROWS = 64
+BENCH_SIZES = [64, 500, 5000, 50000]
+
+
+def synthetic_klines(n: int, seed: int = 0, interval: str = "1h") -> pd.DataFrame:
+    """
+    ランダムウォークに横ばい区間・出来高ゼロ・丸めた価格を混ぜたローソク足
+    （rolling の同値判定や pct_change のゼロ割りを通すため）。
+    1本あたりの変動は 1h で 1% とし、足の長さの平方根に比例させる（価格が 0 に寄らないようドリフトは打ち消す）。
+    """
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_MS[interval]
+    arr = np.zeros(n, dtype=KLINE_DTYPE)
+    arr["open_time"] = np.arange(n) * step
+
+    sigma = 0.01 * (step / INTERVAL_MS["1h"]) ** 0.5
+    close = np.cumprod(1 + rng.normal(sigma ** 2 / 2, sigma, n)) * 100
+    volume = rng.lognormal(3, 1, n)
+    for _ in range(max(1, n // 500) if n else 0):
+        s = int(rng.integers(0, n))
+        close[s:s + int(rng.integers(3, 40))] = close[s]
+        s = int(rng.integers(0, n))
+        volume[s:s + int(rng.integers(1, 20))] = 0
+        s = int(rng.integers(0, n))
+        close[s:s + 10] = np.round(close[s:s + 10])
+
+    arr["close"] = close
+    arr["open"] = np.roll(close, 1)
+    arr["high"] = close * 1.01
+    arr["low"] = close * 0.99
+    arr["volume"] = volume
+    return to_frame(arr)
+
+
+def compare(df: pd.DataFrame, tail=None) -> str | None:
+    """
+    一致すれば None、しなければ理由を返す。
+    """
+    a = make_features(df, tail=tail, backend="pandas")
+    b = make_features(df, tail=tail, backend="numpy")
+
+    if list(a.columns) != list(b.columns):
+        return f"columns differ: {list(b.columns)}"
+    if not a.index.equals(b.index):
+        return f"rows differ: {len(a)} vs {len(b)}"
+    if not a.dtypes.equals(b.dtypes):
+        return "dtypes differ"
+
+    x = a.to_numpy(dtype=np.float64)
+    y = b.to_numpy(dtype=np.float64)
+    if not np.allclose(x, y, rtol=RTOL, atol=ATOL, equal_nan=True):
+        err = np.abs(x - y) - ATOL - RTOL * np.abs(y)
+        j = int(np.nanargmax(np.nanmax(err, axis=0)))
+        return f"{a.columns[j]}: max abs err {np.nanmax(np.abs(x - y)[:, j]):.3g}"
+    return None
+
+
+def compare_tail(df: pd.DataFrame, tail: int, backend: str) -> str | None:
+    """
+    tail モードが全履歴で計算した同じ行と一致すれば None、しなければ理由を返す。
+    """
+    t = make_features(df, tail=tail, backend=backend)
+    full = make_features(df, backend=backend)
+
+    if not t.index.isin(full.index).all() or not full.index[-len(t):].equals(t.index):
+        return f"rows differ: {list(t.index[:3])}..."
+    f = full.loc[t.index]
+    close = np.abs(f["close"].to_numpy(dtype=np.float64))
+
+    for col in t.columns:
+        x = t[col].to_numpy(dtype=np.float64)
+        y = f[col].to_numpy(dtype=np.float64)
+        if col in EMA_COLUMNS:
+            err = np.nanmax(np.abs(x - y) / close, initial=0.0)
+            if err > EMA_TOLERANCE:
+                return f"{col}: max err {err:.3g} of close"
+        elif not np.allclose(x, y, rtol=TAIL_RTOL, atol=ATOL, equal_nan=True):
+            return f"{col}: max abs err {np.nanmax(np.abs(x - y)):.3g}"
+    return None
+
+
+def check_parity(interval: str | None = None) -> int:
+    cases = []
+    for seed in range(10):
+        for n in [0, 1, 19, 21, 60, 700, 5000]:
+            cases.append((f"synthetic n={n} seed={seed}", synthetic_klines(n, seed), None))
+        cases.append((f"synthetic tail={TAIL_ROWS} seed={seed}", synthetic_klines(3000, seed), TAIL_ROWS))
+
+    tail_cases = [(f"synthetic n=20000 seed={seed}", synthetic_klines(20000, seed)) for seed in range(3)]
+
+    if interval:
+        for symbol in list_symbols(interval):
+            df = read_klines(symbol, interval)
+            cases.append((f"{symbol} {interval}", df, None))
+            tail_cases.append((f"{symbol} {interval}", df))
+
+    failures = 0
+    for name, df, tail in cases:
+        reason = compare(df, tail)
+        if reason:
+            failures += 1
+            print(f"[FAIL] {name}: {reason}")
+
+    print(f"[PARITY] {len(cases) - failures}/{len(cases)} cases match (rtol={RTOL}, atol={ATOL})")
+
+    tail_failures = 0
+    for name, df in tail_cases:
+        for backend in ("pandas", "numpy"):
+            reason = compare_tail(df, TAIL_ROWS, backend)
+            if reason:
+                tail_failures += 1
+                print(f"[FAIL] {name} tail={TAIL_ROWS} {backend} vs full: {reason}")
+
+    n_tail = len(tail_cases) * 2
+    print(f"[TAIL] {n_tail - tail_failures}/{n_tail} cases match full history "
+          f"(ema tol={EMA_TOLERANCE} of close, rtol={TAIL_RTOL})")
+    return failures + tail_failures
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark():
+    print(f"{'rows':>8} {'pandas':>10} {'numpy':>10} {'speedup':>8}")
+    for n in BENCH_SIZES:
+        df = synthetic_klines(n)
+        repeat = max(3, 200_000 // max(n, 1000))
+        t_pd = _best(lambda: make_features(df, backend="pandas"), repeat)
+        t_np = _best(lambda: make_features(df, backend="numpy"), repeat)
+        print(f"{n:>8} {t_pd * 1000:>8.2f}ms {t_np * 1000:>8.2f}ms {t_pd / t_np:>7.1f}x")
+
+
+def main():
+    interval = sys.argv[1] if len(sys.argv) > 1 else None
+    failures = check_parity(interval)
+    benchmark()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
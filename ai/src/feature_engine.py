@@ -0,0 +1,319 @@
+# ai/src/feature_engine.py
+#
+# make_features のインクリメンタル版。
+#
+# 系列ごとに rolling / EMA / RSI の内部状態（窓バッファ・累積和・EMA 値）を保存しておき、
+# 新しい足が来たらその本数分だけ状態を進める（O(新規本数)）。
+#
+# pandas の rolling(mean/std) と ewm(adjust=False) と同じ逐次アルゴリズム
+# （Kahan 補正付きの累積和 / Welford 分散）を再現しているので、出力は make_features(df) と
+# 一致する（窓内がすべて同じ値になる区間の std だけ、丸め誤差程度の差が出ることがある）。
+#
+# 状態の保存と出力行の蓄積は ai.src.feature_store が行う。
+
+import math
+from collections import deque
+
+import numpy as np
+
+from ai.src.features import FEATURE_COLUMNS
+from ai.src.kline_store import KLINE_COLUMNS
+
+
+OUTPUT_COLUMNS = KLINE_COLUMNS + FEATURE_COLUMNS
+
+NAN = float("nan")
+
+
+# =====================
+# Kernels (pandas と同じ逐次計算)
+# =====================
+
+class RollingMean:
+    """
+    Series.rolling(window).mean()
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.neg_ct = 0
+        self.same = 0
+        self.prev = NAN
+
+    def push(self, val: float) -> float:
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if old == old:
+                self.nobs -= 1
+                y = -old - self.comp_remove
+                t = self.sum_x + y
+                self.comp_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    self.neg_ct -= 1
+
+        if not self.values:
+            self.prev = val
+        self.values.append(val)
+
+        if val == val:
+            self.nobs += 1
+            y = val - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev:
+                self.same += 1
+            else:
+                self.same = 1
+            self.prev = val
+
+        if self.nobs < self.window or self.nobs == 0:
+            return NAN
+
+        result = self.sum_x / self.nobs
+        if self.same >= self.nobs:
+            result = self.prev
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+
+class RollingStd:
+    """
+    Series.rolling(window).std()（ddof=1）
+
+    Welford 法の偏差平方和が丸めで負になったら窓内を最初から計算し直す。
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nobs = 0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+
+    def _add(self, val: float):
+        if val != val:
+            return
+        self.nobs += 1
+        prev_mean = self.mean_x - self.comp_add
+        y = val - self.comp_add
+        t = y - self.mean_x
+        self.comp_add = t + self.mean_x - y
+        self.mean_x += t / self.nobs
+        self.ssqdm_x += (val - prev_mean) * (val - self.mean_x)
+
+    def _remove(self, val: float):
+        if val != val:
+            return
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean_x - self.comp_remove
+            y = val - self.comp_remove
+            t = y - self.mean_x
+            self.comp_remove = t + self.mean_x - y
+            self.mean_x -= t / self.nobs
+            self.ssqdm_x -= (val - prev_mean) * (val - self.mean_x)
+        else:
+            self.mean_x = 0.0
+            self.ssqdm_x = 0.0
+
+    def push(self, val: float) -> float:
+        if len(self.values) == self.window:
+            self._remove(self.values[0])
+        self.values.append(val)
+        self._add(val)
+
+        if self.ssqdm_x < 0:
+            self.nobs = 0
+            self.mean_x = self.ssqdm_x = self.comp_add = self.comp_remove = 0.0
+            for v in self.values:
+                self._add(v)
+
+        if self.nobs < self.window or self.nobs <= 1:
+            return NAN
+
+        var = self.ssqdm_x / (self.nobs - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class Ewm:
+    """
+    Series.ewm(span=span, adjust=False).mean()
+    """
+
+    def __init__(self, span: int):
+        self.alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+        self.value = NAN
+        self.started = False
+
+    def push(self, val: float) -> float:
+        if not self.started:
+            self.value = val
+            self.started = True
+            return self.value
+
+        if self.value == self.value and val == val and self.value != val:
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * val) / (old_wt + self.alpha)
+        elif self.value != self.value:
+            self.value = val
+        return self.value
+
+
+def _pct(cur: float, prev: float) -> float:
+    if prev != prev or cur != cur or prev == 0:
+        return NAN
+    return cur / prev - 1
+
+
+def _finite(x: float) -> float:
+    return x if math.isfinite(x) else NAN
+
+
+# =====================
+# Engine
+# =====================
+
+class FeatureEngine:
+
+    def __init__(self):
+        self.n = 0
+        self.last_open_time = None
+        self.last_close = NAN
+        self.closes = deque(maxlen=6)
+        self.prev_volume = NAN
+
+        self.ma_5 = RollingMean(5)
+        self.ma_20 = RollingMean(20)
+        self.std_20 = RollingStd(20)
+        self.ema_20 = Ewm(20)
+        self.ema_50 = Ewm(50)
+        self.avg_gain = RollingMean(14)
+        self.avg_loss = RollingMean(14)
+        self.vol_10 = RollingStd(10)
+        self.vol_20 = RollingStd(20)
+        self.volume_ma = RollingMean(10)
+
+    def push(self, open_time, o, h, l, c, v) -> list | None:
+        """
+        1本進めて、その足の特徴量行を返す（make_features で dropna される行なら None）。
+        """
+        closes = self.closes
+        prev = closes[-1] if closes else NAN
+
+        ret = _pct(c, prev)
+        ret_3 = _pct(c, closes[-3]) if len(closes) >= 3 else NAN
+        ret_6 = _pct(c, closes[-6]) if len(closes) >= 6 else NAN
+
+        ma_5 = self.ma_5.push(c)
+        ma_20 = self.ma_20.push(c)
+        std_20 = self.std_20.push(c)
+
+        ema_20 = self.ema_20.push(c)
+        ema_50 = self.ema_50.push(c)
+
+        delta = c - prev
+        if delta != delta:
+            gain = loss = NAN
+        else:
+            gain = max(delta, 0.0)
+            loss = -min(delta, 0.0)
+
+        avg_gain = self.avg_gain.push(gain)
+        avg_loss = self.avg_loss.push(loss)
+        if avg_loss == 0:
+            avg_loss = NAN
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss)) if avg_loss == avg_loss else NAN
+
+        volatility = self.vol_10.push(ret)
+        volatility_20 = self.vol_20.push(ret)
+
+        upper = ma_20 + 2 * std_20
+        lower = ma_20 - 2 * std_20
+        bb_width = (upper - lower) / ma_20 if ma_20 != 0 else NAN
+
+        volume_ma = self.volume_ma.push(v)
+        volume_change = _pct(v, self.prev_volume)
+
+        closes.append(c)
+        self.prev_volume = v
+        self.last_close = c
+        self.last_open_time = int(open_time)
+        self.n += 1
+
+        row = [
+            int(open_time), o, h, l, c, v,
+            _finite(ret), _finite(ret_3), _finite(ret_6),
+            ma_5, ma_20, ema_20, ema_50, ema_20 - ema_50,
+            _finite(rsi), volatility, volatility_20, _finite(bb_width),
+            volume_ma, _finite(volume_change),
+        ]
+        if any(x != x for x in row):
+            return None
+        return row
+
+    def advance(self, rows: np.ndarray) -> list[list]:
+        out = []
+        for r in rows.tolist():
+            row = self.push(*r)
+            if row is not None:
+                out.append(row)
+        return out
+
+    # ---------------------
+    # Persistence
+    # ---------------------
+
+    def state(self) -> dict:
+        def kernel(k):
+            d = dict(vars(k))
+            if "values" in d:
+                d["values"] = list(d["values"])
+            return d
+
+        return {
+            "n": self.n,
+            "last_open_time": self.last_open_time,
+            "last_close": self.last_close,
+            "closes": list(self.closes),
+            "prev_volume": self.prev_volume,
+            "kernels": {
+                name: kernel(getattr(self, name))
+                for name in ["ma_5", "ma_20", "std_20", "ema_20", "ema_50",
+                             "avg_gain", "avg_loss", "vol_10", "vol_20", "volume_ma"]
+            },
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "FeatureEngine":
+        engine = cls()
+        engine.n = state["n"]
+        engine.last_open_time = state["last_open_time"]
+        engine.last_close = state["last_close"]
+        engine.closes.extend(state["closes"])
+        engine.prev_volume = state["prev_volume"]
+
+        for name, values in state["kernels"].items():
+            k = getattr(engine, name)
+            for attr, value in values.items():
+                if attr == "values":
+                    k.values.extend(value)
+                else:
+                    setattr(k, attr, value)
+        return engine
+
+    def copy(self) -> "FeatureEngine":
+        return FeatureEngine.from_state(self.state())
@@ -0,0 +1,193 @@
+# ai/src/feature_kernels.py
+#
+# 特徴量計算用の NumPy カーネル。
+#
+# すべて最後の軸（時間軸）に沿って計算するので、1 次元（1 銘柄）でも
+# 2 次元（銘柄 × 時間のパネル）でも同じ関数で動く。
+#
+# NaN の扱いは pandas の rolling(window)（min_periods = window）に合わせる:
+# 窓内に NaN が1つでもあれば NaN、先頭 window-1 本も NaN。
+# out を渡すとその配列に直接書き込む（中間の DataFrame は作らない）。
+#
+# fill_features は make_features と同じ特徴量をこれらのカーネルで計算する
+# （features.make_features(backend="numpy") と feature_panel が使う）。
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+
+# sliding_window_view の一時配列をこのサイズ（要素数）以下に抑えるよう時間軸を分割する
+CHUNK_ELEMENTS = 1 << 22
+
+
+def _out(x: np.ndarray, out: np.ndarray | None) -> np.ndarray:
+    return np.empty_like(x) if out is None else out
+
+
+def _chunks(x: np.ndarray, window: int):
+    """
+    出力位置 [start, stop) ごとに分割する（先頭 window-1 本は除く）。
+    """
+    n = x.shape[-1]
+    rows = int(np.prod(x.shape[:-1])) or 1
+    step = max(1, CHUNK_ELEMENTS // (rows * window))
+    for start in range(window - 1, n, step):
+        yield start, min(n, start + step)
+
+
+def pct_change(x: np.ndarray, periods: int = 1, out: np.ndarray | None = None) -> np.ndarray:
+    out = _out(x, out)
+    out[..., :periods] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(x[..., periods:], x[..., :-periods], out=out[..., periods:])
+    out[..., periods:] -= 1
+    return out
+
+
+def diff(x: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    out = _out(x, out)
+    out[..., :1] = np.nan
+    np.subtract(x[..., 1:], x[..., :-1], out=out[..., 1:])
+    return out
+
+
+def rolling_mean(x: np.ndarray, window: int, out: np.ndarray | None = None) -> np.ndarray:
+    out = _out(x, out)
+    out[..., :window - 1] = np.nan
+    if x.shape[-1] < window:
+        return out
+
+    # 窓内の和は sliding_window_view 上の reduce（コピーなし）
+    windows = sliding_window_view(x, window, axis=-1)
+    np.add.reduce(windows, axis=-1, out=out[..., window - 1:])
+    out[..., window - 1:] /= window
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    標本標準偏差（ddof=1）。窓ごとに平均を引いてから二乗和を取る（2パス）。
+    """
+    out = _out(x, out)
+    out[..., :window - 1] = np.nan
+    if x.shape[-1] < window:
+        return out
+
+    for start, stop in _chunks(x, window):
+        w = sliding_window_view(x[..., start - window + 1:stop], window, axis=-1)
+        dev = w - w.mean(axis=-1, keepdims=True)
+        np.einsum("...i,...i->...", dev, dev, out=out[..., start:stop])
+
+    out[..., window - 1:] /= window - 1
+    np.sqrt(out[..., window - 1:], out=out[..., window - 1:])
+    return out
+
+
+def ewm_mean(x: np.ndarray, span: int, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    ewm(span=span, adjust=False).mean()。先頭の NaN（パネルの左詰め分）は NaN のまま、
+    途中の NaN は pandas と同じく直前の値を引き継ぐ。
+    """
+    out = _out(x, out)
+    alpha = 2.0 / (span + 1.0)
+    if x.shape[-1] == 0:
+        return out
+
+    x2 = np.atleast_2d(x)
+    o2 = out.reshape(x2.shape)
+
+    valid = ~np.isnan(x2)
+    first = np.where(valid.any(axis=-1), valid.argmax(axis=-1), x2.shape[-1])
+    rows = np.arange(x2.shape[0])
+
+    # 先頭の NaN は最初の値で埋めて一括で漸化式を回し、あとで NaN に戻す
+    seed = x2[rows, np.minimum(first, x2.shape[-1] - 1)]
+    filled = np.where(np.arange(x2.shape[-1]) < first[:, None], seed[:, None], x2)
+
+    zi = ((1 - alpha) * seed)[:, None]
+    o2[...], _ = lfilter([alpha], [1.0, alpha - 1.0], filled, axis=-1, zi=zi)
+    o2[np.arange(x2.shape[-1]) < first[:, None]] = np.nan
+
+    # 途中に NaN がある系列だけ区間ごとに計算し直す
+    gaps = (~valid & (np.arange(x2.shape[-1]) > first[:, None])).any(axis=-1)
+    for r in np.flatnonzero(gaps):
+        _ewm_gaps(x2[r], alpha, o2[r])
+    return out
+
+
+def _ewm_gaps(x: np.ndarray, alpha: float, out: np.ndarray):
+    """
+    途中に NaN がある1系列の ewm_mean。pandas（ignore_na=False）と同じく NaN の間は直前の値を保ち、
+    次の値との加重は直前の値の重みを NaN の本数分だけ減衰させてから取る。
+    """
+    valid = np.flatnonzero(~np.isnan(x))
+    out[:valid[0]] = np.nan
+    last = prev = None
+    for run in np.split(valid, np.flatnonzero(np.diff(valid) > 1) + 1):
+        start, stop = run[0], run[-1] + 1
+        if last is None:
+            out[start] = x[start]
+        else:
+            out[prev:start] = last
+            decay = (1 - alpha) ** (start - prev + 1)
+            out[start] = (decay * last + alpha * x[start]) / (decay + alpha)
+        if stop - start > 1:
+            out[start + 1:stop], _ = lfilter(
+                [alpha], [1.0, alpha - 1.0], x[start + 1:stop], zi=[(1 - alpha) * out[start]]
+            )
+        last, prev = out[stop - 1], stop
+    out[prev:] = last
+
+
+def replace_inf(x: np.ndarray) -> np.ndarray:
+    """
+    ±inf を NaN に置き換える（in-place）。
+    """
+    x[np.isinf(x)] = np.nan
+    return x
+
+
+def fill_features(close: np.ndarray, volume: np.ndarray, col: dict) -> None:
+    """
+    make_features の FEATURE_COLUMNS を計算して col[name]（close と同じ形の配列）に書き込む。
+    """
+    # リターン
+    pct_change(close, 1, out=col["return"])
+    pct_change(close, 3, out=col["return_3"])
+    pct_change(close, 6, out=col["return_6"])
+
+    # 移動平均
+    rolling_mean(close, 5, out=col["ma_5"])
+    rolling_mean(close, 20, out=col["ma_20"])
+
+    # EMA
+    ewm_mean(close, 20, out=col["ema_20"])
+    ewm_mean(close, 50, out=col["ema_50"])
+    np.subtract(col["ema_20"], col["ema_50"], out=col["ema_diff"])
+
+    # RSI
+    delta = diff(close)
+    avg_gain = rolling_mean(np.clip(delta, 0, None), 14)
+    avg_loss = rolling_mean(-np.clip(delta, None, 0), 14)
+    avg_loss[avg_loss == 0] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.subtract(100, 100 / (1 + avg_gain / avg_loss), out=col["rsi"])
+
+    # ボラティリティ
+    rolling_std(col["return"], 10, out=col["volatility"])
+    rolling_std(col["return"], 20, out=col["volatility_20"])
+
+    # ボリンジャーバンド幅
+    std20 = rolling_std(close, 20)
+    ma20 = col["ma_20"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide((ma20 + 2 * std20) - (ma20 - 2 * std20), ma20, out=col["bb_width"])
+
+    # 出来高
+    rolling_mean(volume, 10, out=col["volume_ma"])
+    pct_change(volume, 1, out=col["volume_change"])
+
+    # 無限値対策
+    for name in col:
+        replace_inf(col[name])
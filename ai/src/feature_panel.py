@@ -0,0 +1,134 @@
+# ai/src/feature_panel.py
+#
+# 全銘柄の特徴量をまとめて計算するパネルビルダー。
+#
+# 1つのインターバルの銘柄を (銘柄 × 時刻) の 2 次元配列に右詰めで並べ
+# （最終足を同じ列に揃え、履歴の短い銘柄は左側を NaN で埋める）、
+# FEATURE_COLUMNS を配列全体のカーネル（ai.src.feature_kernels）で一括計算する。
+#
+# 窓は銘柄ごとに本数ベースで効くので、各銘柄のビューは make_features(df) と
+# 同じ行・同じ値（丸め誤差の範囲）になる。
+#
+# 1h の全履歴を全銘柄まとめて載せるとメモリが足りないので、iter_panels は
+# 履歴の長さが近い銘柄ごとにバッチに分けて（左詰めの無駄を減らして）順に返す。
+# dtype=np.float32 を指定するとメモリは半分になる。
+
+import numpy as np
+import pandas as pd
+
+from ai.src import feature_kernels as K
+from ai.src.features import FEATURE_COLUMNS
+from ai.src.candle_mmap import load_candles
+from ai.src.kline_store import PRICE_COLUMNS, list_symbols
+
+
+PANEL_COLUMNS = PRICE_COLUMNS + FEATURE_COLUMNS
+
+DEFAULT_BATCH = 32
+
+
+class FeaturePanel:
+    """
+    data[f, s, t]: 特徴量 f（PANEL_COLUMNS の順）× 銘柄 s × 時刻 t
+    valid[s, t]:   make_features の dropna 後に残る行
+    """
+
+    def __init__(self, symbols, open_time: np.ndarray, data: np.ndarray, valid: np.ndarray):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.open_time = open_time
+        self.data = data
+        self.valid = valid
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _rows(self, i: int):
+        rows = np.flatnonzero(self.valid[i])
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return slice(rows[0], rows[-1] + 1)
+        return rows
+
+    def arrays(self, symbol: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (open_time (n,), 特徴量 (n, len(PANEL_COLUMNS)))
+            有効行が連続していればコピーなしのビュー
+        """
+        i = self.index[symbol]
+        rows = self._rows(i)
+        return self.open_time[i, rows], self.data[:, i, rows].T
+
+    def frame(self, symbol: str) -> pd.DataFrame:
+        """
+        make_features(df) と同じ列構成の DataFrame（index は 0 から振り直し）
+        """
+        open_time, X = self.arrays(symbol)
+        df = pd.DataFrame(X, columns=PANEL_COLUMNS)
+        df.insert(0, "open_time", open_time)
+        return df
+
+
+def _load(symbols, interval: str, tail: int | None) -> tuple[list[str], list[np.ndarray]]:
+    """
+    スナップショットを mmap で開くだけなので、全銘柄分を並べてもメモリには載らない。
+    """
+    names, arrays = [], []
+    for symbol in symbols:
+        try:
+            arr = load_candles(symbol, interval)
+        except FileNotFoundError:
+            continue
+        if tail is not None:
+            arr = arr[-tail:]
+        names.append(symbol)
+        arrays.append(arr)
+    return names, arrays
+
+
+def compute(symbols, arrays, dtype=np.float64) -> FeaturePanel:
+    """
+    ローソク足（構造化配列）のリストからパネルを作って特徴量を一括計算する。
+    """
+    S = len(arrays)
+    T = max((len(a) for a in arrays), default=0)
+
+    open_time = np.full((S, T), -1, dtype=np.int64)
+    data = np.full((len(PANEL_COLUMNS), S, T), np.nan, dtype=dtype)
+    col = {name: data[j] for j, name in enumerate(PANEL_COLUMNS)}
+
+    for i, arr in enumerate(arrays):
+        n = len(arr)
+        if n == 0:
+            continue
+        open_time[i, T - n:] = arr["open_time"]
+        for name in PRICE_COLUMNS:
+            col[name][i, T - n:] = arr[name]
+
+    K.fill_features(col["close"], col["volume"], {name: col[name] for name in FEATURE_COLUMNS})
+
+    valid = ~np.isnan(data).any(axis=0)
+    return FeaturePanel(symbols, open_time, data, valid)
+
+
+def build_panel(symbols=None, interval: str = "1h", dtype=np.float64, tail: int | None = None) -> FeaturePanel:
+    symbols = symbols if symbols is not None else list_symbols(interval)
+    names, arrays = _load(symbols, interval, tail)
+    return compute(names, arrays, dtype)
+
+
+def iter_panels(symbols=None, interval: str = "1h", dtype=np.float64, tail: int | None = None,
+                batch_size: int = DEFAULT_BATCH):
+    """
+    履歴の長さ順に batch_size 銘柄ずつパネルを作って返す。
+    """
+    symbols = symbols if symbols is not None else list_symbols(interval)
+    names, arrays = _load(symbols, interval, tail)
+
+    order = sorted(range(len(names)), key=lambda i: len(arrays[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        yield compute([names[i] for i in batch], [arrays[i] for i in batch], dtype)
@@ -0,0 +1,240 @@
+# ai/src/feature_store.py
+#
+# 計算済み特徴量のストア（系列ごとの列指向ファイル）。
+#
+#   ai/data/features/{version}/{interval}/{symbol}/
+#       open_time.i8, open.f8, ..., volume_change.f8   列ごとの追記専用バイナリ
+#       meta.json   {"rows", "watermark", "state"}     有効行数・取り込み済みの最終 open_time・エンジン状態
+#
+# version は features.py / feature_engine.py のソースのハッシュ。特徴量の定義を変えると
+# 別ディレクトリに作り直され、古いバージョンは gc() で消える。
+#
+# 新しい足が来たら feature_engine の状態を進め、増えた行だけを各列ファイルに追記する（O(新規本数)）。
+# 最終足は差分同期で上書きされうるので保存せず、読み出しのたびに状態のコピーで計算して末尾に付ける。
+# ギャップ補修などで途中に足が挿入された場合は保存位置と一致しなくなるので作り直す。
+#
+# 列ファイルは meta.json の rows までが有効（追記途中で落ちた分は次の追記で切り詰める）。
+#
+#   python -m ai.src.feature_store [1h 1d 1w]   # 全銘柄を最新まで更新して古いバージョンを削除
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ai.src.candle_mmap import load_candles
+from ai.src.feature_engine import OUTPUT_COLUMNS, FeatureEngine
+from ai.src.kline_store import list_symbols
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+FEATURE_DIR = BASE_DIR / "ai" / "data" / "features"
+
+CODE_FILES = [
+    Path(__file__).resolve().parent / "features.py",
+    Path(__file__).resolve().parent / "feature_engine.py",
+]
+
+COLUMN_DTYPES = {col: np.dtype("<i8" if col == "open_time" else "<f8") for col in OUTPUT_COLUMNS}
+
+
+def code_version() -> str:
+    h = hashlib.sha1()
+    for path in CODE_FILES:
+        h.update(path.read_bytes())
+    return h.hexdigest()[:12]
+
+
+FEATURE_VERSION = code_version()
+
+
+# =====================
+# Paths / files
+# =====================
+
+def series_path(symbol: str, interval: str, version: str = FEATURE_VERSION) -> Path:
+    return FEATURE_DIR / version / interval / symbol
+
+
+def _column_path(d: Path, col: str) -> Path:
+    return d / f"{col}.{COLUMN_DTYPES[col].kind}{COLUMN_DTYPES[col].itemsize}"
+
+
+@contextmanager
+def _locked(d: Path):
+    d.mkdir(parents=True, exist_ok=True)
+    with open(d / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _read_meta(d: Path) -> dict | None:
+    path = d / "meta.json"
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except ValueError:
+        return None
+
+
+def _write_meta(d: Path, meta: dict):
+    path = d / "meta.json"
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, path)
+
+
+def _append(d: Path, rows: list[list], valid_rows: int):
+    """
+    各列ファイルを valid_rows に切り詰めてから rows を追記する。
+    """
+    for j, col in enumerate(OUTPUT_COLUMNS):
+        dtype = COLUMN_DTYPES[col]
+        path = _column_path(d, col)
+        with open(path, "ab") as f:
+            f.truncate(valid_rows * dtype.itemsize)
+            if rows:
+                f.write(np.asarray([r[j] for r in rows], dtype=dtype).tobytes())
+
+
+def _read_columns(d: Path, rows: int, tail: int | None) -> dict[str, np.ndarray]:
+    start = 0 if tail is None else max(0, rows - tail)
+    out = {}
+    for col in OUTPUT_COLUMNS:
+        dtype = COLUMN_DTYPES[col]
+        if rows == 0:
+            out[col] = np.empty(0, dtype=dtype)
+            continue
+        m = np.memmap(_column_path(d, col), dtype=dtype, mode="r", shape=(rows,))
+        out[col] = np.array(m[start:])
+    return out
+
+
+# =====================
+# Update / read
+# =====================
+
+def _resume_index(engine: FeatureEngine | None, candles: np.ndarray) -> int | None:
+    """
+    保存済みの状態が candles のどこまでを処理したか（次に処理する位置）。
+    途中に足が挿入された・書き換わったなど整合しない場合は None。
+    """
+    if engine is None or engine.last_open_time is None:
+        return None
+
+    idx = int(np.searchsorted(candles["open_time"], engine.last_open_time))
+    if idx >= len(candles) or idx != engine.n - 1:
+        return None
+    if int(candles["open_time"][idx]) != engine.last_open_time or float(candles["close"][idx]) != engine.last_close:
+        return None
+    return idx + 1
+
+
+def _update(d: Path, candles: np.ndarray) -> tuple[int, list[list]]:
+    """
+    ロック内で呼ぶ。確定分（最終足の手前まで）を追記し、(有効行数, 最終足の行) を返す。
+    """
+    meta = _read_meta(d)
+    engine = FeatureEngine.from_state(meta["state"]) if meta else None
+    rows = meta["rows"] if meta else 0
+
+    start = _resume_index(engine, candles)
+    if start is None:
+        engine, start, rows = FeatureEngine(), 0, 0
+
+    settled = len(candles) - 1
+    if start < settled or meta is None:
+        new = engine.advance(candles[start:settled]) if start < settled else []
+        _append(d, new, rows)
+        rows += len(new)
+        _write_meta(d, {
+            "version": FEATURE_VERSION,
+            "rows": rows,
+            "watermark": engine.last_open_time,
+            "state": engine.state(),
+        })
+
+    live = engine.copy()
+    last = live.advance(candles[max(settled, start):]) if len(candles) else []
+    return rows, last
+
+
+def update(symbol: str, interval: str) -> int:
+    """
+    ストアを最新の確定足まで進める。
+
+    Returns:
+        保存済みの行数
+    """
+    d = series_path(symbol, interval)
+    with _locked(d):
+        rows, _ = _update(d, load_candles(symbol, interval))
+    return rows
+
+
+def load_features(symbol: str, interval: str, tail: int | None = None) -> pd.DataFrame:
+    """
+    make_features(read_klines(symbol, interval)) と同じ DataFrame を返す。
+    tail を指定すると末尾 tail 行だけ（最終足を含む）。
+    """
+    candles = load_candles(symbol, interval)
+    d = series_path(symbol, interval)
+
+    with _locked(d):
+        rows, last = _update(d, candles)
+        cols = _read_columns(d, rows, tail)
+
+    df = pd.DataFrame(cols)
+    if last:
+        df = pd.concat([df, pd.DataFrame(last, columns=OUTPUT_COLUMNS)], ignore_index=True)
+        df["open_time"] = df["open_time"].astype("int64")
+
+    return df.tail(tail).reset_index(drop=True) if tail is not None else df
+
+
+def gc() -> list[str]:
+    """
+    現在のバージョン以外のディレクトリを削除する。
+    """
+    removed = []
+    if not FEATURE_DIR.exists():
+        return removed
+
+    for d in FEATURE_DIR.iterdir():
+        if d.is_dir() and d.name != FEATURE_VERSION:
+            shutil.rmtree(d, ignore_errors=True)
+            removed.append(d.name)
+    return removed
+
+
+def main():
+    intervals = sys.argv[1:] or ["1h", "1d", "1w"]
+    print(f"Feature store version {FEATURE_VERSION}")
+
+    for interval in intervals:
+        symbols = list_symbols(interval)
+        t0 = time.perf_counter()
+
+        for symbol in symbols:
+            try:
+                update(symbol, interval)
+            except Exception as e:
+                print(f"[ERROR] {symbol} {interval}: {e}")
+
+        print(f"[OK] {interval}: {len(symbols)} series updated ({time.perf_counter() - t0:.1f}s)")
+
+    for version in gc():
+        print(f"[GC] removed feature version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
+import math
+import os
+
 import pandas as pd
 import numpy as np
 
+from ai.src import feature_kernels as K
+
 FEATURE_COLUMNS = [
     "return",
     "return_3",
@@ -18,8 +23,62 @@ FEATURE_COLUMNS = [
     "volume_change"
 ]
 
+# 各特徴量が1行を作るのに必要な過去の本数（その行を除く）。make_features の定義と対応させる
+FEATURE_WARMUP = {
+    "return": 1,
+    "return_3": 3,
+    "return_6": 6,
+    "ma_5": 4,
+    "ma_20": 19,
+    "rsi": 14,            # diff(1) + rolling(14)
+    "volatility": 10,     # pct_change(1) + rolling(10)
+    "volatility_20": 20,  # pct_change(1) + rolling(20)
+    "bb_width": 19,
+    "volume_ma": 9,
+    "volume_change": 1,
+}
+
+# EMA は全履歴に依存するので、途中から計算したときの誤差で打ち切る。
+# 誤差は価格水準に対する比（|tail の値 - 全履歴の値| / close）で測る（ema_diff は 0 付近を通るので自分との比は取れない）
+EMA_SPANS = {"ema_20": 20, "ema_50": 50}
+EMA_COLUMNS = ["ema_20", "ema_50", "ema_diff"]
+EMA_TOLERANCE = 1e-6
+
+# "pandas"（基準実装）か "numpy"（ai.src.feature_kernels。中間の DataFrame を作らない）
+FEATURE_BACKEND = os.getenv("FEATURE_BACKEND", "pandas")
+
+
+def feature_lookback(tolerance: float = EMA_TOLERANCE) -> int:
+    """
+    末尾の行を全履歴で計算した結果と一致させるのに必要な過去の本数。
+
+    EMA(adjust=False) は途中から始めると初期値とのずれ（開始時点の価格と EMA の差）が (1 - alpha)^k で減衰する。
+    開始時点のずれを価格の 100% までと見て、ema_diff は2本の EMA の誤差が足し合わさるので
+    (1 - alpha)^k が tolerance / len(EMA_SPANS) を下回る本数を取る（span=50, 1e-6 で 363 本）。
+    """
+    ema = max(
+        math.ceil(math.log(tolerance / len(EMA_SPANS)) / math.log(1 - 2 / (span + 1)))
+        for span in EMA_SPANS.values()
+    )
+    return max(max(FEATURE_WARMUP.values()), ema)
+
+
+def make_features(df, tail=None, backend=None):
+    """
+    tail を指定すると末尾 tail 本の足の特徴量だけを計算する（推論用）。
+    直前の feature_lookback() 本だけを使うので、履歴の長さに関係なく一定のコスト。
+
+    backend を省略すると FEATURE_BACKEND を使う。
+    """
+    if tail is not None:
+        df = df.iloc[-(tail + feature_lookback()):]
+
+    backend = backend or FEATURE_BACKEND
+    if backend == "numpy":
+        return _make_features_numpy(df, tail)
+    if backend != "pandas":
+        raise ValueError(f"unknown feature backend: {backend}")
 
-def make_features(df):
     df = df.copy()
 
     # リターン
@@ -65,10 +124,35 @@ def make_features(df):
     # 無限値対策
     df.replace([np.inf, -np.inf], np.nan, inplace=True)
 
+    if tail is not None:
+        df = df.iloc[-tail:]
+
     df = df.dropna()
     return df
 
 
+def _make_features_numpy(df, tail=None):
+    """
+    make_features の NumPy 版。特徴量は1つの (特徴量数, 本数) バッファに直接書き込み、
+    DataFrame は最後に有効行だけで1回作る。
+    """
+    n = len(df)
+    buf = np.empty((len(FEATURE_COLUMNS), n))
+    K.fill_features(
+        df["close"].to_numpy(dtype=np.float64),
+        df["volume"].to_numpy(dtype=np.float64),
+        dict(zip(FEATURE_COLUMNS, buf)),
+    )
+
+    valid = ~np.isnan(buf).any(axis=0) & df.notna().all(axis=1).to_numpy()
+    if tail is not None:
+        valid[:max(0, n - tail)] = False
+
+    data = {col: df[col].to_numpy()[valid] for col in df.columns}
+    data.update(zip(FEATURE_COLUMNS, buf[:, valid]))
+    return pd.DataFrame(data, index=df.index[valid])
+
+
 def make_price_target(df, horizon=1):
     return df["close"].shift(-horizon)
 
@@ -1,50 +1,10 @@
 import os
 import json
-import time
-import requests
-import pandas as pd
 
-RAW_DIR = "ai/data/raw"
-TOP300_PATH = "ai/data/top300_usdt.json"
-
-BASE_URL = "https://api.binance.com/api/v3/klines"
-
-os.makedirs(RAW_DIR, exist_ok=True)
-
-
-def fetch_klines(symbol, interval="1h", limit=1000):
-    params = {
-        "symbol": symbol,
-        "interval": interval,
-        "limit": limit
-    }
-
-    response = requests.get(BASE_URL, params=params, timeout=10)
-
-    if response.status_code != 200:
-        raise Exception(f"HTTP {response.status_code} {response.text}")
-
-    data = response.json()
-
-    if not data:
-        return None
+from ai.src.fetch_data import seed_history
+from ai.src.kline_sync import sync_klines
 
-    df = pd.DataFrame(data, columns=[
-        "open_time", "open", "high", "low", "close", "volume",
-        "close_time", "quote_asset_volume", "num_trades",
-        "taker_buy_base", "taker_buy_quote", "ignore"
-    ])
-
-    df = df[[
-        "open_time", "open", "high", "low", "close", "volume"
-    ]]
-
-    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
-    df[["open", "high", "low", "close", "volume"]] = df[
-        ["open", "high", "low", "close", "volume"]
-    ].astype(float)
-
-    return df
+TOP300_PATH = "ai/data/top300_usdt.json"
 
 
 def main():
@@ -57,27 +17,12 @@ def main():
 
     print(f"Fetching 1h data for {len(symbols)} symbols...\n")
 
-    for i, symbol in enumerate(symbols, 1):
-        try:
-            print(f"[{i}/{len(symbols)}] Fetching {symbol} 1h...")
-
-            df = fetch_klines(symbol, "1h", 1000)
-
-            if df is None or len(df) == 0:
-                print(f"[SKIP] {symbol} (no data)")
-                continue
-
-            path = f"{RAW_DIR}/{symbol}_1h.csv"
-            df.to_csv(path, index=False)
-
-            print(f"[OK] Saved {path} ({len(df)} rows)")
-
-            # Binanceレート制限対策
-            time.sleep(0.2)
+    sync_klines(symbols, "1h")
 
-        except Exception as e:
-            print(f"[ERROR] {symbol}: {e}")
-            time.sleep(0.5)
+    # 日足・週足は 1h から集計する（candle_derive）。初めての銘柄だけ先に取引所から全期間を取っておく
+    seeded = seed_history(symbols)
+    if seeded:
+        print(f"Seeded 1d/1w history for {seeded} series")
 
     print("\n1h fetch completed.")
 
@@ -1,81 +1,153 @@
+import asyncio
+import json
 import os
 import time
-import requests
-import pandas as pd
-from datetime import datetime
+from pathlib import Path
 
-RAW_DIR = "ai/data/raw"
-BASE_URL = "https://api.binance.com/api/v3/klines"
+from ai.src.kline_fetcher import DEFAULT_CONCURRENCY, KlineFetcher
+from ai.src.kline_store import INTERVAL_MS, first_open_time, publish_snapshot, write_klines
 
-os.makedirs(RAW_DIR, exist_ok=True)
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CHECKPOINT_DIR = BASE_DIR / "ai" / "data" / "backfill"
 
+WINDOW_LIMIT = 1000
 
-def fetch_all_klines(symbol: str, interval: str):
-    print(f"\nFetching {symbol} {interval} full history...")
 
-    all_data = []
-    start_time = None
+# =====================
+# Checkpoint
+# =====================
+
+def checkpoint_path(symbol: str, interval: str) -> Path:
+    return CHECKPOINT_DIR / interval / f"{symbol}.json"
+
+
+def load_checkpoint(symbol: str, interval: str) -> set[int]:
+    path = checkpoint_path(symbol, interval)
+    if not path.exists():
+        return set()
+    return set(json.loads(path.read_text()).get("done", []))
+
 
-    while True:
-        params = {
-            "symbol": symbol,
-            "interval": interval,
-            "limit": 1000
-        }
+def save_checkpoint(symbol: str, interval: str, done: set[int]):
+    path = checkpoint_path(symbol, interval)
+    path.parent.mkdir(parents=True, exist_ok=True)
 
-        if start_time:
-            params["startTime"] = start_time
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"done": sorted(done)}))
+    os.replace(tmp, path)
 
-        response = requests.get(BASE_URL, params=params)
-        data = response.json()
 
-        if not isinstance(data, list) or len(data) == 0:
-            break
+# =====================
+# Backfill
+# =====================
 
-        all_data.extend(data)
+async def _backfill(symbol: str, interval: str, start_ms: int | None, concurrency: int):
+    step = INTERVAL_MS[interval]
+    span = step * WINDOW_LIMIT
+    now_ms = int(time.time() * 1000)
 
-        print(f"Fetched {len(all_data)} rows...")
+    fetcher = KlineFetcher(concurrency=concurrency)
+    try:
+        # 上場時刻（最初の足）を起点にする
+        if start_ms is None:
+            first = await fetcher.fetch(symbol, interval, limit=1, start_time=0)
+            if len(first) == 0:
+                print(f"[SKIP] {symbol} {interval}: no data")
+                return 0
+            start_ms = int(first["open_time"][0])
 
-        # 次の取得開始時刻
-        last_open_time = data[-1][0]
-        start_time = last_open_time + 1
+        windows = list(range(start_ms, now_ms, span))
+        done = load_checkpoint(symbol, interval)
+        todo = [w for w in windows if w not in done]
 
-        # 1000未満なら終了
-        if len(data) < 1000:
-            break
+        print(
+            f"{symbol} {interval}: {len(windows)} windows "
+            f"({len(windows) - len(todo)} done, {len(todo)} to fetch)"
+        )
 
-        time.sleep(0.2)  # API制限対策
+        write_lock = asyncio.Lock()
+        total = 0
 
-    if not all_data:
-        print("No data.")
-        return
+        async def run_window(w):
+            nonlocal total
+            rows = await fetcher.fetch(symbol, interval, WINDOW_LIMIT, start_time=w)
+            rows = rows[rows["open_time"] < w + span]
 
-    df = pd.DataFrame(all_data, columns=[
-        "open_time",
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "close_time",
-        "qav",
-        "num_trades",
-        "taker_base_vol",
-        "taker_quote_vol",
-        "ignore"
-    ])
+            # 同じパーティションを複数ウィンドウが触るので書き込みは直列化
+            async with write_lock:
+                if len(rows) > 0:
+                    await asyncio.to_thread(write_klines, symbol, interval, rows, False)
+                total += len(rows)
 
-    df = df[["open_time", "open", "high", "low", "close", "volume"]]
+                # 最新ウィンドウは未確定なので完了扱いにしない
+                if w + span <= now_ms:
+                    done.add(w)
+                    await asyncio.to_thread(save_checkpoint, symbol, interval, done)
 
-    df["open_time"] = pd.to_datetime(df["open_time"], unit="ms", utc=True)
+        results = await asyncio.gather(*(run_window(w) for w in todo), return_exceptions=True)
+    finally:
+        fetcher.close()
 
-    for col in ["open", "high", "low", "close", "volume"]:
-        df[col] = df[col].astype(float)
+    errors = [r for r in results if isinstance(r, Exception)]
+    for e in errors:
+        print(f"[ERROR] {symbol} {interval}: {e}")
 
-    path = f"{RAW_DIR}/{symbol}_{interval}.csv"
-    df.to_csv(path, index=False)
+    # 最新ウィンドウしか無い（完了ウィンドウが無い）銘柄でもチェックポイントを残す（seed_history の印）
+    if not errors:
+        await asyncio.to_thread(save_checkpoint, symbol, interval, done)
+
+    if total > 0:
+        publish_snapshot(symbol, interval)
+
+    return total
+
+
+def fetch_all_klines(symbol: str, interval: str, start_ms: int | None = None,
+                     concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    全期間を WINDOW_LIMIT 本ずつのウィンドウに分けて並列取得する。
+    完了したウィンドウはチェックポイントに記録し、再実行時は未完了分だけ取る。
+    """
+    print(f"\nFetching {symbol} {interval} full history...")
 
-    print(f"[OK] Saved {path} ({len(df)} rows)")
+    total = asyncio.run(_backfill(symbol, interval, start_ms, concurrency))
+
+    print(f"[OK] Saved {symbol} {interval} ({total} rows)")
+
+
+def needs_seed(symbol: str, interval: str, source: str = "1h") -> bool:
+    """
+    interval の履歴が source からの集計（candle_derive）だけで、取引所から取ったことが無いか。
+    新しく 1h を取り始めた銘柄は 1h の直近 1000 本（約 41 日）ぶんの日足・週足しか作られず、
+    特徴量のウォームアップに足りない。
+    """
+    if checkpoint_path(symbol, interval).exists():
+        return False
+    first = first_open_time(symbol, interval)
+    if first is None:
+        return True
+    source_first = first_open_time(symbol, source)
+    return source_first is not None and first >= source_first
+
+
+def seed_history(symbols, intervals=("1d", "1w"), concurrency: int = DEFAULT_CONCURRENCY) -> int:
+    """
+    needs_seed な銘柄だけ全期間をバックフィルする（一度取ればチェックポイントが残るので次からは何もしない）。
+
+    Returns:
+        バックフィルした (銘柄, インターバル) の数
+    """
+    seeded = 0
+    for symbol in symbols:
+        for interval in intervals:
+            if not needs_seed(symbol, interval):
+                continue
+            try:
+                fetch_all_klines(symbol, interval, concurrency=concurrency)
+                seeded += 1
+            except Exception as e:
+                print(f"[ERROR] seed {symbol} {interval}: {e}")
+    return seeded
 
 
 def main():
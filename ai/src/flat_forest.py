@@ -0,0 +1,576 @@
+# ai/src/flat_forest.py
+#
+# 学習済みモデル（*.pkl）を平坦化した成果物（*.forest）。
+#
+# pkl は 300 本 × 数個の木の Python オブジェクトのグラフで、読み込み（unpickle）が遅く、
+# 推論プロセスごとに別々にメモリに載る。ここでは各森のノードを全木ぶん連結した配列
+#   feature (int32) / threshold (float64) / children (int32 (ノード, 2)、連結後の通し番号。葉は自分自身) /
+#   missing_left (uint8) / value (float64, (ノード, 出力, クラス)) / roots (int32, 木ごとの先頭ノード) /
+#   groups (int32, 森ごとの先頭の木。CalibratedClassifierCV の fold は1つの配列に並べる)
+# と、較正のシグモイドのパラメータ (a, b) とその fold・クラスを1つのファイルに並べ、読み込みは mmap するだけにする
+# （ヘッダの JSON を読んで np.frombuffer でビューを作るだけなので 0.1〜0.3 ms 程度。ページキャッシュを
+# 全プロセスで共有する）。
+#
+# ファイル: MAGIC (8) | ヘッダ長 (uint64 LE) | ヘッダ JSON | 配列（ALIGN バイト境界）
+#
+# 対応するモデル:
+#   price      RandomForestRegressor                              → FlatForest
+#   direction  CalibratedClassifierCV(RandomForestClassifier, sigmoid) → FlatCalibrated
+#   joint      horizon_models.MultiHorizonModel / HorizonGroups（中の森を Flat* に置き換えたもの）
+#   global     global_models.GlobalModel（同上）
+# Flat* は sklearn と同じ predict / predict_proba / classes_ / feature_names_in_ を持つので、
+# predict 側や MultiHorizonModel / GlobalModel からはそのまま使える。推論は ai.src.forest_kernels。
+#
+# 使い方:
+#   python -m ai.src.flat_forest          pkl より古い・無い .forest を書き出す（書き出し時に sklearn と照合）
+#   python -m ai.src.flat_forest check    全 .forest を pkl と照合する
+#
+# 小さなモデルでの照合（price / direction / joint）は tests/test_flat_forest.py。
+
+import json
+import math
+import mmap
+import os
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from ai.src import forest_kernels as K, model_registry
+from ai.src.global_models import GlobalModel
+from ai.src.horizon_models import HorizonGroups, MultiHorizonModel
+from ai.src.train_price import MODEL_DIR
+
+
+MAGIC = b"RFFLAT01"
+FORMAT_VERSION = 2
+ALIGN = 64
+
+# 照合の許容誤差（n_jobs > 1 の sklearn は木の足し合わせの順序が変わるので、その丸め分）
+RTOL = 1e-9
+ATOL = 1e-12
+
+# 照合に使う入力の行数
+PROBE_ROWS = 256
+
+
+def flat_path(model_path) -> Path:
+    return Path(model_path).with_suffix(".forest")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _as_float32(X, feature_names) -> np.ndarray:
+    # sklearn の木は float32 に変換した入力としきい値を比べる
+    if hasattr(X, "columns"):
+        if feature_names is not None and not np.array_equal(X.columns, feature_names):
+            X = X[list(feature_names)]
+        X = X.to_numpy(dtype=np.float32)
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+# =====================
+# Flat models
+# =====================
+
+class FlatForest:
+    """
+    平坦化した RandomForestRegressor / RandomForestClassifier（出力は1つでも複数でもよい）。
+    groups で木をいくつかの森に分けて持てる（CalibratedClassifierCV の fold。predict は先頭の森）。
+    """
+
+    def __init__(self, arrays: dict, n_outputs: int, classes=None, feature_names=None, max_depth: int = 0):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.missing_left = arrays["missing_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.groups = arrays["groups"]
+        self.n_outputs = n_outputs
+        self.max_depth = max_depth
+        self.feature_names_in_ = None if feature_names is None else np.array(feature_names, dtype=object)
+
+        if classes is None:
+            self.classes_ = None
+        elif n_outputs == 1:
+            self.classes_ = np.asarray(classes[0])
+        else:
+            self.classes_ = [np.asarray(c) for c in classes]
+        self.n_classes = None if classes is None else [len(c) for c in classes]
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Returns:
+            葉のノード番号 (木, 行)
+        """
+        X = _as_float32(X, self.feature_names_in_)
+        return K.apply(X, self.feature, self.threshold, self.children, self.missing_left, self.roots,
+                       self.max_depth)
+
+    def group_mean(self, X) -> np.ndarray:
+        """
+        Returns:
+            森ごとの葉の値の平均 (森, 行, 出力, クラス)
+        """
+        return K.leaf_mean(self.value, self.apply(X), self.groups)
+
+    def predict(self, X) -> np.ndarray:
+        if self.classes_ is not None:
+            proba = self.predict_proba(X)
+            if self.n_outputs == 1:
+                return self.classes_.take(np.argmax(proba, axis=1))
+            return np.stack([c.take(np.argmax(p, axis=1)) for c, p in zip(self.classes_, proba)], axis=1)
+
+        out = self.group_mean(X)[0, :, :, 0]
+        return out[:, 0] if self.n_outputs == 1 else out
+
+    def predict_proba(self, X):
+        mean = self.group_mean(X)[0]
+        proba = [mean[:, k, :n] for k, n in enumerate(self.n_classes)]
+        return proba[0] if self.n_outputs == 1 else proba
+
+
+class FlatCalibrated:
+    """
+    平坦化した CalibratedClassifierCV（method="sigmoid", ensemble=True）。
+    全 fold の木を1つの FlatForest（fold ごとに groups）に持ち、1回の走査と配列演算の較正で確率を出す。
+    """
+
+    def __init__(self, forest: FlatForest, calib: dict, classes, feature_names=None):
+        # calib: {"calib": (k, 2) [[a, b], ...], "fold", "col", "class": (k,)}
+        self.forest = forest
+        self.calib = calib
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = None if feature_names is None else np.array(feature_names, dtype=object)
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = _as_float32(X, self.feature_names_in_)
+        pred = self.forest.group_mean(X)[:, :, 0, :]
+        c = self.calib
+        return K.calibrate_sigmoid(pred, c["calib"], c["fold"], c["col"], c["class"], len(self.classes_))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+# =====================
+# Export
+# =====================
+
+def _flatten_forest(forests, name: str, arrays: dict, n_classes: int | None = None) -> dict:
+    """
+    forests: 森1つ、または同じ特徴量の森のリスト（groups で分けて1つの配列に並べる）。
+    n_classes を渡すと value のクラス次元をその幅に揃える（fold によってクラスが欠けることがある）。
+    """
+    forests = forests if isinstance(forests, list) else [forests]
+    trees = [est.tree_ for forest in forests for est in forest.estimators_]
+    sizes = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    children, feature, value = [], [], []
+    for t, off in zip(trees, offsets):
+        node = np.arange(t.node_count)
+        leaf = t.children_left < 0
+        # 葉は自分自身を指す（forest_kernels.apply が深さぶん回しても葉に留まる）
+        left = np.where(leaf, node, t.children_left) + off
+        right = np.where(leaf, node, t.children_right) + off
+        children.append(np.stack([left, right], axis=1))
+        feature.append(np.where(leaf, 0, t.feature))
+
+        v = t.value
+        if n_classes is not None and v.shape[2] < n_classes:
+            v = np.concatenate([v, np.zeros(v.shape[:2] + (n_classes - v.shape[2],))], axis=2)
+        value.append(v)
+
+    arrays[f"{name}.feature"] = np.concatenate(feature).astype(np.int32)
+    arrays[f"{name}.threshold"] = np.concatenate([t.threshold for t in trees]).astype(np.float64)
+    arrays[f"{name}.children"] = np.concatenate(children).astype(np.int32)
+    arrays[f"{name}.missing_left"] = np.concatenate([t.missing_go_to_left for t in trees]).astype(np.uint8)
+    arrays[f"{name}.value"] = np.concatenate(value).astype(np.float64)
+    arrays[f"{name}.roots"] = offsets.astype(np.int32)
+    arrays[f"{name}.groups"] = np.cumsum([0] + [len(f.estimators_) for f in forests[:-1]]).astype(np.int32)
+
+    classes = None
+    forest = forests[0]
+    if isinstance(forest, RandomForestClassifier):
+        classes = forest.classes_ if forest.n_outputs_ > 1 else [forest.classes_]
+        classes = [[c.item() for c in cls] for cls in classes]
+    return {
+        "name": name,
+        "n_outputs": int(forest.n_outputs_),
+        "classes": classes,
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "feature_names": _feature_names(forest),
+    }
+
+
+def _flatten_calibrated(model: CalibratedClassifierCV, name: str, arrays: dict) -> dict:
+    if model.method != "sigmoid":
+        raise ValueError(f"unsupported calibration method: {model.method}")
+
+    classes = model.classes_
+    calib, fold, col, cls = [], [], [], []
+    for i, cc in enumerate(model.calibrated_classifiers_):
+        class_idx = np.searchsorted(classes, cc.estimator.classes_)
+        # 2クラスのときは正例（classes[1]）の確率を入力にする較正器が1つだけ
+        cols = [1] if len(classes) == 2 else range(len(class_idx))
+        for j, calibrator in zip(cols, cc.calibrators):
+            calib.append([calibrator.a_, calibrator.b_])
+            fold.append(i)
+            col.append(j)
+            cls.append(class_idx[j])
+
+    arrays[f"{name}.calib"] = np.array(calib, dtype=np.float64).reshape(-1, 2)
+    arrays[f"{name}.calib_fold"] = np.array(fold, dtype=np.int32)
+    arrays[f"{name}.calib_col"] = np.array(col, dtype=np.int32)
+    arrays[f"{name}.calib_class"] = np.array(cls, dtype=np.int32)
+
+    forests = [cc.estimator for cc in model.calibrated_classifiers_]
+    return {
+        "name": name,
+        "classes": [c.item() for c in classes],
+        "forest": _flatten_forest(forests, f"{name}.folds", arrays, n_classes=len(classes)),
+        "feature_names": _feature_names(model),
+    }
+
+
+def _feature_names(model):
+    names = getattr(model, "feature_names_in_", None)
+    return None if names is None else [str(n) for n in names]
+
+
+def _flatten_joint(model: MultiHorizonModel, prefix: str, arrays: dict) -> dict:
+    return {
+        "horizons": model.horizons,
+        "calib": [{str(c): list(ab) for c, ab in per_class.items()} for per_class in model.calib],
+        "price": _flatten_forest(model.price, f"{prefix}price", arrays),
+        "direction": _flatten_forest(model.direction, f"{prefix}direction", arrays),
+    }
+
+
+def flatten(model) -> tuple[dict, dict]:
+    """
+    Returns:
+        (メタ情報, 配列 {名前: ndarray})
+    """
+    arrays = {}
+    if isinstance(model, RandomForestRegressor):
+        meta = {"type": "price", "price": _flatten_forest(model, "price", arrays)}
+    elif isinstance(model, CalibratedClassifierCV):
+        meta = {"type": "direction", "direction": _flatten_calibrated(model, "direction", arrays)}
+    elif isinstance(model, MultiHorizonModel):
+        meta = {"type": "joint", **_flatten_joint(model, "", arrays)}
+    elif isinstance(model, HorizonGroups):
+        meta = {
+            "type": "joint_groups",
+            "groups": [_flatten_joint(g, f"g{i}.", arrays) for i, g in enumerate(model.groups)],
+        }
+    elif isinstance(model, GlobalModel):
+        meta = {
+            "type": "global",
+            "interval": model.interval,
+            "horizon": model.horizon,
+            "market_caps": model.market_caps,
+            "price": _flatten_forest(model.price, "price", arrays),
+            "direction": _flatten_calibrated(model.direction, "direction", arrays),
+        }
+    else:
+        raise TypeError(f"unsupported model: {type(model).__name__}")
+    return meta, arrays
+
+
+def write(path, meta: dict, arrays: dict):
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset = _align(offset + arr.nbytes)
+
+    header = json.dumps({"format": FORMAT_VERSION, "meta": meta, "arrays": layout}).encode()
+    base = _align(len(MAGIC) + 8 + len(header))
+
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.seek(base + layout[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(base + offset)
+    os.replace(tmp, path)
+
+
+def export(model_path, check: bool = True) -> Path:
+    """
+    pkl を .forest に書き出す。check なら書き出したものを読み直して sklearn と照合する（不一致なら消して例外）。
+    """
+    model = joblib.load(model_path)
+    meta, arrays = flatten(model)
+    path = flat_path(model_path)
+    write(path, meta, arrays)
+
+    if check:
+        try:
+            check_parity(model, load(path))
+        except AssertionError:
+            path.unlink(missing_ok=True)
+            raise
+    model_registry.attach(model_path)
+    return path
+
+
+# =====================
+# Load
+# =====================
+
+def is_current(path) -> bool:
+    """
+    今の FORMAT_VERSION で書かれた .forest か（古い形式は書き出し直す）。
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + 8)
+            if head[:len(MAGIC)] != MAGIC:
+                return False
+            header = json.loads(f.read(int.from_bytes(head[len(MAGIC):], "little")))
+    except (OSError, ValueError):
+        return False
+    return header.get("format") == FORMAT_VERSION
+
+
+def _read(path) -> tuple[dict, dict]:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"not a flat forest file: {path}")
+    n = int.from_bytes(mm[len(MAGIC):len(MAGIC) + 8], "little")
+    header = json.loads(mm[len(MAGIC) + 8:len(MAGIC) + 8 + n])
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"unsupported format {header['format']}: {path}")
+
+    base = _align(len(MAGIC) + 8 + n)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        count = math.prod(spec["shape"])
+        if count == 0:
+            arrays[name] = np.empty(spec["shape"], dtype=spec["dtype"])
+            continue
+        arr = np.frombuffer(mm, dtype=spec["dtype"], count=count, offset=base + spec["offset"])
+        arrays[name] = arr.reshape(spec["shape"])
+    return header["meta"], arrays
+
+
+def _forest(spec: dict, arrays: dict) -> FlatForest:
+    name = spec["name"]
+    fields = ("feature", "threshold", "children", "missing_left", "value", "roots", "groups")
+    return FlatForest(
+        {f: arrays[f"{name}.{f}"] for f in fields},
+        spec["n_outputs"], spec["classes"], spec["feature_names"], spec["max_depth"],
+    )
+
+
+def _calibrated(spec: dict, arrays: dict) -> FlatCalibrated:
+    name = spec["name"]
+    calib = {key: arrays[f"{name}.calib{suffix}"]
+             for key, suffix in (("calib", ""), ("fold", "_fold"), ("col", "_col"), ("class", "_class"))}
+    return FlatCalibrated(_forest(spec["forest"], arrays), calib, spec["classes"], spec["feature_names"])
+
+
+def _joint(spec: dict, arrays: dict) -> MultiHorizonModel:
+    calib = [{int(c): tuple(ab) for c, ab in per_class.items()} for per_class in spec["calib"]]
+    return MultiHorizonModel(spec["horizons"], _forest(spec["price"], arrays),
+                             _forest(spec["direction"], arrays), calib)
+
+
+def load(path):
+    """
+    .forest を mmap で開いて pkl と同じ使い方ができるモデルを返す。
+    """
+    meta, arrays = _read(path)
+    kind = meta["type"]
+    if kind == "price":
+        return _forest(meta["price"], arrays)
+    if kind == "direction":
+        return _calibrated(meta["direction"], arrays)
+    if kind == "joint":
+        return _joint(meta, arrays)
+    if kind == "joint_groups":
+        return HorizonGroups([_joint(g, arrays) for g in meta["groups"]])
+    if kind == "global":
+        return GlobalModel(meta["interval"], meta["horizon"], _forest(meta["price"], arrays),
+                           _calibrated(meta["direction"], arrays), meta["market_caps"])
+    raise ValueError(f"unknown model type: {kind}")
+
+
+def load_artifact(model_path):
+    """
+    pkl と同じかより新しい .forest があればそれを、無ければ pkl を読む。
+    """
+    model_path = Path(model_path)
+    path = flat_path(model_path)
+    try:
+        flat_mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return joblib.load(model_path)
+    try:
+        stale = model_path.stat().st_mtime_ns > flat_mtime
+    except FileNotFoundError:
+        stale = False
+    if stale:
+        return joblib.load(model_path)
+    try:
+        return load(path)
+    except ValueError:
+        # 古い形式（書き出し直し待ち）
+        if not model_path.exists():
+            raise
+        return joblib.load(model_path)
+
+
+# =====================
+# Parity
+# =====================
+
+def _forests(model) -> list:
+    if isinstance(model, RandomForestRegressor | RandomForestClassifier):
+        return [model]
+    if isinstance(model, CalibratedClassifierCV):
+        return [cc.estimator for cc in model.calibrated_classifiers_]
+    if isinstance(model, MultiHorizonModel | GlobalModel):
+        return _forests(model.price) + _forests(model.direction)
+    if isinstance(model, HorizonGroups):
+        return [f for g in model.groups for f in _forests(g)]
+    return []
+
+
+def probe_rows(model, n: int = PROBE_ROWS, seed: int = 0) -> np.ndarray:
+    """
+    しきい値の前後の値を組み合わせた入力（どの分岐も通るように）。
+    """
+    rng = np.random.default_rng(seed)
+    forests = _forests(model)
+    n_features = forests[0].n_features_in_
+
+    thresholds = [[] for _ in range(n_features)]
+    for forest in forests:
+        for est in forest.estimators_:
+            tree = est.tree_
+            # 欠損値の分岐はしきい値が inf になるので除く
+            inner = (tree.children_left >= 0) & np.isfinite(tree.threshold)
+            for f, t in zip(tree.feature[inner], tree.threshold[inner]):
+                thresholds[f].append(t)
+
+    X = np.zeros((n, n_features))
+    for f, ts in enumerate(thresholds):
+        if not ts:
+            continue
+        ts = np.asarray(ts)
+        picked = rng.choice(ts, size=n)
+        spread = np.maximum(np.abs(picked) * 1e-3, 1e-6)
+        X[:, f] = picked + rng.choice([-1.0, 1.0], size=n) * spread
+    return X
+
+
+def _assert_close(name: str, expected, actual):
+    expected, actual = np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)
+    if expected.shape != actual.shape or not np.allclose(expected, actual, rtol=RTOL, atol=ATOL):
+        diff = np.max(np.abs(expected - actual)) if expected.shape == actual.shape else "shape"
+        raise AssertionError(f"{name} mismatch (max diff {diff})")
+
+
+def check_parity(model, flat, X=None):
+    """
+    sklearn のモデルと平坦化したモデルの予測を照合する（不一致なら AssertionError）。
+    X を省くと probe_rows を使う。
+    """
+    if isinstance(model, GlobalModel):
+        check_parity(model.price, flat.price, X)
+        check_parity(model.direction, flat.direction, X)
+        return
+    if isinstance(model, MultiHorizonModel):
+        check_parity(model.price, flat.price, X)
+        check_parity(model.direction, flat.direction, X)
+        return
+    if isinstance(model, HorizonGroups):
+        for g, flat_g in zip(model.groups, flat.groups, strict=True):
+            check_parity(g, flat_g, X)
+        return
+
+    if X is None:
+        X = probe_rows(model)
+    names = _feature_names(model)
+    if names is not None and not hasattr(X, "columns"):
+        X = pd.DataFrame(X, columns=names)
+
+    if isinstance(model, RandomForestRegressor):
+        _assert_close("predict", model.predict(X), flat.predict(X))
+        return
+
+    proba, flat_proba = model.predict_proba(X), flat.predict_proba(X)
+    proba = proba if isinstance(proba, list) else [proba]
+    flat_proba = flat_proba if isinstance(flat_proba, list) else [flat_proba]
+    for k, (p, q) in enumerate(zip(proba, flat_proba)):
+        _assert_close(f"predict_proba[{k}]", p, q)
+
+
+# =====================
+# CLI
+# =====================
+
+def export_all(model_dir=MODEL_DIR) -> dict:
+    summary = {"exported": 0, "fresh": 0, "failed": 0}
+    for model_path in sorted(Path(model_dir).glob("*.pkl")):
+        path = flat_path(model_path)
+        if (path.exists() and path.stat().st_mtime_ns >= model_path.stat().st_mtime_ns
+                and is_current(path)):
+            summary["fresh"] += 1
+            continue
+        try:
+            export(model_path)
+        except Exception as e:
+            summary["failed"] += 1
+            print(f"[ERROR] {model_path.name}: {e}")
+        else:
+            summary["exported"] += 1
+            print(f"[OK] {path.name}")
+    print(f"[FLAT] exported={summary['exported']} fresh={summary['fresh']} failed={summary['failed']}")
+    return summary
+
+
+def check_all(model_dir=MODEL_DIR) -> int:
+    failed = 0
+    for path in sorted(Path(model_dir).glob("*.forest")):
+        model_path = path.with_suffix(".pkl")
+        if not model_path.exists():
+            continue
+        try:
+            check_parity(joblib.load(model_path), load(path))
+        except AssertionError as e:
+            failed += 1
+            print(f"[MISMATCH] {path.name}: {e}")
+        else:
+            print(f"[OK] {path.name}")
+    return failed
+
+
+def main():
+    if sys.argv[1:2] == ["check"]:
+        sys.exit(1 if check_all() else 0)
+    export_all()
+
+
+if __name__ == "__main__":
+    main()
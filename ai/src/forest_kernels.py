@@ -0,0 +1,91 @@
+# ai/src/forest_kernels.py
+#
+# 平坦化した森（ai.src.flat_forest）の推論カーネル（NumPy のみ）。
+#
+# sklearn の predict / predict_proba は木ごとに Python から Cython を呼び、入力検査と
+# スレッドの振り分けもその都度行うので、1行の推論でも 300 本 × 森の数だけの固定費がかかる。
+# ここでは全部の木を同時に1段ずつ下ろす（1段あたり数回の配列演算 × 深さ）。
+#
+# 数値は sklearn と同じになるようにしている:
+#   - 入力は float32 にしてから float64 のしきい値と比べる（sklearn の木と同じ）
+#   - 葉の値は木の順に逐次足してから本数で割る（np.add.accumulate。sum はペアワイズ加算になり丸めが変わる）
+#   - 較正は _SigmoidCalibration と同じ expit(-(a * p + b))、正規化も CalibratedClassifierCV と同じ手順
+# sklearn 側を n_jobs > 1 で動かすと木を足す順序がスレッド次第になるので、そのときだけ丸め誤差の差が出る。
+#
+# 平坦化した木の約束（flat_forest の書き出しが作る）:
+#   children[node] = (左, 右)。葉は自分自身を指す（深さぶん回せば途中で葉に着いた木はそこに留まる）
+#   feature[葉] = 0
+
+import numpy as np
+from scipy.special import expit
+
+
+def apply(X: np.ndarray, feature, threshold, children, missing_left, roots, depth: int) -> np.ndarray:
+    """
+    X: (n, 特徴量) float32（C 連続）
+
+    Returns:
+        葉のノード番号 (木, n)
+    """
+    n, n_features = X.shape
+    flat_x = X.ravel()
+    flat_children = children.ravel()
+    row_offset = np.arange(n) * n_features
+
+    node = np.repeat(roots[:, None], n, axis=1)
+    has_nan = bool(np.isnan(flat_x).any())
+
+    for _ in range(depth):
+        x = flat_x[feature[node] + row_offset]
+        right = x > threshold[node]
+        if has_nan:
+            # 欠損は学習時に決まった側へ（x > しきい値 は NaN で False になるので右行きだけ足す）
+            right |= np.isnan(x) & (missing_left[node] == 0)
+        node = flat_children[2 * node + right]
+    return node
+
+
+def leaf_mean(value: np.ndarray, leaves: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    value: (ノード, 出力, クラス), leaves: (木, n), groups: 各グループ（森）の先頭の木
+
+    Returns:
+        グループごとの葉の値の平均 (グループ, n, 出力, クラス)
+    """
+    values = value[leaves]
+    ends = np.append(groups[1:], len(leaves))
+
+    out = np.empty((len(groups),) + values.shape[1:])
+    for g, (start, end) in enumerate(zip(groups, ends)):
+        out[g] = np.add.accumulate(values[start:end], axis=0)[-1]
+        out[g] /= end - start
+    return out
+
+
+def calibrate_sigmoid(pred: np.ndarray, calib, calib_fold, calib_col, calib_class, n_classes: int) -> np.ndarray:
+    """
+    CalibratedClassifierCV(method="sigmoid", ensemble=True) の predict_proba。
+
+    pred: fold ごとの森の確率 (fold, n, クラス)
+    calib: 較正器ごとの (a, b)。calib_fold / calib_col / calib_class はその較正器の
+           fold・入力にする pred の列・出力するクラスの位置
+
+    Returns:
+        (n, n_classes)
+    """
+    folds, n = pred.shape[0], pred.shape[1]
+    p = pred[calib_fold, :, calib_col]
+    a, b = calib[:, 0, None], calib[:, 1, None]
+
+    proba = np.zeros((folds, n, n_classes))
+    proba[calib_fold, :, calib_class] = expit(-(a * p + b))
+
+    if n_classes == 2:
+        proba[:, :, 0] = 1.0 - proba[:, :, 1]
+    else:
+        denominator = np.sum(proba, axis=2, keepdims=True)
+        uniform = np.full_like(proba, 1 / n_classes)
+        proba = np.divide(proba, denominator, out=uniform, where=denominator != 0)
+
+    proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+    return np.add.accumulate(proba, axis=0)[-1] / folds
@@ -1,33 +1,23 @@
-import requests
 import json
 from pathlib import Path
 
+from ai.src import universe
+
 OUTPUT_PATH = Path("ai/data/top300_usdt.json")
 OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-BINANCE_TICKER_URL = "https://api.binance.com/api/v3/ticker/24hr"
-
-
 def fetch_all_tickers():
     print("Fetching 24h ticker data from Binance...")
-    res = requests.get(BINANCE_TICKER_URL, timeout=30)
-    res.raise_for_status()
-    return res.json()
+    return universe.tickers_24h(allow_fetch=True)
 
 
 def filter_usdt_pairs(tickers):
     usdt = []
-    for t in tickers:
-        symbol = t["symbol"]
+    for symbol, t in tickers.items():
         if symbol.endswith("USDT"):
-            try:
-                quote_volume = float(t["quoteVolume"])
-            except:
-                quote_volume = 0.0
-
             usdt.append({
                 "symbol": symbol,
-                "quoteVolume": quote_volume
+                "quoteVolume": t["quote_volume"]
             })
 
     return usdt
@@ -0,0 +1,127 @@
+# ai/src/global_models.py
+#
+# 全銘柄をまとめて学習するグローバルモデル（ai.src.train_global が作る）。
+#
+#   ai/models/global_{interval}_h{horizon}.pkl
+#     price:       RandomForestRegressor（horizon 本先の終値の変化率を予測）
+#     direction:   CalibratedClassifierCV(RandomForestClassifier)（上昇 1 / 横ばい 0 / 下落 -1）
+#     market_caps: 学習時の時価総額 {symbol: USD}
+#
+# 銘柄ごとのモデルと違って価格の水準が銘柄で桁違いなので、normalize で
+#   - 価格系の列（open / high / low / close / ma / ema）は close に対する比 - 1
+#   - 出来高は volume_ma に対する比、volume_ma は log10 の売買代金
+#   - 銘柄の記述子として log10 の時価総額（不明なら 0）
+# に変えてから学習・予測する（変化率・RSI などはもともと銘柄に依らないのでそのまま）。
+#
+# for_symbol(symbol) の price_model / direction_model は銘柄ごとのモデル（*_price_h{h}.pkl /
+# *_direction_h{h}.pkl）と同じ使い方（生の特徴量を渡す predict / predict_proba / classes_ /
+# feature_names_in_）ができるビューを返す。
+
+import numpy as np
+import pandas as pd
+
+from ai.src.features import FEATURE_COLUMNS
+from ai.src.kline_store import PRICE_COLUMNS
+
+
+# 生の特徴量の列（make_features の出力から open_time を除いたもの）
+RAW_COLUMNS = PRICE_COLUMNS + FEATURE_COLUMNS
+
+PRICE_LEVEL_COLUMNS = ["open", "high", "low", "close", "ma_5", "ma_20", "ema_20", "ema_50"]
+
+GLOBAL_COLUMNS = [
+    *[f"{col}_rel" for col in PRICE_LEVEL_COLUMNS if col != "close"],
+    "ema_diff_rel",
+    "return", "return_3", "return_6",
+    "rsi", "volatility", "volatility_20", "bb_width",
+    "volume_rel", "log_dollar_volume", "volume_change",
+    "log_market_cap",
+]
+
+
+def model_path(model_dir, interval: str, horizon: int):
+    return model_dir / f"global_{interval}_h{horizon}.pkl"
+
+
+def log_market_cap(market_cap) -> float:
+    return float(np.log10(market_cap)) if market_cap else 0.0
+
+
+def normalize(df_feat: pd.DataFrame, market_cap=None) -> pd.DataFrame:
+    """
+    生の特徴量（make_features の列）から GLOBAL_COLUMNS のフレームを作る（index はそのまま）。
+    """
+    close = df_feat["close"].to_numpy(dtype=np.float64)
+    volume = df_feat["volume"].to_numpy(dtype=np.float64)
+    volume_ma = df_feat["volume_ma"].to_numpy(dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {
+            f"{col}_rel": df_feat[col].to_numpy(dtype=np.float64) / close - 1
+            for col in PRICE_LEVEL_COLUMNS if col != "close"
+        }
+        out["ema_diff_rel"] = df_feat["ema_diff"].to_numpy(dtype=np.float64) / close
+        for col in ["return", "return_3", "return_6", "rsi", "volatility", "volatility_20", "bb_width",
+                    "volume_change"]:
+            out[col] = df_feat[col].to_numpy(dtype=np.float64)
+        out["volume_rel"] = volume / volume_ma
+        out["log_dollar_volume"] = np.log10(close * volume_ma)
+        out["log_market_cap"] = np.full(len(df_feat), log_market_cap(market_cap))
+
+    X = pd.DataFrame(out, index=df_feat.index)[GLOBAL_COLUMNS]
+    # 出来高 0 の足などで出る inf / NaN は 0 に寄せる（RandomForest に渡せるように）
+    return X.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+
+
+class GlobalModel:
+
+    def __init__(self, interval: str, horizon: int, price, direction, market_caps: dict):
+        self.interval = interval
+        self.horizon = horizon
+        self.price = price
+        self.direction = direction
+        self.market_caps = market_caps
+
+    def features(self, X, symbol: str) -> pd.DataFrame:
+        return normalize(X, self.market_caps.get(symbol))
+
+    def price_model(self, symbol: str) -> "GlobalPriceView":
+        return GlobalPriceView(self, symbol)
+
+    def direction_model(self, symbol: str) -> "GlobalDirectionView":
+        return GlobalDirectionView(self, symbol)
+
+
+class GlobalPriceView:
+    """
+    1銘柄分の価格モデル（RandomForestRegressor と同じ predict。終値を返す）
+    """
+
+    feature_names_in_ = np.array(RAW_COLUMNS, dtype=object)
+
+    def __init__(self, model: GlobalModel, symbol: str):
+        self.model = model
+        self.symbol = symbol
+
+    def predict(self, X) -> np.ndarray:
+        change = self.model.price.predict(self.model.features(X, self.symbol))
+        return X["close"].to_numpy(dtype=np.float64) * (1 + change)
+
+
+class GlobalDirectionView:
+    """
+    1銘柄分の方向モデル（CalibratedClassifierCV と同じ predict_proba / predict / classes_）
+    """
+
+    feature_names_in_ = np.array(RAW_COLUMNS, dtype=object)
+
+    def __init__(self, model: GlobalModel, symbol: str):
+        self.model = model
+        self.symbol = symbol
+        self.classes_ = model.direction.classes_
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.model.direction.predict_proba(self.model.features(X, self.symbol))
+
+    def predict(self, X) -> np.ndarray:
+        return self.model.direction.predict(self.model.features(X, self.symbol))
@@ -0,0 +1,141 @@
+# ai/src/horizon_models.py
+#
+# 全ホライゾンをまとめて学習したモデル（ai.src.train_joint が作る）。
+#
+#   ai/models/{symbol}_{interval}_joint.pkl
+#     price:     多出力の RandomForestRegressor（出力 i = horizons[i] 本先の終値）
+#     direction: 多出力の RandomForestClassifier（出力 i = horizons[i] 本先の上昇 1 / 横ばい 0 / 下落 -1）
+#     calib:     ホライゾン・クラスごとのシグモイド較正 {class: (a, b)}（p' = 1 / (1 + exp(-(a * p + b)))）
+#
+# train_joint はホライゾンを 2 の冪ごとのグループ（[1], [2, 3], [4..7], ...）に分け、グループごとに
+# MultiHorizonModel を1つ作って HorizonGroups にまとめる。多出力の森は全出力のターゲットが揃う行でしか
+# 学習できないので、グループの最大ホライゾンぶん末尾の行が落ちる。グループに分けることで
+# h1 は全行を使い、どのホライゾンも落ちる行は h 本未満になる。
+#
+# price_model(h) / direction_model(h) は、ホライゾンごとのモデル（*_price_h{h}.pkl /
+# *_direction_h{h}.pkl）と同じ使い方（predict / predict_proba / classes_ / feature_names_in_）が
+# できるビューを返すので、predict 側はどちらのモデルかを気にしなくてよい。
+
+import numpy as np
+
+
+class MultiHorizonModel:
+
+    def __init__(self, horizons, price, direction, calib):
+        self.horizons = list(horizons)
+        self.price = price
+        self.direction = direction
+        self.calib = calib
+        self.feature_names_in_ = price.feature_names_in_
+
+    def __contains__(self, horizon: int) -> bool:
+        return horizon in self.horizons
+
+    def _index(self, horizon: int) -> int:
+        return self.horizons.index(horizon)
+
+    def predict_prices(self, X) -> np.ndarray:
+        """
+        Returns:
+            (n, len(horizons))
+        """
+        return self.price.predict(X).reshape(len(X), -1)
+
+    def direction_classes(self, i: int) -> np.ndarray:
+        classes = self.direction.classes_
+        return classes[i] if isinstance(classes, list) else classes
+
+    def predict_direction_proba(self, X, i: int) -> np.ndarray:
+        """
+        i 番目のホライゾンの較正済み確率 (n, n_classes)。
+        """
+        proba = self.direction.predict_proba(X)
+        raw = proba[i] if isinstance(proba, list) else proba
+        classes = self.direction_classes(i)
+
+        out = np.empty_like(raw)
+        for j, cls in enumerate(classes):
+            ab = self.calib[i].get(int(cls))
+            if ab is None:
+                out[:, j] = raw[:, j]
+            else:
+                a, b = ab
+                out[:, j] = 1.0 / (1.0 + np.exp(-(a * raw[:, j] + b)))
+
+        total = out.sum(axis=1, keepdims=True)
+        uniform = np.full_like(out, 1.0 / out.shape[1])
+        return np.divide(out, total, out=uniform, where=total != 0)
+
+    def price_model(self, horizon: int) -> "PriceView":
+        return PriceView(self, self._index(horizon))
+
+    def direction_model(self, horizon: int) -> "DirectionView":
+        return DirectionView(self, self._index(horizon))
+
+
+def horizon_groups(horizons) -> list[list[int]]:
+    """
+    [1, 2, ..., 30] → [[1], [2, 3], [4..7], [8..15], [16..30]]
+    """
+    groups = {}
+    for h in sorted(set(int(h) for h in horizons)):
+        groups.setdefault(h.bit_length(), []).append(h)
+    return list(groups.values())
+
+
+class HorizonGroups:
+    """
+    ホライゾンのグループごとの MultiHorizonModel をまとめたもの（MultiHorizonModel と同じ使い方）。
+    """
+
+    def __init__(self, groups: list[MultiHorizonModel]):
+        self.groups = list(groups)
+        self.horizons = [h for g in self.groups for h in g.horizons]
+        self.feature_names_in_ = self.groups[0].feature_names_in_
+
+    def __contains__(self, horizon: int) -> bool:
+        return horizon in self.horizons
+
+    def _group(self, horizon: int) -> MultiHorizonModel:
+        for g in self.groups:
+            if horizon in g:
+                return g
+        raise ValueError(f"horizon not in model: {horizon}")
+
+    def price_model(self, horizon: int) -> "PriceView":
+        return self._group(horizon).price_model(horizon)
+
+    def direction_model(self, horizon: int) -> "DirectionView":
+        return self._group(horizon).direction_model(horizon)
+
+
+class PriceView:
+    """
+    ホライゾン1本分の価格モデル（RandomForestRegressor と同じ predict）
+    """
+
+    def __init__(self, joint: MultiHorizonModel, i: int):
+        self.joint = joint
+        self.i = i
+        self.feature_names_in_ = joint.feature_names_in_
+
+    def predict(self, X) -> np.ndarray:
+        return self.joint.predict_prices(X)[:, self.i]
+
+
+class DirectionView:
+    """
+    ホライゾン1本分の方向モデル（CalibratedClassifierCV と同じ predict_proba / predict / classes_）
+    """
+
+    def __init__(self, joint: MultiHorizonModel, i: int):
+        self.joint = joint
+        self.i = i
+        self.feature_names_in_ = joint.feature_names_in_
+        self.classes_ = joint.direction_classes(i)
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.joint.predict_direction_proba(X, self.i)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
@@ -0,0 +1,266 @@
+# ai/src/kline_fetcher.py
+#
+# asyncio ベースの kline 並列フェッチャー。
+#
+# - requests.Session（keep-alive / コネクションプール）をスレッドで並列実行
+# - asyncio.Semaphore で同時接続数を制限
+# - Binance の X-MBX-USED-WEIGHT-1M ヘッダーに同期するトークンバケット
+# - 429 / 418 / 5xx は Retry-After と指数バックオフで再試行
+# - 銘柄ごとのレイテンシを記録してサマリーを出す
+#
+# BINANCE_API_URL / API_STANDIN_URL でローカルのスタブサーバーに向けられる。
+
+import asyncio
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai.src.api_endpoints import BINANCE_API_URL
+from ai.src.kline_store import parse_klines
+
+
+KLINES_PATH = "/api/v3/klines"
+
+# Binance REQUEST_WEIGHT 上限（1分あたり）。余裕を持たせて使う割合。
+WEIGHT_LIMIT_1M = int(os.getenv("BINANCE_WEIGHT_LIMIT", 6000))
+WEIGHT_SAFETY = 0.8
+
+DEFAULT_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 8))
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+RETRY_STATUS = {418, 429, 500, 502, 503, 504}
+
+
+def klines_weight(limit: int) -> int:
+    """
+    /api/v3/klines の limit ごとのリクエストウェイト。
+    """
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+# =====================
+# Rate limiter
+# =====================
+
+class WeightLimiter:
+    """
+    1分あたりのウェイト上限を守るトークンバケット。
+    サーバーが返す X-MBX-USED-WEIGHT-1M で残量を補正する。
+    """
+
+    def __init__(self, limit_per_minute: int = WEIGHT_LIMIT_1M, safety: float = WEIGHT_SAFETY):
+        self.capacity = limit_per_minute * safety
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight: int):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def observe(self, headers):
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("X-MBX-USED-WEIGHT")
+        if used is None:
+            return
+        try:
+            used = int(used)
+        except ValueError:
+            return
+
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+# =====================
+# Fetcher
+# =====================
+
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _retry_after(response, attempt: int) -> float:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * (1 + random.random() * 0.25)
+
+
+class KlineFetcher:
+
+    def __init__(
+        self,
+        base_url: str = BINANCE_API_URL,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        limiter: WeightLimiter | None = None,
+        timeout: float = 15,
+    ):
+        self.url = base_url.rstrip("/") + KLINES_PATH
+        self.concurrency = concurrency
+        self.limiter = limiter or WeightLimiter()
+        self.timeout = timeout
+        self.session = make_session(concurrency)
+        self._sem = asyncio.Semaphore(concurrency)
+
+    def close(self):
+        self.session.close()
+
+    async def fetch(self, symbol: str, interval: str, limit: int = 1000, start_time: int | None = None):
+        """
+        1リクエスト分の kline を取得して構造化配列で返す。
+        """
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+
+        weight = klines_weight(limit)
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire(weight)
+
+            response = None
+            try:
+                async with self._sem:
+                    response = await asyncio.to_thread(
+                        self.session.get, self.url, params=params, timeout=self.timeout
+                    )
+            except requests.RequestException as e:
+                if attempt >= MAX_RETRIES:
+                    raise
+                wait = _retry_after(None, attempt)
+                print(f"[RETRY] {symbol} {interval}: {e} (wait {wait:.1f}s)", flush=True)
+                await asyncio.sleep(wait)
+                continue
+
+            self.limiter.observe(response.headers)
+
+            if response.status_code == 200:
+                return parse_klines(response.json())
+
+            if response.status_code not in RETRY_STATUS or attempt >= MAX_RETRIES:
+                raise Exception(f"HTTP {response.status_code} {response.text}")
+
+            wait = _retry_after(response, attempt)
+            if response.status_code in (418, 429):
+                # レート超過・BAN 中は全リクエストを止める
+                self.limiter.block(wait)
+
+            print(f"[RETRY] {symbol} {interval}: HTTP {response.status_code} (wait {wait:.1f}s)", flush=True)
+            await asyncio.sleep(wait)
+
+    async def _fetch_symbol(self, symbol, interval, limit, start_time, on_result):
+        started = time.perf_counter()
+        result = {"symbol": symbol, "interval": interval, "rows": None, "error": None}
+
+        try:
+            result["rows"] = await self.fetch(symbol, interval, limit, start_time)
+        except Exception as e:
+            result["error"] = str(e)
+
+        result["latency"] = time.perf_counter() - started
+
+        if on_result is not None and result["error"] is None:
+            try:
+                await asyncio.to_thread(on_result, result)
+            except Exception as e:
+                result["error"] = f"save failed: {e}"
+
+        return result
+
+    async def fetch_many(self, symbols, interval: str, limit: int = 1000, start_times=None, on_result=None,
+                         limits=None):
+        """
+        複数銘柄を並列取得する。
+
+        start_times: {symbol: epoch ms} を渡すとその時刻から取得する
+        limits:      {symbol: limit} で銘柄ごとに本数を変える（未指定は limit）
+        on_result:   1銘柄終わるごとに呼ばれる（保存処理など）。スレッドで実行される。
+        """
+        start_times = start_times or {}
+        limits = limits or {}
+        tasks = [
+            self._fetch_symbol(s, interval, limits.get(s, limit), start_times.get(s), on_result)
+            for s in symbols
+        ]
+        return await asyncio.gather(*tasks)
+
+
+# =====================
+# Sync entry
+# =====================
+
+def fetch_all(symbols, interval: str, limit: int = 1000, start_times=None, on_result=None,
+              concurrency: int = DEFAULT_CONCURRENCY, base_url: str = BINANCE_API_URL, limits=None):
+
+    async def run():
+        fetcher = KlineFetcher(base_url=base_url, concurrency=concurrency)
+        try:
+            return await fetcher.fetch_many(symbols, interval, limit, start_times, on_result, limits)
+        finally:
+            fetcher.close()
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    report(results, time.perf_counter() - started)
+    return results
+
+
+def report(results, elapsed: float):
+    latencies = sorted(r["latency"] for r in results)
+    errors = [r for r in results if r["error"]]
+
+    if not latencies:
+        print("[FETCH] no symbols")
+        return
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    print(
+        f"[FETCH] {len(results)} symbols in {elapsed:.1f}s "
+        f"(ok={len(results) - len(errors)}, error={len(errors)}, "
+        f"p50={pct(0.5) * 1000:.0f}ms, p95={pct(0.95) * 1000:.0f}ms, max={latencies[-1] * 1000:.0f}ms)",
+        flush=True,
+    )
+
+    for r in errors:
+        print(f"[ERROR] {r['symbol']} {r['interval']}: {r['error']}", flush=True)
@@ -0,0 +1,190 @@
+# ai/src/kline_gaps.py
+#
+# 欠損足の集計と自動補修。
+#
+# 欠損インデックス（kline_store.update_gaps が書く gaps.json）だけを読むので、
+# 900 系列のスキャンでもローソク足本体はロードしない。
+#
+#   python -m ai.src.kline_gaps scan            # 集計のみ
+#   python -m ai.src.kline_gaps repair [1h]     # 欠損区間だけ再取得
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from ai.src.kline_fetcher import DEFAULT_CONCURRENCY, KlineFetcher
+from ai.src.kline_store import (
+    INTERVAL_MS,
+    find_gaps,
+    list_symbols,
+    load_gaps,
+    publish_snapshot,
+    write_klines,
+)
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+METRICS_PATH = BASE_DIR / "ai" / "data" / "cache" / "kline_gaps.json"
+
+WINDOW_LIMIT = 1000
+FETCHED_INTERVALS = ["1h", "1d", "1w"]
+
+
+# =====================
+# Scan / metrics
+# =====================
+
+def scan(intervals=None) -> dict:
+    intervals = intervals or list(INTERVAL_MS)
+    metrics = {}
+
+    for interval in intervals:
+        m = {"series": 0, "series_with_gaps": 0, "gaps": 0, "missing": 0, "unfillable": 0, "worst": []}
+
+        for symbol in list_symbols(interval):
+            index = load_gaps(symbol, interval)
+            if index is None:
+                # インデックス未作成の系列はここで作る
+                publish_snapshot(symbol, interval)
+                index = load_gaps(symbol, interval)
+
+            m["series"] += 1
+            m["gaps"] += len(index["gaps"])
+            m["missing"] += index["missing"]
+            m["unfillable"] += len(index["unfillable"])
+            if index["gaps"]:
+                m["series_with_gaps"] += 1
+                m["worst"].append((symbol, index["missing"]))
+
+        m["worst"] = [
+            {"symbol": s, "missing": n}
+            for s, n in sorted(m["worst"], key=lambda x: x[1], reverse=True)[:10]
+        ]
+        metrics[interval] = m
+
+    return metrics
+
+
+def write_metrics(metrics: dict):
+    METRICS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    METRICS_PATH.write_text(json.dumps({
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "intervals": metrics,
+    }, indent=2))
+
+
+# =====================
+# Repair
+# =====================
+
+def _windows(gap, interval: str):
+    step = INTERVAL_MS[interval]
+    start, end = gap
+    while start <= end:
+        limit = int(min(WINDOW_LIMIT, (end - start) // step + 1))
+        yield start, start + (limit - 1) * step, limit
+        start += limit * step
+
+
+def _uncovered(open_time: np.ndarray, start: int, end: int, interval: str) -> list[list[int]]:
+    # [start, end] のうち open_time に無い部分区間
+    step = INTERVAL_MS[interval]
+    bounded = np.concatenate([[start - step], open_time, [end + step]]).astype(np.int64)
+    return find_gaps(bounded, interval).tolist()
+
+
+async def _repair(interval: str, symbols, concurrency: int):
+    targets = {}
+    for symbol in symbols:
+        index = load_gaps(symbol, interval)
+        if index and index["gaps"]:
+            targets[symbol] = index["gaps"]
+
+    print(f"[REPAIR] {interval}: {sum(len(g) for g in targets.values())} gaps in {len(targets)} series")
+
+    fetched = {s: [] for s in targets}
+    unfillable = {s: [] for s in targets}
+
+    fetcher = KlineFetcher(concurrency=concurrency)
+
+    async def run(symbol, start, end, limit):
+        rows = await fetcher.fetch(symbol, interval, limit, start_time=start)
+        rows = rows[(rows["open_time"] >= start) & (rows["open_time"] <= end)]
+        # 取引所側にも無い区間（メンテナンス停止など）。一部だけ返ってきたときは残りの部分区間
+        unfillable[symbol].extend(_uncovered(rows["open_time"], start, end, interval))
+        if len(rows) > 0:
+            fetched[symbol].append(rows)
+
+    tasks = [
+        run(symbol, start, end, limit)
+        for symbol, gaps in targets.items()
+        for gap in gaps
+        for start, end, limit in _windows(gap, interval)
+    ]
+
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        fetcher.close()
+
+    for r in results:
+        if isinstance(r, Exception):
+            print(f"[ERROR] {interval}: {r}")
+
+    repaired = 0
+    for symbol in targets:
+        for rows in fetched[symbol]:
+            repaired += write_klines(symbol, interval, rows, publish=False)
+        publish_snapshot(symbol, interval, unfillable[symbol])
+
+    return repaired
+
+
+def repair(interval: str, symbols=None, concurrency: int = DEFAULT_CONCURRENCY) -> int:
+    symbols = symbols if symbols is not None else list_symbols(interval)
+    repaired = asyncio.run(_repair(interval, symbols, concurrency))
+    print(f"[REPAIR] {interval}: {repaired} candles filled")
+    return repaired
+
+
+def rebuild(intervals=None):
+    """
+    全系列の欠損インデックスを作り直す（通常は追記時に自動更新される）。
+    """
+    for interval in intervals or list(INTERVAL_MS):
+        for symbol in list_symbols(interval):
+            publish_snapshot(symbol, interval)
+
+
+def print_metrics(metrics: dict):
+    for interval, m in metrics.items():
+        print(
+            f"[GAPS] {interval}: series={m['series']} with_gaps={m['series_with_gaps']} "
+            f"gaps={m['gaps']} missing={m['missing']} unfillable={m['unfillable']}"
+        )
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "scan"
+    intervals = sys.argv[2:] or None
+
+    if command == "repair":
+        for interval in intervals or FETCHED_INTERVALS:
+            repair(interval)
+    elif command == "rebuild":
+        rebuild(intervals)
+    elif command != "scan":
+        print("Usage: python -m ai.src.kline_gaps <scan|repair|rebuild> [interval ...]")
+        return
+
+    metrics = scan(intervals)
+    print_metrics(metrics)
+    write_metrics(metrics)
+
+
+if __name__ == "__main__":
+    main()
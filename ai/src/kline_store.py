@@ -0,0 +1,413 @@
+# ai/src/kline_store.py
+#
+# ローソク足（kline）の列指向ストア。
+#
+# CSV の代わりに NumPy の構造化配列（.npy）で保存する。
+#   - open_time は int64 の epoch ms（文字列パース不要）
+#   - open/high/low/close/volume は float64
+#   - 期間ごとのパーティションに分割し、追記時は末尾のパーティションだけを書き換える
+#
+# レイアウト:
+#   ai/data/klines/{interval}/{symbol}/{partition}.npy
+#   partition は 1h/4h → 月 ("2024-05")、1d/1w → 年 ("2024")
+#
+#   ai/data/klines/{interval}/{symbol}/gaps.json
+#   欠損足のインデックス（スナップショット更新のたびに作り直す）
+#
+#   ai/data/klines_mmap/{interval}/{symbol}.npy
+#   全期間を1ファイルに連結したスナップショット（API ワーカーが mmap で共有する）。
+#   書き込みのたびに tmp → os.replace でアトミックに差し替える。
+#
+# fetch / train / predict / evaluate はすべてこのモジュール経由で読み書きする。
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+STORE_DIR = BASE_DIR / "ai" / "data" / "klines"
+SNAPSHOT_DIR = BASE_DIR / "ai" / "data" / "klines_mmap"
+RAW_DIR = BASE_DIR / "ai" / "data" / "raw"
+
+KLINE_COLUMNS = ["open_time", "open", "high", "low", "close", "volume"]
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+KLINE_DTYPE = np.dtype(
+    [("open_time", "<i8")] + [(col, "<f8") for col in PRICE_COLUMNS]
+)
+
+INTERVAL_MS = {
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+    "1w": 7 * 24 * 60 * 60 * 1000,
+}
+
+# パーティション単位（numpy datetime64 の単位）
+PARTITION_UNIT = {
+    "1h": "M",
+    "4h": "M",
+    "1d": "Y",
+    "1w": "Y",
+}
+
+
+# =====================
+# Conversion
+# =====================
+
+def to_epoch_ms(values) -> np.ndarray:
+    """
+    open_time を int64 epoch ms に正規化する。
+    int / datetime / 文字列（旧CSV形式）のいずれも受け付ける。
+    """
+    s = pd.Series(values)
+
+    if pd.api.types.is_integer_dtype(s) or pd.api.types.is_float_dtype(s):
+        return s.to_numpy(dtype="int64")
+
+    ts = pd.to_datetime(s, utc=True)
+    return ts.astype("datetime64[ms, UTC]").astype("int64").to_numpy()
+
+
+def parse_klines(data) -> np.ndarray:
+    """
+    Binance /api/v3/klines のレスポンス（list of list）を構造化配列にする。
+    """
+    arr = np.empty(len(data), dtype=KLINE_DTYPE)
+
+    if len(data) == 0:
+        return arr
+
+    arr["open_time"] = [k[0] for k in data]
+    for i, col in enumerate(PRICE_COLUMNS, start=1):
+        arr[col] = np.asarray([k[i] for k in data], dtype=np.float64)
+
+    return arr
+
+
+def from_frame(df: pd.DataFrame) -> np.ndarray:
+    arr = np.empty(len(df), dtype=KLINE_DTYPE)
+    arr["open_time"] = to_epoch_ms(df["open_time"])
+    for col in PRICE_COLUMNS:
+        arr[col] = df[col].to_numpy(dtype=np.float64)
+    return arr
+
+
+def to_frame(arr: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({col: arr[col] for col in KLINE_COLUMNS})
+
+
+def _normalize(rows) -> np.ndarray:
+    """
+    open_time で昇順ソートし、重複は後勝ちで1本にまとめる。
+    """
+    if isinstance(rows, pd.DataFrame):
+        rows = from_frame(rows)
+    else:
+        rows = np.asarray(rows, dtype=KLINE_DTYPE)
+
+    if len(rows) == 0:
+        return rows
+
+    order = np.argsort(rows["open_time"], kind="stable")
+    rows = rows[order]
+
+    t = rows["open_time"]
+    keep = np.append(t[1:] != t[:-1], True)
+    return rows[keep]
+
+
+# =====================
+# Paths
+# =====================
+
+def series_dir(symbol: str, interval: str) -> Path:
+    return STORE_DIR / interval / symbol
+
+
+def gaps_path(symbol: str, interval: str) -> Path:
+    return series_dir(symbol, interval) / "gaps.json"
+
+
+def snapshot_path(symbol: str, interval: str) -> Path:
+    return SNAPSHOT_DIR / interval / f"{symbol}.npy"
+
+
+def _partition_keys(open_time: np.ndarray, interval: str) -> np.ndarray:
+    unit = PARTITION_UNIT.get(interval, "Y")
+    return open_time.astype("datetime64[ms]").astype(f"datetime64[{unit}]")
+
+
+def _partition_files(symbol: str, interval: str) -> list[Path]:
+    d = series_dir(symbol, interval)
+    if not d.exists():
+        return []
+    return sorted(d.glob("*.npy"))
+
+
+def _atomic_save(path: Path, arr: np.ndarray):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+# =====================
+# Read
+# =====================
+
+def has_klines(symbol: str, interval: str) -> bool:
+    return len(_partition_files(symbol, interval)) > 0
+
+
+def list_symbols(interval: str) -> list[str]:
+    d = STORE_DIR / interval
+    if not d.exists():
+        return []
+    return sorted(p.name for p in d.iterdir() if p.is_dir() and any(p.glob("*.npy")))
+
+
+def read_array(symbol: str, interval: str, tail: int | None = None) -> np.ndarray:
+    """
+    構造化配列で読む。tail 指定時は末尾のパーティションから必要な分だけ読む。
+    """
+    files = _partition_files(symbol, interval)
+    if not files:
+        raise FileNotFoundError(f"Klines not found: {symbol} {interval}")
+
+    parts = []
+    count = 0
+    for path in reversed(files):
+        part = np.load(path, allow_pickle=False)
+        parts.append(part)
+        count += len(part)
+        if tail is not None and count >= tail:
+            break
+
+    arr = np.concatenate(parts[::-1]) if len(parts) > 1 else parts[0]
+
+    if tail is not None:
+        arr = arr[-tail:]
+
+    return arr
+
+
+def read_since(symbol: str, interval: str, start_ms: int) -> np.ndarray:
+    """
+    open_time >= start_ms の足だけを読む（それより前のパーティションは開かない）。
+    """
+    files = _partition_files(symbol, interval)
+    if not files:
+        raise FileNotFoundError(f"Klines not found: {symbol} {interval}")
+
+    first_key = str(_partition_keys(np.array([start_ms], dtype=np.int64), interval)[0])
+    parts = [
+        np.load(path, allow_pickle=False)
+        for path in files
+        if path.stem >= first_key
+    ]
+
+    if not parts:
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    arr = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    return arr[arr["open_time"] >= start_ms]
+
+
+def read_klines(symbol: str, interval: str, tail: int | None = None) -> pd.DataFrame:
+    """
+    DataFrame（open_time, open, high, low, close, volume）で読む。
+    open_time は int64 epoch ms。
+    """
+    return to_frame(read_array(symbol, interval, tail=tail))
+
+
+def first_open_time(symbol: str, interval: str) -> int | None:
+    files = _partition_files(symbol, interval)
+    if not files:
+        return None
+    first = np.load(files[0], allow_pickle=False)
+    if len(first) == 0:
+        return None
+    return int(first["open_time"][0])
+
+
+def last_open_time(symbol: str, interval: str) -> int | None:
+    files = _partition_files(symbol, interval)
+    if not files:
+        return None
+    last = np.load(files[-1], allow_pickle=False)
+    if len(last) == 0:
+        return None
+    return int(last["open_time"][-1])
+
+
+# =====================
+# Gap index
+# =====================
+
+def find_gaps(open_time: np.ndarray, interval: str) -> np.ndarray:
+    """
+    欠損区間を [最初の欠損 open_time, 最後の欠損 open_time] の (n, 2) 配列で返す。
+    """
+    step = INTERVAL_MS[interval]
+    idx = np.flatnonzero(np.diff(open_time) > step)
+    return np.stack([open_time[idx] + step, open_time[idx + 1] - step], axis=1)
+
+
+def load_gaps(symbol: str, interval: str) -> dict | None:
+    path = gaps_path(symbol, interval)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _covered(gap, ranges) -> bool:
+    return any(r[0] <= gap[0] and gap[1] <= r[1] for r in ranges)
+
+
+def update_gaps(symbol: str, interval: str, arr: np.ndarray, unfillable=None):
+    """
+    欠損インデックスを作り直す。
+    unfillable は取引所側にもデータが無い（再取得しても埋まらない）区間。
+    """
+    step = INTERVAL_MS[interval]
+    gaps = find_gaps(arr["open_time"], interval).tolist() if len(arr) else []
+
+    prev = load_gaps(symbol, interval) or {}
+    known = prev.get("unfillable", []) + (unfillable or [])
+    unfillable = [g for g in gaps if _covered(g, known)]
+    open_gaps = [g for g in gaps if not _covered(g, known)]
+
+    index = {
+        "rows": int(len(arr)),
+        "first": int(arr["open_time"][0]) if len(arr) else None,
+        "last": int(arr["open_time"][-1]) if len(arr) else None,
+        "gaps": open_gaps,
+        "missing": int(sum((g[1] - g[0]) // step + 1 for g in open_gaps)),
+        "unfillable": unfillable,
+        "updated_at": int(time.time() * 1000),
+    }
+
+    path = gaps_path(symbol, interval)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, path)
+
+    return index
+
+
+# =====================
+# Write
+# =====================
+
+def publish_snapshot(symbol: str, interval: str, unfillable=None):
+    """
+    mmap 用スナップショットと欠損インデックスを作り直す。
+    既に mmap 済みのリーダーは旧 inode を参照し続けるので、差し替えは無停止。
+    """
+    arr = read_array(symbol, interval)
+    path = snapshot_path(symbol, interval)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_save(path, arr)
+
+    if interval in INTERVAL_MS:
+        update_gaps(symbol, interval, arr, unfillable)
+
+
+def write_klines(symbol: str, interval: str, rows, publish: bool = True) -> int:
+    """
+    ローソク足を upsert する（open_time 重複は新しい値で上書き）。
+    影響を受けるパーティションだけをアトミックに書き換える。
+    publish=True なら mmap 用スナップショットも更新する。
+
+    Returns:
+        新規に追加された本数
+    """
+    if rows is None:
+        return 0
+
+    rows = _normalize(rows)
+    if len(rows) == 0:
+        return 0
+
+    d = series_dir(symbol, interval)
+    d.mkdir(parents=True, exist_ok=True)
+
+    keys = _partition_keys(rows["open_time"], interval)
+    bounds = np.flatnonzero(np.append(keys[1:] != keys[:-1], True)) + 1
+    start = 0
+
+    added = 0
+    for end in bounds:
+        chunk = rows[start:end]
+        path = d / f"{keys[start]}.npy"
+        start = end
+
+        if path.exists():
+            old = np.load(path, allow_pickle=False)
+            merged = _normalize(np.concatenate([old, chunk]))
+            added += len(merged) - len(old)
+        else:
+            merged = chunk
+            added += len(chunk)
+
+        _atomic_save(path, merged)
+
+    if publish:
+        publish_snapshot(symbol, interval)
+
+    return added
+
+
+# =====================
+# Migration (CSV → store)
+# =====================
+
+def migrate_csv(raw_dir: Path = RAW_DIR):
+    files = sorted(Path(raw_dir).glob("*.csv"))
+    print(f"Found {len(files)} CSV files\n")
+
+    for path in files:
+        name = path.stem
+        if "_" not in name:
+            continue
+
+        symbol, interval = name.rsplit("_", 1)
+        try:
+            df = pd.read_csv(path)
+            if df.empty:
+                print(f"[SKIP] {name} (empty)")
+                continue
+            n = write_klines(symbol, interval, df)
+            print(f"[OK] {symbol} {interval} → {n} rows")
+        except Exception as e:
+            print(f"[ERROR] {name}: {e}")
+
+    print("\nMigration completed.")
+
+
+def publish_all():
+    for interval in INTERVAL_MS:
+        symbols = list_symbols(interval)
+        for symbol in symbols:
+            publish_snapshot(symbol, interval)
+        print(f"[OK] published {len(symbols)} snapshots ({interval})")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "migrate":
+        migrate_csv()
+    elif command == "publish":
+        publish_all()
+    else:
+        print("Usage: python -m ai.src.kline_store <migrate|publish>")
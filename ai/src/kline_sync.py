@@ -0,0 +1,93 @@
+# ai/src/kline_sync.py
+#
+# 差分同期（全インターバル共通の取り込み方式）。
+#
+# - 銘柄ごとのウォーターマーク = ストア上の最終 open_time
+# - startTime = ウォーターマークから再開（確定前の最終足も上書き更新される）
+# - limit は不足本数だけ（通常 1〜2 本 → ウェイト 1）
+# - open_time の重複はストア側で後勝ちに排除
+# - 1000 本を超えて遅れている銘柄はページを進めて追いつくまで繰り返す
+# - 未取得の銘柄は直近 1000 本から開始
+# - mmap スナップショットと欠損インデックスは同期の最後に銘柄ごと1回だけ作り直す
+#   （差分 1〜2 本のたびに全履歴を書き直さない）
+
+import time
+
+from ai.src.kline_fetcher import fetch_all
+from ai.src.kline_store import INTERVAL_MS, last_open_time, publish_snapshot, write_klines
+
+
+MAX_LIMIT = 1000
+
+
+def _plan(symbols, interval: str, now_ms: int):
+    start_times = {}
+    limits = {}
+    step = INTERVAL_MS[interval]
+
+    for symbol in symbols:
+        watermark = last_open_time(symbol, interval)
+        if watermark is None:
+            continue
+
+        missing = (now_ms - watermark) // step + 1
+        start_times[symbol] = watermark
+        limits[symbol] = int(min(MAX_LIMIT, max(1, missing)))
+
+    return start_times, limits
+
+
+def sync_klines(symbols, interval: str, **fetch_kwargs) -> dict:
+    """
+    symbols の interval 足をウォーターマークから差分取得してストアへ upsert する。
+
+    Returns:
+        {symbol: 追加された本数}
+    """
+    added = {}
+    touched = set()
+    pending = list(symbols)
+    start_times, limits = _plan(pending, interval, int(time.time() * 1000))
+
+    def save(result):
+        symbol = result["symbol"]
+        rows = result["rows"]
+
+        if rows is None or len(rows) == 0:
+            print(f"[SKIP] {symbol} {interval}: no new klines", flush=True)
+            return
+
+        n = write_klines(symbol, interval, rows, publish=False)
+        touched.add(symbol)
+        added[symbol] = added.get(symbol, 0) + n
+
+        print(
+            f"[OK] {symbol} {interval}: {len(rows)} rows, {n} new "
+            f"({result['latency'] * 1000:.0f}ms)",
+            flush=True,
+        )
+
+    while pending:
+        results = fetch_all(
+            pending, interval, MAX_LIMIT,
+            start_times=start_times, limits=limits, on_result=save,
+            **fetch_kwargs,
+        )
+
+        # 追いついていない（満杯ページが返った）銘柄だけ次ページへ
+        next_pending = []
+        for r in results:
+            symbol = r["symbol"]
+            rows = r["rows"]
+            if r["error"] or rows is None or symbol not in start_times:
+                continue
+            if limits[symbol] == MAX_LIMIT and len(rows) >= MAX_LIMIT:
+                start_times[symbol] = int(rows["open_time"][-1])
+                next_pending.append(symbol)
+
+        pending = next_pending
+
+    for symbol in touched:
+        publish_snapshot(symbol, interval)
+
+    return added
@@ -1,8 +1,8 @@
 # ai/src/market_cap.py
 
-import json
 from pathlib import Path
 
+from ai.src import model_registry, universe
 from ai.src.binance_symbols import load_binance_symbols
 
 # =====================
@@ -12,9 +12,6 @@ from ai.src.binance_symbols import load_binance_symbols
 PROJECT_ROOT = Path(__file__).resolve().parents[2]  # crypto-ai/
 AI_DIR = PROJECT_ROOT / "ai"
 
-DATA_DIR = AI_DIR / "data"
-COINGECKO_CACHE = DATA_DIR / "coingecko_top.json"
-
 # 学習済みモデルの実体
 TRAINED_DIR = AI_DIR / "models"
 
@@ -36,12 +33,11 @@ STABLE_BASES = {
 # =========================
 
 def load_coingecko_top(limit: int = 200) -> list[dict]:
-    if not COINGECKO_CACHE.exists():
+    try:
+        return universe.coingecko_markets()[:limit]
+    except FileNotFoundError:
         raise FileNotFoundError("coingecko cache not found")
 
-    data = json.loads(COINGECKO_CACHE.read_text())
-    return data.get("items", [])[:limit]
-
 
 # =========================
 # Trained symbols（.pkl基準）
@@ -50,17 +46,23 @@ def load_coingecko_top(limit: int = 200) -> list[dict]:
 def load_trained_symbols() -> set[str]:
     """
     学習済み通貨の定義：
-    ai/models 配下に *_1h_price_h1.pkl が存在する通貨
+    ai/models 配下に *_1h_price_h1.pkl か *_1h_joint.pkl（全ホライゾンまとめたモデル）が存在する通貨
+    （レジストリのマニフェストがあればそれの current で判定する）
     """
+    m = model_registry.manifest(TRAINED_DIR)
+    if m is not None:
+        return set(m.trained_symbols("1h"))
+
     trained = set()
 
     if not TRAINED_DIR.exists():
         return trained
 
-    for p in TRAINED_DIR.glob("*_1h_price_h1.pkl"):
-        # 例: AAVEUSDT_1h_price_h1.pkl → AAVEUSDT
-        symbol = p.name.split("_")[0]
-        trained.add(symbol)
+    for pattern in ["*_1h_price_h1.pkl", "*_1h_joint.pkl"]:
+        for p in TRAINED_DIR.glob(pattern):
+            # 例: AAVEUSDT_1h_price_h1.pkl → AAVEUSDT
+            symbol = p.name.split("_")[0]
+            trained.add(symbol)
 
     return trained
 
@@ -0,0 +1,174 @@
+# ai/src/model_cache.py
+#
+# 推論プロセス内のモデルキャッシュ（ai.src.predict が使う）。
+#
+# - キーはモデルのパス（*.pkl。flat_forest の .forest も同じキーで扱う）
+# - 取り出すたびに pkl / .forest の stat (inode, mtime) と呼び出し側の version を見て、
+#   変わっていれば読み直す（夜間の再学習・書き出しがそのまま反映される）
+# - 容量は読み込んだモデルの実測サイズ（numpy 配列と sklearn の木のノード配列の合計）で数え、
+#   MODEL_CACHE_MB を超えたら最近使っていないものから捨てる（LRU）
+# - hits / misses / reloads / evictions を数える（stats()）
+# - 読み込み（joblib.load は数百 ms かかる）は全体のロックの外で、パスごとのロックを取って行う
+#   （同じモデルを同時に要求したスレッドは1回の読み込みを待ち、他のモデルのヒットは待たせない。
+#   パスごとのロックは使うスレッドがいなくなったら消す）
+#
+# .forest は mmap なので、サイズはマップしている配列のバイト数（実メモリはページキャッシュで共有）。
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.tree._tree import NODE_DTYPE, Tree
+
+from ai.src.flat_forest import flat_path, load_artifact
+
+
+DEFAULT_BUDGET_MB = int(os.getenv("MODEL_CACHE_MB", "512"))
+
+
+def _stat_key(path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def artifact_key(path) -> tuple:
+    """
+    pkl と .forest のどちらかが差し替わると変わるキー。
+    """
+    return _stat_key(path), _stat_key(flat_path(path))
+
+
+def measure(obj, seen: set | None = None) -> int:
+    """
+    モデルのおおよその使用メモリ（バイト）。
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, Tree):
+        return obj.node_count * NODE_DTYPE.itemsize + obj.value.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(measure(k, seen) + measure(v, seen) for k, v in obj.items())
+    if isinstance(obj, list | tuple | set | frozenset):
+        return sys.getsizeof(obj) + sum(measure(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + measure(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+class ModelCache:
+
+    def __init__(self, budget_mb: float = DEFAULT_BUDGET_MB, loader=load_artifact):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.loader = loader
+        self._lock = threading.Lock()
+        # path -> [読み込みのロック, 使っているスレッド数]（0 になったら消す）
+        self._loading: dict[str, list] = {}
+        # path -> (artifact_key, version, model, size)
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, path, version=None):
+        """
+        path のモデルを返す（無ければ FileNotFoundError）。
+        """
+        path = str(path)
+        key = artifact_key(path)
+        if key == (None, None):
+            self.discard(path)
+            raise FileNotFoundError(f"Model not found: {path}")
+
+        with self._lock:
+            model = self._hit(path, key, version)
+            if model is not None:
+                return model
+            slot = self._loading.setdefault(path, [threading.Lock(), 0])
+            slot[1] += 1
+
+        try:
+            with slot[0]:
+                # 待っている間に他のスレッドが読み込んでいればそれを使う
+                with self._lock:
+                    model = self._hit(path, key, version)
+                    if model is not None:
+                        return model
+
+                model = self.loader(path)
+                size = measure(model)
+
+                with self._lock:
+                    if path in self._entries:
+                        self.reloads += 1
+                        self._remove(path)
+                    else:
+                        self.misses += 1
+                    self._entries[path] = (key, version, model, size)
+                    self._bytes += size
+                    self._evict()
+                return model
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._loading[path]
+
+    def _hit(self, path: str, key, version):
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == key and entry[1] == version:
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[2]
+        return None
+
+    def _remove(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def _evict(self):
+        # 直前に入れた1つ（末尾）は予算を超えていても残す
+        while self._bytes > self.budget and len(self._entries) > 1:
+            path = next(iter(self._entries))
+            self._remove(path)
+            self.evictions += 1
+
+    def discard(self, path):
+        with self._lock:
+            self._remove(str(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __contains__(self, path) -> bool:
+        return str(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.reloads
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "budget_bytes": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
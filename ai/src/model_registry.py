@@ -0,0 +1,463 @@
+# ai/src/model_registry.py
+#
+# モデルのレジストリ（ai/models/manifest.json）。
+#
+# 学習済みの成果物（pkl と、あれば flat_forest の .forest・train_fingerprint の .json）を
+# バージョンごとに ai/models/versions/{key}/{version}.* に残し、マニフェストに
+#   symbol / interval / kind / horizon / version / フィンガープリント / メトリクス / サイズ / created_at
+# を記録する。key はモデルのファイル名の stem（BTCUSDT_1h_price_h1 / BTCUSDT_1h_joint / global_1h_h1）。
+#
+# predict などが読むのは今まで通り ai/models/{key}.pkl で、これは current のバージョンの
+# ハードリンク。昇格（promote）・ロールバック（rollback）はリンクを os.replace で差し替えて
+# マニフェストの current を書き換えるだけなので、読み手から途中の状態は見えない。
+# 学習側は dump() で書く（同じ inode を上書きすると残しておいたバージョンまで書き換わるため）。
+#
+# 古いバージョンの保持数・圧縮・サポート外銘柄の削除は ai.src.model_store（gc）が行う。
+#
+# 読み手はマニフェストを1回読んでプロセス内で使い回し、stat (inode, mtime) が変わったときだけ読み直す。
+# マニフェストがまだ無いとき（rebuild 前）は None を返すので、呼び出し側は従来のやり方に戻す。
+#
+# 使い方:
+#   python -m ai.src.model_registry rebuild              ai/models の pkl をすべて登録する
+#   python -m ai.src.model_registry list [key]
+#   python -m ai.src.model_registry promote KEY VERSION
+#   python -m ai.src.model_registry rollback KEY
+
+import fcntl
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import joblib
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+MODEL_DIR = BASE_DIR / "ai" / "models"
+
+MANIFEST_VERSION = 1
+
+# バージョンと一緒に残すファイル（pkl 以外は無ければ無いで良い）
+ARTIFACT_SUFFIXES = (".pkl", ".forest", ".json")
+
+# 古いバージョンを圧縮したときの接尾辞（ai.src.model_store。昇格するときに展開する）
+COMPRESSED_SUFFIX = ".gz"
+
+# DB の predictions.model_version の接頭辞（レジストリに無いモデルはこれだけ）
+MODEL_VERSION_PREFIX = "v2_prob"
+
+_KEY_PATTERNS = [
+    (re.compile(r"^(?P<symbol>[A-Z0-9]+)_(?P<interval>\w+?)_(?P<kind>price|direction)_h(?P<horizon>\d+)$"), None),
+    (re.compile(r"^(?P<symbol>[A-Z0-9]+)_(?P<interval>\w+?)_joint$"), "joint"),
+    (re.compile(r"^global_(?P<interval>\w+?)_h(?P<horizon>\d+)$"), "global"),
+]
+
+
+def manifest_path(model_dir=None) -> Path:
+    return Path(model_dir or MODEL_DIR) / "manifest.json"
+
+
+def versions_dir(key: str, model_dir=None) -> Path:
+    return Path(model_dir or MODEL_DIR) / "versions" / key
+
+
+def parse_key(key: str) -> dict | None:
+    """
+    {"symbol", "interval", "kind", "horizon"}（joint の horizon は None、global の symbol は None）
+    """
+    for pattern, kind in _KEY_PATTERNS:
+        m = pattern.match(key)
+        if m is None:
+            continue
+        d = m.groupdict()
+        return {
+            "symbol": d.get("symbol"),
+            "interval": d["interval"],
+            "kind": kind or d["kind"],
+            "horizon": int(d["horizon"]) if d.get("horizon") else None,
+        }
+    return None
+
+
+def key_of(model_path) -> str:
+    return Path(model_path).stem
+
+
+def version_path(key: str, version: str, suffix: str, model_dir=None) -> Path:
+    return versions_dir(key, model_dir) / f"{version}{suffix}"
+
+
+# =====================
+# Write side
+# =====================
+
+def dump(model, model_path):
+    """
+    joblib.dump を一時ファイル経由で（新しい inode に）書いて差し替える。
+    """
+    model_path = Path(model_path)
+    tmp = model_path.with_name(f".{model_path.name}.{os.getpid()}.tmp")
+    joblib.dump(model, tmp)
+    os.replace(tmp, model_path)
+
+
+@contextmanager
+def _locked(model_dir: Path):
+    model_dir.mkdir(parents=True, exist_ok=True)
+    with open(model_dir / ".manifest.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _read_manifest(model_dir: Path) -> dict:
+    path = manifest_path(model_dir)
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {"manifest_version": MANIFEST_VERSION, "artifacts": {}}
+    return data
+
+
+@contextmanager
+def editing(model_dir=None):
+    """
+    ロックを取ってマニフェストを読み、ブロックを抜けたら書き戻す（model_store などの一括編集用）。
+    """
+    model_dir = Path(model_dir or MODEL_DIR)
+    with _locked(model_dir):
+        data = _read_manifest(model_dir)
+        yield data
+        _write_manifest(model_dir, data)
+
+
+def _write_manifest(model_dir: Path, data: dict):
+    data["updated_at"] = time.time()
+    path = manifest_path(model_dir)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def _link(src: Path, dst: Path):
+    # 同じファイルシステムならハードリンク（容量を食わない）、だめならコピー
+    if dst.exists() and os.path.samefile(src, dst):
+        return  # 既に同じ inode（rename は何もせず一時ファイルが残る）
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _version_id(fingerprint: dict | None, created_at: float) -> str:
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(created_at))
+    digest = ((fingerprint or {}).get("data") or {}).get("hash", "")[:8]
+    return f"{stamp}-{digest}" if digest else stamp
+
+
+def _sidecar(model_path: Path) -> dict | None:
+    try:
+        return json.loads(model_path.with_suffix(".json").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def register(model_path, metrics: dict | None = None, promote: bool = True) -> str:
+    """
+    model_path（学習直後の pkl）を新しいバージョンとして登録する（promote なら current にする）。
+
+    Returns:
+        バージョン
+    """
+    model_path = Path(model_path)
+    model_dir = model_path.parent
+    key = key_of(model_path)
+    info = parse_key(key) or {"symbol": None, "interval": None, "kind": None, "horizon": None}
+
+    created_at = time.time()
+    fingerprint = _sidecar(model_path)
+    first = not manifest_path(model_dir).exists()
+
+    with _locked(model_dir):
+        data = _read_manifest(model_dir)
+        entry = data["artifacts"].setdefault(key, {**info, "current": None, "history": [], "versions": {}})
+        if _is_current(model_dir, key, entry):
+            return entry["current"]  # 登録済み（同じファイル）
+
+        version = _version_id(fingerprint, created_at)
+        n = 1
+        while version in entry["versions"]:
+            n += 1
+            version = f"{_version_id(fingerprint, created_at)}.{n}"
+
+        vdir = versions_dir(key, model_dir)
+        vdir.mkdir(parents=True, exist_ok=True)
+        files, size = [], 0
+        for suffix in ARTIFACT_SUFFIXES:
+            src = model_path.with_suffix(suffix)
+            if suffix == ".forest" and src.exists() and src.stat().st_mtime_ns < model_path.stat().st_mtime_ns:
+                continue  # 前のバージョンの書き出し
+            if src.exists():
+                _link(src, vdir / f"{version}{suffix}")
+                files.append(suffix)
+                size += src.stat().st_size
+
+        entry["versions"][version] = {
+            **info,
+            "version": version,
+            "fingerprint": fingerprint,
+            "metrics": metrics or {},
+            "files": files,
+            "size": size,
+            "created_at": created_at,
+        }
+        if promote:
+            if entry["current"] is not None:
+                entry["history"].append(entry["current"])
+            entry["current"] = version
+        elif entry["current"] is not None:
+            # 登録だけして ai/models は current のままにする
+            _activate(model_dir, key, entry, entry["current"])
+        _write_manifest(model_dir, data)
+
+    if first:
+        # マニフェストは ai/models 全体の索引なので、初めて作ったときは既存の pkl も載せる
+        rebuild(model_dir)
+    return version
+
+
+def _is_current(model_dir: Path, key: str, entry: dict) -> bool:
+    # ai/models/{key}.pkl が current のバージョンと同じファイルか
+    if not entry.get("current"):
+        return False
+    linked = versions_dir(key, model_dir) / f"{entry['current']}.pkl"
+    model_path = model_dir / f"{key}.pkl"
+    return linked.exists() and model_path.exists() and os.path.samefile(linked, model_path)
+
+
+def attach(model_path, suffix: str = ".forest"):
+    """
+    current のバージョンに後から作ったファイル（flat_forest の書き出し）を加える。
+    """
+    model_path = Path(model_path)
+    model_dir = model_path.parent
+    key = key_of(model_path)
+    src = model_path.with_suffix(suffix)
+
+    with _locked(model_dir):
+        data = _read_manifest(model_dir)
+        entry = data["artifacts"].get(key)
+        if entry is None or entry["current"] is None or not src.exists():
+            return
+        if not _is_current(model_dir, key, entry):
+            return  # ai/models の pkl が current と違う（未登録の学習結果）
+        version = entry["current"]
+        meta = entry["versions"][version]
+        _link(src, versions_dir(key, model_dir) / f"{version}{suffix}")
+        if suffix not in meta["files"]:
+            meta["files"].append(suffix)
+            meta["size"] += src.stat().st_size
+        _write_manifest(model_dir, data)
+
+
+def _decompress(path: Path):
+    gz = path.with_name(path.name + COMPRESSED_SUFFIX)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with gzip.open(gz, "rb") as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, path)
+    gz.unlink()
+
+
+def _activate(model_dir: Path, key: str, entry: dict, version: str):
+    # versions/{key}/{version}.* を ai/models/{key}.* に差し替える（そのバージョンに無いファイルは消す）
+    meta = entry["versions"][version]
+    vdir = versions_dir(key, model_dir)
+    for suffix in meta.pop("compressed", []):
+        _decompress(vdir / f"{version}{suffix}")
+    for suffix in ARTIFACT_SUFFIXES:
+        dst = model_dir / f"{key}{suffix}"
+        if suffix in meta["files"]:
+            _link(vdir / f"{version}{suffix}", dst)
+        else:
+            dst.unlink(missing_ok=True)
+    # .forest は pkl より新しくないと flat_forest.load_artifact が古いとみなすので時刻を揃える
+    forest = model_dir / f"{key}.forest"
+    if forest.exists():
+        os.utime(forest)
+
+
+def promote(key: str, version: str, model_dir=None, record: bool = True):
+    model_dir = Path(model_dir or MODEL_DIR)
+    with _locked(model_dir):
+        data = _read_manifest(model_dir)
+        entry = data["artifacts"].get(key)
+        if entry is None or version not in entry["versions"]:
+            raise KeyError(f"unknown version: {key} {version}")
+        _activate(model_dir, key, entry, version)
+        if record and entry["current"] not in (None, version):
+            entry["history"].append(entry["current"])
+        entry["current"] = version
+        _write_manifest(model_dir, data)
+
+
+def rollback(key: str, model_dir=None) -> str:
+    """
+    ひとつ前の current に戻す。
+
+    Returns:
+        戻したバージョン
+    """
+    model_dir = Path(model_dir or MODEL_DIR)
+    with _locked(model_dir):
+        data = _read_manifest(model_dir)
+        entry = data["artifacts"].get(key)
+        history = [v for v in (entry or {}).get("history", []) if v in entry["versions"]]
+        if not history:
+            raise KeyError(f"no previous version: {key}")
+        version = history.pop()
+        _activate(model_dir, key, entry, version)
+        entry["history"] = history
+        entry["current"] = version
+        _write_manifest(model_dir, data)
+    return version
+
+
+def rebuild(model_dir=None) -> int:
+    """
+    ai/models の pkl のうち、マニフェストに無い・current と中身が違うものを登録する。
+    """
+    model_dir = Path(model_dir or MODEL_DIR)
+    data = _read_manifest(model_dir)
+    added = 0
+    for model_path in sorted(model_dir.glob("*.pkl")):
+        key = key_of(model_path)
+        if _is_current(model_dir, key, data["artifacts"].get(key, {})):
+            continue
+        register(model_path)
+        added += 1
+    return added
+
+
+# =====================
+# Read side
+# =====================
+
+class Manifest:
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.artifacts = data.get("artifacts", {})
+        self._trained = {}
+
+    def current(self, key: str) -> dict | None:
+        entry = self.artifacts.get(key)
+        if entry is None or entry.get("current") is None:
+            return None
+        return entry["versions"].get(entry["current"])
+
+    def version(self, key: str) -> str | None:
+        entry = self.artifacts.get(key)
+        return None if entry is None else entry.get("current")
+
+    def trained_symbols(self, interval: str = "1h") -> set[str]:
+        """
+        interval の price h1 か joint の current がある銘柄。
+        """
+        if interval not in self._trained:
+            self._trained[interval] = {
+                entry["symbol"]
+                for entry in self.artifacts.values()
+                if entry.get("current") and entry.get("symbol") and entry.get("interval") == interval
+                and (entry.get("kind") == "joint" or (entry.get("kind") == "price" and entry.get("horizon") == 1))
+            }
+        return self._trained[interval]
+
+
+_lock = threading.Lock()
+_loaded: dict[str, tuple[tuple[int, int], Manifest]] = {}
+
+
+def manifest(model_dir=None) -> Manifest | None:
+    """
+    マニフェスト（プロセス内で共有。差し替えられたら読み直す）。無ければ None。
+    """
+    path = manifest_path(model_dir)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stat_key = (st.st_ino, st.st_mtime_ns)
+
+    cached = _loaded.get(str(path))
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    with _lock:
+        cached = _loaded.get(str(path))
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        try:
+            m = Manifest(json.loads(path.read_text()))
+        except (FileNotFoundError, ValueError):
+            return None
+        _loaded[str(path)] = (stat_key, m)
+        return m
+
+
+def current_version(model_path) -> str | None:
+    m = manifest(Path(model_path).parent)
+    return None if m is None else m.version(key_of(model_path))
+
+
+def model_version(model_path, prefix: str = MODEL_VERSION_PREFIX) -> str:
+    """
+    DB に記録する model_version（"v2_prob:20260101T000000-1a2b3c4d"。未登録なら "v2_prob"）。
+    """
+    version = current_version(model_path)
+    return prefix if version is None else f"{prefix}:{version}"
+
+
+# =====================
+# CLI
+# =====================
+
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if cmd == "rebuild":
+        print(f"[REGISTRY] registered {rebuild()} artifacts")
+    elif cmd == "promote":
+        promote(sys.argv[2], sys.argv[3])
+        print(f"[REGISTRY] {sys.argv[2]} -> {sys.argv[3]}")
+    elif cmd == "rollback":
+        print(f"[REGISTRY] {sys.argv[2]} -> {rollback(sys.argv[2])}")
+    elif cmd == "list":
+        m = manifest()
+        if m is None:
+            print("[REGISTRY] no manifest (run rebuild)")
+            return
+        keys = sys.argv[2:] or sorted(m.artifacts)
+        for key in keys:
+            entry = m.artifacts.get(key)
+            if entry is None:
+                print(f"{key}: not registered")
+                continue
+            for version, meta in sorted(entry["versions"].items()):
+                mark = "*" if version == entry["current"] else " "
+                print(f"{mark} {key} {version} {meta['size'] / 1e6:.1f}MB {' '.join(meta['files'])}")
+    else:
+        print(f"unknown command: {cmd}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# ai/src/model_store.py
+#
+# ai/models の掃除と使用量の集計（ai.src.model_registry のマニフェストとバージョンを対象にする）。
+#
+# gc でやること:
+#   - サポート外になった銘柄（CoinGecko の上位から外れた・Binance で上場廃止）のモデルを
+#     ai/models とバージョンごと消す（get_supported が読めず空のときは何も消さない）
+#   - キーごとに新しい順に KEEP_VERSIONS 個だけバージョンを残す（current は必ず残す）
+#   - 中身が同じバージョンのファイルはハードリンクにまとめる
+#   - COLD_DAYS より古い current 以外のバージョンは gzip する（昇格するときに model_registry が展開する）
+#   - 書きかけで残った一時ファイル、pkl が無い・pkl より古い .forest を消す
+#
+# 使用量は inode ごとに1回だけ数える（current はバージョンと ai/models のハードリンクなので二重に数えない）。
+# interval / horizon ごとに ai/data/cache/model_store.json に書き出す（/api/model-store）。
+#
+# 使い方:
+#   python -m ai.src.model_store          使用量を表示・書き出す
+#   python -m ai.src.model_store gc       掃除してから使用量を表示・書き出す
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from ai.src import model_registry
+from ai.src.market_cap import get_supported
+from ai.src.model_registry import ARTIFACT_SUFFIXES, COMPRESSED_SUFFIX, MODEL_DIR
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+USAGE_PATH = BASE_DIR / "ai" / "data" / "cache" / "model_store.json"
+
+KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "3"))
+COLD_DAYS = float(os.getenv("MODEL_COLD_DAYS", "7"))
+
+# これより古い一時ファイル（.{name}.{pid}.tmp）は書き手が落ちた残り
+TMP_MAX_AGE = 3600
+
+
+def supported_symbols() -> set[str] | None:
+    """
+    残す銘柄（get_supported）。読めなかったときは None（銘柄での削除をしない）。
+    """
+    symbols = {c["symbol"] for c in get_supported()}
+    return symbols or None
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _compress(path: Path):
+    gz = path.with_name(path.name + COMPRESSED_SUFFIX)
+    tmp = gz.with_name(f".{gz.name}.{os.getpid()}.tmp")
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, gz)
+    path.unlink()
+
+
+def _unlink_version(key: str, version: str, model_dir: Path):
+    for suffix in ARTIFACT_SUFFIXES:
+        path = model_registry.version_path(key, version, suffix, model_dir)
+        path.unlink(missing_ok=True)
+        path.with_name(path.name + COMPRESSED_SUFFIX).unlink(missing_ok=True)
+
+
+def _drop_key(key: str, model_dir: Path):
+    for suffix in ARTIFACT_SUFFIXES:
+        (model_dir / f"{key}{suffix}").unlink(missing_ok=True)
+    shutil.rmtree(model_registry.versions_dir(key, model_dir), ignore_errors=True)
+
+
+def _retain(entry: dict, keep: int) -> list[str]:
+    # 新しい順に keep 個（current は数に入れて必ず残す）。消すバージョンを返す
+    current = entry.get("current")
+    others = sorted(
+        (v for v in entry["versions"] if v != current),
+        key=lambda v: entry["versions"][v]["created_at"],
+        reverse=True,
+    )
+    return others[max(keep - (current is not None), 0):]
+
+
+def _dedupe(key: str, entry: dict, model_dir: Path) -> int:
+    # 同じ中身のファイルを最初に見つけたもの（current を先に見る）へのハードリンクにする
+    order = sorted(entry["versions"], key=lambda v: v != entry.get("current"))
+    first: dict[tuple[str, str], Path] = {}
+    linked = 0
+    for version in order:
+        meta = entry["versions"][version]
+        hashes = meta.setdefault("sha256", {})
+        for suffix in meta["files"]:
+            if suffix in meta.get("compressed", []):
+                continue
+            path = model_registry.version_path(key, version, suffix, model_dir)
+            if not path.exists():
+                continue
+            digest = hashes.get(suffix) or _sha256(path)
+            hashes[suffix] = digest
+            src = first.setdefault((suffix, digest), path)
+            if src != path and not os.path.samefile(src, path):
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                os.link(src, tmp)
+                os.replace(tmp, path)
+                linked += 1
+    return linked
+
+
+def _compress_cold(key: str, entry: dict, model_dir: Path, cold_days: float) -> int:
+    # current 以外で古いバージョンを gzip する（他とハードリンクを共有しているファイルはそのまま）
+    cutoff = time.time() - cold_days * 86400
+    compressed = 0
+    for version, meta in entry["versions"].items():
+        if version == entry.get("current") or meta["created_at"] > cutoff:
+            continue
+        done = meta.setdefault("compressed", [])
+        for suffix in meta["files"]:
+            path = model_registry.version_path(key, version, suffix, model_dir)
+            if suffix in done or not path.exists() or path.stat().st_nlink > 1:
+                continue
+            _compress(path)
+            done.append(suffix)
+            compressed += 1
+    return compressed
+
+
+def _sweep(model_dir: Path) -> int:
+    # 書きかけの一時ファイルと、使われない .forest（pkl が無い・pkl より古い）
+    removed = 0
+    now = time.time()
+    for path in [*model_dir.glob(".*.tmp"), *model_dir.glob("versions/*/.*.tmp")]:
+        if now - path.stat().st_mtime > TMP_MAX_AGE:
+            path.unlink(missing_ok=True)
+            removed += 1
+    for forest in model_dir.glob("*.forest"):
+        pkl = forest.with_suffix(".pkl")
+        if not pkl.exists() or forest.stat().st_mtime_ns < pkl.stat().st_mtime_ns:
+            forest.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def gc(model_dir=None, keep: int = KEEP_VERSIONS, cold_days: float = COLD_DAYS,
+       supported: set[str] | None = None) -> dict:
+    """
+    supported: 残す銘柄（省略時は supported_symbols()）
+
+    Returns:
+        件数（dropped_keys / dropped_versions / deduplicated / compressed / swept）と freed_bytes
+    """
+    model_dir = Path(model_dir or MODEL_DIR)
+    if supported is None:
+        supported = supported_symbols()
+        if supported is None:
+            print("[STORE] supported symbols unavailable; keeping all symbols")
+
+    before = total_bytes(model_dir)
+    result = {"dropped_keys": 0, "dropped_versions": 0, "deduplicated": 0, "compressed": 0}
+
+    # 未登録の pkl があればバージョンとして載せてから（載っていないファイルは消さない）
+    model_registry.rebuild(model_dir)
+
+    with model_registry.editing(model_dir) as data:
+        artifacts = data["artifacts"]
+        for key in list(artifacts):
+            entry = artifacts[key]
+            symbol = entry.get("symbol")
+            if supported is not None and symbol and symbol not in supported:
+                _drop_key(key, model_dir)
+                del artifacts[key]
+                result["dropped_keys"] += 1
+                print(f"[STORE] drop {key} (unsupported)")
+                continue
+
+            for version in _retain(entry, keep):
+                _unlink_version(key, version, model_dir)
+                del entry["versions"][version]
+                result["dropped_versions"] += 1
+            entry["history"] = [v for v in entry["history"] if v in entry["versions"]]
+
+            result["deduplicated"] += _dedupe(key, entry, model_dir)
+            result["compressed"] += _compress_cold(key, entry, model_dir, cold_days)
+
+        # マニフェストに無いキーのバージョン置き場（手で消したなど）
+        for vdir in (model_dir / "versions").glob("*"):
+            if vdir.is_dir() and vdir.name not in artifacts:
+                shutil.rmtree(vdir, ignore_errors=True)
+
+    result["swept"] = _sweep(model_dir)
+    result["freed_bytes"] = before - total_bytes(model_dir)
+    return result
+
+
+# =====================
+# Usage
+# =====================
+
+def _files(model_dir: Path):
+    # (キー, 区分, パス)。ai/models 直下を先に返す（ハードリンクは current として数える）
+    for path in sorted(model_dir.glob("*")):
+        if path.is_file() and path.suffix in ARTIFACT_SUFFIXES and path.name != "manifest.json":
+            yield path.stem, "current", path
+    for path in sorted(model_dir.glob("versions/*/*")):
+        if path.name.startswith("."):
+            continue
+        kind = "compressed" if path.suffix == COMPRESSED_SUFFIX else "archived"
+        yield path.parent.name, kind, path
+
+
+def _group(key: str) -> tuple[str, str]:
+    info = model_registry.parse_key(key)
+    if info is None:
+        return "other", "-"
+    horizon = "joint" if info["horizon"] is None else f"h{info['horizon']}"
+    return info["interval"], horizon
+
+
+def usage(model_dir=None) -> dict:
+    """
+    Returns:
+        {interval: {horizon: {"keys", "current", "archived", "compressed", "total"}}}（バイト）
+        horizon は "h1" など（joint モデルは "joint"）
+    """
+    model_dir = Path(model_dir or MODEL_DIR)
+    seen = set()
+    keys = {}
+    out: dict[str, dict[str, dict]] = {}
+
+    for key, kind, path in _files(model_dir):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        interval, horizon = _group(key)
+        row = out.setdefault(interval, {}).setdefault(
+            horizon, {"keys": 0, "current": 0, "archived": 0, "compressed": 0, "total": 0}
+        )
+        keys.setdefault((interval, horizon), set()).add(key)
+        if (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+        row[kind] += st.st_size
+        row["total"] += st.st_size
+
+    for (interval, horizon), names in keys.items():
+        out[interval][horizon]["keys"] = len(names)
+    return out
+
+
+def total_bytes(model_dir=None) -> int:
+    return sum(row["total"] for rows in usage(model_dir).values() for row in rows.values())
+
+
+def _horizon_order(horizon: str):
+    return (0, int(horizon[1:])) if horizon[1:].isdigit() else (1, 0)
+
+
+def print_usage(rows: dict):
+    for interval in sorted(rows):
+        for horizon in sorted(rows[interval], key=_horizon_order):
+            r = rows[interval][horizon]
+            print(
+                f"[STORE] {interval} {horizon}: keys={r['keys']} current={r['current'] / 1e6:.1f}MB "
+                f"archived={r['archived'] / 1e6:.1f}MB compressed={r['compressed'] / 1e6:.1f}MB "
+                f"total={r['total'] / 1e6:.1f}MB"
+            )
+
+
+def write_usage(rows: dict):
+    USAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    USAGE_PATH.write_text(json.dumps({
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "intervals": rows,
+    }, indent=2))
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "usage"
+
+    if command == "gc":
+        result = gc()
+        print(
+            f"[STORE] gc: dropped_keys={result['dropped_keys']} dropped_versions={result['dropped_versions']} "
+            f"deduplicated={result['deduplicated']} compressed={result['compressed']} swept={result['swept']} "
+            f"freed={result['freed_bytes'] / 1e6:.1f}MB"
+        )
+    elif command != "usage":
+        print("Usage: python -m ai.src.model_store <usage|gc>")
+        return
+
+    rows = usage()
+    print_usage(rows)
+    write_usage(rows)
+
+
+if __name__ == "__main__":
+    main()
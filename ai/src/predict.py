@@ -1,47 +1,135 @@
 import os
-import joblib
+from pathlib import Path
+
 import pandas as pd
 from datetime import datetime
 import traceback
 
-from ai.src.features import make_features
+from ai.src import model_registry
+from ai.src.candle_mmap import load_candles
+from ai.src.features import feature_lookback, make_features
+from ai.src.flat_forest import flat_path
+from ai.src.global_models import GlobalDirectionView, model_path as global_model_path
+from ai.src.kline_store import to_frame
+from ai.src.market_cap import get_supported
+from ai.src.model_cache import ModelCache
 from ai.src.repository.prediction_repository import insert_prediction
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "ai", "data", "raw")
 MODEL_DIR = os.path.join(BASE_DIR, "ai", "models")
 
+# 推論で特徴量を計算する末尾の本数（horizon 上限 30 と dropna される行に余裕を持たせる）
+TAIL_ROWS = 64
+
+# 使うモデル（load_model の source）。predict(..., source=) で銘柄ごとに上書きできる
+MODEL_SOURCE = os.getenv("PREDICT_MODEL_SOURCE", "auto")
+
+# 読み込んだモデルはプロセス内で使い回す（MODEL_CACHE_MB で上限。差し替えられたら読み直す）
+_cache = ModelCache()
+
 
 # ==========================
 # Loaders
 # ==========================
 
-def load_csv(symbol, interval):
-    path = f"{DATA_DIR}/{symbol}_{interval}.csv"
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"CSV not found: {path}")
-    return pd.read_csv(path)
+def load_klines(symbol, interval):
+    return to_frame(load_candles(symbol, interval))
+
+
+def model_exists(path):
+    # pkl か平坦化した .forest（flat_forest）のどちらかがあればよい
+    return os.path.exists(path) or flat_path(path).exists()
+
+
+def load_global_model(symbol, interval, kind, horizon):
+    path = global_model_path(Path(MODEL_DIR), interval, horizon)
+    if not model_exists(path):
+        raise FileNotFoundError(f"Model not found: {path}")
+    model = _cache.get(path, model_registry.current_version(path))
+    return model.price_model(symbol) if kind == "price" else model.direction_model(symbol)
+
+
+def load_model(symbol, interval, kind, horizon, source=None):
+    """
+    source:
+        "local"  銘柄ごとのモデル（joint / ホライゾンごと）
+        "global" 全銘柄まとめたモデル（train_global）
+        "auto"   銘柄ごとのモデルがあればそれ、無ければグローバル
+        省略時は PREDICT_MODEL_SOURCE
+    """
+    source = source or MODEL_SOURCE
+    if source == "global":
+        return load_global_model(symbol, interval, kind, horizon)
+    try:
+        return load_local_model(symbol, interval, kind, horizon)
+    except FileNotFoundError:
+        if source == "auto":
+            return load_global_model(symbol, interval, kind, horizon)
+        raise
+
 
+def load_local_model(symbol, interval, kind, horizon):
+    # 全ホライゾンまとめて学習したモデル（train_joint）があればそのホライゾン分のビューを使う
+    joint_path = f"{MODEL_DIR}/{symbol}_{interval}_joint.pkl"
+    if model_exists(joint_path):
+        joint = _cache.get(joint_path, model_registry.current_version(joint_path))
+        if horizon in joint:
+            return joint.price_model(horizon) if kind == "price" else joint.direction_model(horizon)
 
-def load_model(symbol, interval, kind, horizon):
     path = f"{MODEL_DIR}/{symbol}_{interval}_{kind}_h{horizon}.pkl"
-    if not os.path.exists(path):
+    if not model_exists(path):
         raise FileNotFoundError(f"Model not found: {path}")
-    return joblib.load(path)
+    return _cache.get(path, model_registry.current_version(path))
+
+
+def model_path_used(symbol, interval, horizon, is_global) -> str:
+    """
+    load_model が price を読んだ pkl のパス（DB の model_version 用）。
+    """
+    if is_global:
+        return str(global_model_path(Path(MODEL_DIR), interval, horizon))
+    joint_path = f"{MODEL_DIR}/{symbol}_{interval}_joint.pkl"
+    if model_exists(joint_path) and horizon in _cache.get(joint_path, model_registry.current_version(joint_path)):
+        return joint_path
+    return f"{MODEL_DIR}/{symbol}_{interval}_price_h{horizon}.pkl"
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+def warm_up(top_n: int, intervals=("1h",), horizons=(1,)) -> int:
+    """
+    時価総額上位 top_n 銘柄のモデルを先に読み込んでおく（API 起動時用）。
+
+    Returns:
+        読み込んだモデル数
+    """
+    loaded = 0
+    for interval in intervals:
+        for coin in get_supported(interval)[:top_n]:
+            for horizon in horizons:
+                for kind in ("price", "direction"):
+                    try:
+                        load_model(coin["symbol"], interval, kind, horizon)
+                    except FileNotFoundError:
+                        continue
+                    loaded += 1
+    return loaded
 
 
 # ==========================
 # Predict
 # ==========================
 
-def predict(symbol: str, interval: str, horizon: int):
+def predict(symbol: str, interval: str, horizon: int, source: str | None = None):
 
     # --------------------------
-    # CSVロード
+    # 特徴量（末尾 TAIL_ROWS 本だけ計算）
     # --------------------------
-    df = load_csv(symbol, interval)
-    df_feat = make_features(df)
+    candles = load_candles(symbol, interval)[-(TAIL_ROWS + feature_lookback()):]
+    df_feat = make_features(to_frame(candles), tail=TAIL_ROWS)
 
     if len(df_feat) <= horizon:
         raise ValueError("Not enough data")
@@ -49,14 +137,9 @@ def predict(symbol: str, interval: str, horizon: int):
     current_price = float(df_feat["close"].iloc[-1])
 
     # --------------------------
-    # open_time → ms変換
+    # open_time（epoch ms）
     # --------------------------
-    raw_time = df_feat["open_time"].iloc[-1]
-
-    if isinstance(raw_time, (int, float)):
-        predict_time = int(raw_time)
-    else:
-        predict_time = int(pd.Timestamp(raw_time).timestamp() * 1000)
+    predict_time = int(df_feat["open_time"].iloc[-1])
 
     dt = pd.to_datetime(predict_time, unit="ms", utc=True)
     current_price_at = dt.strftime("%Y-%m-%d %H:%M")
@@ -79,8 +162,9 @@ def predict(symbol: str, interval: str, horizon: int):
     # --------------------------
     # モデルロード
     # --------------------------
-    price_model = load_model(symbol, interval, "price", horizon)
-    direction_model = load_model(symbol, interval, "direction", horizon)
+    price_model = load_model(symbol, interval, "price", horizon, source)
+    direction_model = load_model(symbol, interval, "direction", horizon, source)
+    is_global = isinstance(direction_model, GlobalDirectionView)
 
     # 🔥 学習時カラム順に合わせる（超重要）
     if hasattr(price_model, "feature_names_in_"):
@@ -134,7 +218,10 @@ def predict(symbol: str, interval: str, horizon: int):
             predicted_price=predicted_price,
             predict_time=predict_time,
             confidence=confidence,
-            model_version="v2_prob"
+            model_version=model_registry.model_version(
+                model_path_used(symbol, interval, horizon, is_global),
+                prefix="v2_prob_global" if is_global else "v2_prob",
+            )
         )
     except Exception:
         print(f"[WARN] DB insert failed: {symbol}")
@@ -156,5 +243,6 @@ def predict(symbol: str, interval: str, horizon: int):
         "trend": trend,
         "direction_internal": direction_internal,
         "confidence": confidence,
+        "model": "global" if is_global else "local",
         "generated_at": datetime.utcnow().isoformat(),
     }
\ No newline at end of file
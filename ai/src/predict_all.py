@@ -1,21 +1,16 @@
-import pandas as pd
-import os
+from ai.src.kline_store import has_klines, read_klines
 from ai.src.repository.db import get_connection
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "ai", "data", "raw")
-
 INTERVAL_MS = {
     "1h": 60 * 60 * 1000,
     "1d": 24 * 60 * 60 * 1000,
     "1w": 7 * 24 * 60 * 60 * 1000,
 }
 
-def load_csv(symbol, timeframe):
-    path = f"{DATA_DIR}/{symbol}_{timeframe}.csv"
-    if not os.path.exists(path):
+def load_klines(symbol, timeframe):
+    if not has_klines(symbol, timeframe):
         return None
-    return pd.read_csv(path)
+    return read_klines(symbol, timeframe)
 
 def evaluate_predictions():
     conn = get_connection()
@@ -33,21 +28,19 @@ def evaluate_predictions():
         horizon = row["horizon"]
         predict_time = row["predict_time"]
 
-        df = load_csv(symbol, timeframe)
+        df = load_klines(symbol, timeframe)
         if df is None: continue
 
-        # CSVの時間をミリ秒に変換してソート
-        df["open_time"] = pd.to_datetime(df["open_time"], utc=True)
-        df["open_time"] = df["open_time"].apply(lambda x: int(x.timestamp() * 1000))
-        df = df.sort_values("open_time").reset_index(drop=True)
+        # open_time はストア側で epoch ms・昇順に正規化済み
 
         interval_ms = INTERVAL_MS.get(timeframe)
         if interval_ms is None: continue
 
         # 未来のターゲット時刻を計算
         target_time = predict_time + horizon * interval_ms
-        # ターゲット時刻以降の直近の足を取得
-        target_row = df[df["open_time"] >= target_time].head(1)
+        # ターゲット時刻ちょうどの足だけで評価する（欠損区間なら後の足で代用せず、
+        # 取得・修復（kline_gaps repair）されるまで未評価のまま残す）
+        target_row = df[df["open_time"] == target_time]
 
         if len(target_row) == 0:
             continue
@@ -1,77 +1,29 @@
-import requests
+from ai.src.quote_aggregator import get_quotes
 
 
 def get_aggregated_price(symbol: str):
     """
     Get current price from multiple exchanges and return the average price.
 
+    Binance / Coinbase / Kraken are queried concurrently and cached
+    for a few seconds (see ai.src.quote_aggregator).
+
     Returns:
         price (float)
         sources (list[str])
     """
 
-    prices = []
-    sources = []
-
-    # --------------------
-    # Binance
-    # --------------------
-    try:
-        r = requests.get(
-            "https://api.binance.com/api/v3/ticker/price",
-            params={"symbol": symbol},
-            timeout=5
-        )
-        r.raise_for_status()
-        data = r.json()
-        prices.append(float(data["price"]))
-        sources.append("Binance")
-    except Exception:
-        pass
-
-    # --------------------
-    # Coinbase
-    # --------------------
-    try:
-        base = symbol.replace("USDT", "")
-        r = requests.get(
-            f"https://api.coinbase.com/v2/prices/{base}-USD/spot",
-            timeout=5
-        )
-        r.raise_for_status()
-        data = r.json()
-        prices.append(float(data["data"]["amount"]))
-        sources.append("Coinbase")
-    except Exception:
-        pass
-
-    # --------------------
-    # Kraken
-    # --------------------
-    try:
-        base = symbol.replace("USDT", "")
-        pair = base + "USD"
-        r = requests.get(
-            "https://api.kraken.com/0/public/Ticker",
-            params={"pair": pair},
-            timeout=5
-        )
-        r.raise_for_status()
-        data = r.json()
-        price = list(data["result"].values())[0]["c"][0]
-        prices.append(float(price))
-        sources.append("Kraken")
-    except Exception:
-        pass
+    quote = get_quotes([symbol]).get(symbol)
 
     # --------------------
     # Validation
     # --------------------
-    if not prices:
+    if quote is None:
         raise RuntimeError("Failed to fetch price from all exchanges")
 
+    prices = list(quote["prices"].values())
     avg_price = sum(prices) / len(prices)
-    return avg_price, sources
+    return avg_price, quote["sources"]
 
 
 # --------------------
@@ -0,0 +1,386 @@
+# ai/src/quote_aggregator.py
+#
+# 複数取引所の現在値をまとめて取得・集約する。
+#
+# - Binance / Coinbase / Kraken を並列に取得する。どの取引所も全銘柄を1リクエストで返す
+#   エンドポイントを使うので、銘柄数に関係なく1回の更新は取引所ごとに1リクエスト
+#     Binance : /api/v3/ticker/price（symbol 省略で全銘柄）
+#     Coinbase: /api/v3/brokerage/market/products（全 SPOT 商品の直近約定価格。USD 建てだけ使う）
+#     Kraken  : /0/public/Ticker（pair 省略で全ペア）。ペア名から銘柄への対応は /0/public/AssetPairs の
+#               base / quote で決める（1時間キャッシュ）
+# - ヘッジ: 取引所ごとの p95 レイテンシを過ぎても応答が無ければ同じリクエストをもう1本投げ、
+#   先に返った方を使う
+# - デッドライン: 期限までに返らなかった取引所はその回は欠損扱い（前回値を MAX_AGE まで使う）
+# - 取引所ごとのリクエスト数・エラー率・タイムアウト・ヘッジ回数・レイテンシ（p50/p95）を記録
+# - 結果は短い TTL でキャッシュし、TTL 切れ後はバックグラウンドで更新しつつ直前の値を返す
+#   （API から呼んでもブロックするのは初回だけ）
+
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ai.src.api_endpoints import BINANCE_API_URL, COINBASE_API_URL, KRAKEN_API_URL
+
+
+QUOTE_TTL = float(os.getenv("QUOTE_TTL", 5.0))
+QUOTE_MAX_AGE = 60.0
+DEADLINE = 2.0
+HEDGE_DEFAULT = 0.5
+HEDGE_MIN = 0.1
+LATENCY_WINDOW = 200
+
+
+# =====================
+# Venues
+# =====================
+
+def _binance_base(symbol: str) -> str:
+    return symbol[:-4] if symbol.endswith("USDT") else symbol
+
+
+def _parse_binance(data) -> dict:
+    return {t["symbol"]: float(t["price"]) for t in data if t["symbol"].endswith("USDT")}
+
+
+def _parse_coinbase(data) -> dict:
+    # 取引可能な USD 建て SPOT 商品の直近約定価格（参考レートの /v2/exchange-rates は使わない）
+    prices = {}
+    for p in data["products"]:
+        if (p.get("product_type") != "SPOT" or p.get("quote_currency_id") != "USD"
+                or p.get("status") != "online" or p.get("trading_disabled") or not p.get("price")):
+            continue
+        price = float(p["price"])
+        if price > 0:
+            prices[p["base_currency_id"] + "USDT"] = price
+    return prices
+
+
+KRAKEN_ALIASES = {"XBT": "BTC", "XDG": "DOGE"}
+KRAKEN_QUOTE = "ZUSD"
+KRAKEN_PAIRS_TTL = 3600.0
+
+_kraken_pairs = (0.0, {})
+_kraken_pairs_lock = threading.Lock()
+
+
+def _kraken_pair_map() -> dict:
+    """
+    Ticker のペア名 → 銘柄（XXBTZUSD → BTCUSDT）。quote が USD（ZUSD）のペアだけ。
+    base の表記は wsname（"XBT/USD"）の左側（Kraken の altname）を使う。
+    """
+    global _kraken_pairs
+    fetched_at, pairs = _kraken_pairs
+    if pairs and time.time() - fetched_at < KRAKEN_PAIRS_TTL:
+        return pairs
+
+    # 取得はロックの外で（ヘッジの別の足を待たせない）。差し替えだけロックの中
+    r = requests.get(f"{KRAKEN_API_URL}/0/public/AssetPairs", timeout=DEADLINE)
+    r.raise_for_status()
+    data = r.json()
+    if data.get("error"):
+        raise RuntimeError(", ".join(data["error"]))
+
+    pairs = {}
+    for pair, info in data["result"].items():
+        if info.get("quote") != KRAKEN_QUOTE or "/" not in info.get("wsname", ""):
+            continue
+        base = info["wsname"].split("/")[0]
+        pairs[pair] = KRAKEN_ALIASES.get(base, base) + "USDT"
+    with _kraken_pairs_lock:
+        _kraken_pairs = (time.time(), pairs)
+    return pairs
+
+
+def _parse_kraken(data) -> dict:
+    if data.get("error"):
+        raise RuntimeError(", ".join(data["error"]))
+
+    pairs = _kraken_pair_map()
+    prices = {}
+    for pair, t in data["result"].items():
+        symbol = pairs.get(pair)
+        if symbol:
+            prices[symbol] = float(t["c"][0])
+    return prices
+
+
+VENUES = {
+    "binance": {
+        "label": "Binance",
+        "url": f"{BINANCE_API_URL}/api/v3/ticker/price",
+        "params": None,
+        "parse": _parse_binance,
+    },
+    "coinbase": {
+        "label": "Coinbase",
+        "url": f"{COINBASE_API_URL}/api/v3/brokerage/market/products",
+        "params": {"product_type": "SPOT"},
+        "parse": _parse_coinbase,
+    },
+    "kraken": {
+        "label": "Kraken",
+        "url": f"{KRAKEN_API_URL}/0/public/Ticker",
+        "params": None,
+        "parse": _parse_kraken,
+    },
+}
+
+
+# =====================
+# Stats
+# =====================
+
+class VenueStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float | None = None, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def _quantile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        lat = sorted(self.latencies)
+        return lat[min(len(lat) - 1, int(q * len(lat)))]
+
+    def hedge_delay(self) -> float:
+        """
+        ヘッジを出すまでの待ち時間 = 直近の p95 レイテンシ（サンプルが少ない間は既定値）
+        """
+        if len(self.latencies) < 10:
+            return HEDGE_DEFAULT
+        return max(HEDGE_MIN, self._quantile(0.95))
+
+    def summary(self) -> dict:
+        p50 = self._quantile(0.5)
+        p95 = self._quantile(0.95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "timeouts": self.timeouts,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+# =====================
+# Aggregator
+# =====================
+
+class QuoteAggregator:
+
+    def __init__(self, venues: dict = VENUES, ttl: float = QUOTE_TTL,
+                 deadline: float = DEADLINE, max_age: float = QUOTE_MAX_AGE):
+        self.venues = venues
+        self.ttl = ttl
+        self.deadline = deadline
+        self.max_age = max_age
+        self.stats = {name: VenueStats() for name in venues}
+
+        # ヘッジで置き去りにしたリクエストが終わるのを待たないよう、専用のプールを使い回す
+        self._executor = ThreadPoolExecutor(max_workers=len(venues) * 2, thread_name_prefix="quotes")
+        self._sessions = {name: self._make_session() for name in venues}
+
+        self._prices = {}  # venue -> (fetched_at, {symbol: price})
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_done = threading.Condition(self._lock)
+
+    @staticmethod
+    def _make_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    # ---------------------
+    # Fetch
+    # ---------------------
+
+    def _get(self, name: str):
+        venue = self.venues[name]
+        t0 = time.monotonic()
+        try:
+            r = self._sessions[name].get(venue["url"], params=venue["params"], timeout=self.deadline)
+            r.raise_for_status()
+            prices = venue["parse"](r.json())
+        except Exception:
+            self.stats[name].record(error=True)
+            raise
+        self.stats[name].record(latency=time.monotonic() - t0)
+        return prices
+
+    async def _fetch_venue(self, name: str) -> dict | None:
+        loop = asyncio.get_running_loop()
+        stats = self.stats[name]
+        deadline = time.monotonic() + self.deadline
+
+        first = loop.run_in_executor(self._executor, self._get, name)
+        pending = {first}
+
+        done, _ = await asyncio.wait(pending, timeout=stats.hedge_delay())
+        if not done:
+            stats.hedged += 1
+            pending.add(loop.run_in_executor(self._executor, self._get, name))
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is not first:
+                        stats.hedge_wins += 1
+                    return f.result()
+
+        if pending:
+            stats.timeouts += 1
+        return None
+
+    async def _refresh(self):
+        names = list(self.venues)
+        results = await asyncio.gather(*(self._fetch_venue(n) for n in names))
+
+        now = time.time()
+        with self._lock:
+            for name, prices in zip(names, results):
+                if prices:
+                    self._prices[name] = (now, prices)
+            self._refreshed_at = now
+
+    def refresh(self):
+        asyncio.run(self._refresh())
+
+    def _refresh_flagged(self):
+        # _refreshing を立てた呼び出し元だけが呼ぶ
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._refresh_done.notify_all()
+
+    # ---------------------
+    # Read
+    # ---------------------
+
+    def _ensure_fresh(self):
+        """
+        初回はブロックして更新する（同時に来た呼び出しは先頭の1回の更新を待つ）。
+        以降は TTL 切れならバックグラウンドで更新する（更新中なら何もしない）。
+        """
+        with self._lock:
+            cold = self._refreshed_at == 0.0
+            if cold and self._refreshing:
+                self._refresh_done.wait_for(lambda: not self._refreshing)
+                return
+            if self._refreshing or (not cold and time.time() - self._refreshed_at < self.ttl):
+                return
+            self._refreshing = True
+
+        if cold:
+            self._refresh_flagged()
+        else:
+            threading.Thread(target=self._refresh_flagged, daemon=True).start()
+
+    def quotes(self, symbols) -> dict:
+        """
+        Returns:
+            {symbol: {"price": 中央値, "sources": [取引所名], "prices": {取引所名: 価格}, "fetched_at": epoch秒}}
+            どの取引所にも無い銘柄は含まない
+        """
+        self._ensure_fresh()
+
+        now = time.time()
+        with self._lock:
+            venues = [
+                (self.venues[name]["label"], fetched_at, prices)
+                for name, (fetched_at, prices) in self._prices.items()
+                if now - fetched_at <= self.max_age
+            ]
+
+        out = {}
+        for symbol in symbols:
+            found = {label: prices[symbol] for label, _, prices in venues if symbol in prices}
+            if not found:
+                continue
+            out[symbol] = {
+                "price": statistics.median(found.values()),
+                "sources": list(found),
+                "prices": found,
+                "fetched_at": min(t for label, t, prices in venues if symbol in prices),
+            }
+        return out
+
+    def venue_stats(self) -> dict:
+        return {self.venues[name]["label"]: s.summary() for name, s in self.stats.items()}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_aggregator() -> QuoteAggregator:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = QuoteAggregator()
+        return _default
+
+
+def get_quotes(symbols) -> dict:
+    return get_aggregator().quotes(symbols)
+
+
+def venue_stats() -> dict:
+    return get_aggregator().venue_stats()
+
+
+def main():
+    symbols = sys.argv[1:] or ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+
+    t0 = time.perf_counter()
+    quotes = get_quotes(symbols)
+    print(f"Fetched {len(quotes)}/{len(symbols)} symbols in {(time.perf_counter() - t0) * 1000:.0f}ms\n")
+
+    for symbol in symbols:
+        q = quotes.get(symbol)
+        if q is None:
+            print(f"[MISS] {symbol}")
+            continue
+        print(f"{symbol:<12} {q['price']:>14.6f}  {', '.join(q['sources'])}")
+
+    print()
+    for venue, s in venue_stats().items():
+        print(f"{venue:<10} {s}")
+
+
+if __name__ == "__main__":
+    main()
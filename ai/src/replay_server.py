@@ -0,0 +1,266 @@
+# ai/src/replay_server.py
+#
+# Binance / CoinGecko / Coinbase / Kraken のローカル・スタンドインサーバー。
+#
+#   record: 受けたリクエストを本物の API に転送し、レスポンスをカセットに保存する
+#   replay: カセットから応答する（ネットワーク不要）
+#
+# ルーティングはパス先頭の上流名で行う:
+#   http://127.0.0.1:8900/binance/api/v3/klines?...  → https://api.binance.com/api/v3/klines?...
+#
+# 各ジョブは API_STANDIN_URL=http://127.0.0.1:8900 で向け先を切り替える（ai.src.api_endpoints）。
+#
+# klines はカセット内の足を (symbol, interval) ごとに連結しておき、startTime / endTime /
+# limit に応じて切り出して返すので、差分同期やバックフィルもそのまま再生できる。
+#
+# 使い方:
+#   python -m ai.src.replay_server record --port 8900
+#   python -m ai.src.replay_server replay --port 8900 --latency-ms 80 --jitter-ms 40 \
+#       --weight-limit 6000 --error-rate 0.01
+
+import argparse
+import bisect
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from ai.src.api_endpoints import UPSTREAMS
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CASSETTE_DIR = BASE_DIR / "ai" / "data" / "replay"
+
+# Binance のリクエストウェイト（主要エンドポイントのみ）
+ENDPOINT_WEIGHT = {
+    "/api/v3/exchangeInfo": 20,
+    "/api/v3/ticker/24hr": 80,
+    "/api/v3/ticker/price": 4,
+}
+
+
+def binance_weight(path: str, query: dict) -> int:
+    if path == "/api/v3/klines":
+        limit = int(query.get("limit", 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == "/api/v3/ticker/price" and "symbol" in query:
+        return 2
+    return ENDPOINT_WEIGHT.get(path, 1)
+
+
+def cassette_key(upstream: str, path: str, query: dict) -> str:
+    raw = json.dumps([upstream, path, sorted(query.items())])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+# =====================
+# Cassette
+# =====================
+
+class Cassette:
+
+    def __init__(self, root: Path = CASSETTE_DIR):
+        self.root = root
+        self.entries = {}
+        self.klines = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        for path in self.root.glob("*/*.json"):
+            entry = json.loads(path.read_text())
+            self._index(entry)
+        print(f"[REPLAY] loaded {len(self.entries)} responses, {len(self.klines)} kline series")
+
+    def _index(self, entry):
+        key = cassette_key(entry["upstream"], entry["path"], entry["query"])
+        self.entries[key] = entry
+
+        if entry["upstream"] == "binance" and entry["path"] == "/api/v3/klines" and entry["status"] == 200:
+            series_key = (entry["query"].get("symbol"), entry["query"].get("interval"))
+            merged = {k[0]: k for k in self.klines.get(series_key, ([], []))[1]}
+            for k in entry["body"]:
+                merged[k[0]] = k
+            rows = [merged[t] for t in sorted(merged)]
+            self.klines[series_key] = ([k[0] for k in rows], rows)
+
+    def save(self, entry):
+        key = cassette_key(entry["upstream"], entry["path"], entry["query"])
+        path = self.root / entry["upstream"] / f"{key}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(entry))
+        with self._lock:
+            self._index(entry)
+
+    def lookup(self, upstream: str, path: str, query: dict):
+        if upstream == "binance" and path == "/api/v3/klines":
+            return self._slice_klines(query)
+        return self.entries.get(cassette_key(upstream, path, query))
+
+    def _slice_klines(self, query: dict):
+        series = self.klines.get((query.get("symbol"), query.get("interval")))
+        if series is None:
+            return None
+
+        times, rows = series
+        limit = int(query.get("limit", 500))
+
+        if "startTime" in query:
+            lo = bisect.bisect_left(times, int(query["startTime"]))
+            hi = bisect.bisect_right(times, int(query["endTime"])) if "endTime" in query else len(times)
+            body = rows[lo:hi][:limit]
+        else:
+            hi = bisect.bisect_right(times, int(query["endTime"])) if "endTime" in query else len(times)
+            body = rows[max(0, hi - limit):hi]
+
+        return {"status": 200, "headers": {"Content-Type": "application/json"}, "body": body}
+
+
+# =====================
+# Rate limit / faults
+# =====================
+
+class WeightWindow:
+    """
+    直近 60 秒のウェイト合計（Binance の X-MBX-USED-WEIGHT-1M 相当）。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.events = deque()
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def add(self, weight: int) -> tuple[int, bool]:
+        with self._lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] >= 60:
+                self.used -= self.events.popleft()[1]
+
+            if self.limit and self.used + weight > self.limit:
+                return self.used, False
+
+            self.events.append((now, weight))
+            self.used += weight
+            return self.used, True
+
+
+# =====================
+# Server
+# =====================
+
+def make_handler(mode: str, cassette: Cassette, options):
+    weights = WeightWindow(options.weight_limit)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if options.verbose:
+                super().log_message(fmt, *args)
+
+        def _send(self, status: int, body, headers=None):
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                if k.lower() in ("content-type", "retry-after") or k.lower().startswith("x-mbx"):
+                    self.send_header(k, v)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            _, upstream, path = parts.path.split("/", 2) if parts.path.count("/") >= 2 else ("", "", "")
+            path = "/" + path
+            query = dict(parse_qsl(parts.query))
+
+            if upstream not in UPSTREAMS:
+                return self._send(404, {"error": f"unknown upstream: {upstream}"})
+
+            # ---- latency ----
+            delay = options.latency_ms + random.random() * options.jitter_ms
+            if delay > 0:
+                time.sleep(delay / 1000)
+
+            # ---- rate limit ----
+            headers = {}
+            if upstream == "binance":
+                used, ok = weights.add(binance_weight(path, query))
+                headers["X-MBX-USED-WEIGHT-1M"] = str(used)
+                if not ok:
+                    headers["Retry-After"] = "1"
+                    return self._send(429, {"code": -1003, "msg": "Too many requests"}, headers)
+
+            # ---- error injection ----
+            if options.error_rate and random.random() < options.error_rate:
+                return self._send(options.error_status, {"error": "injected"}, headers)
+
+            if mode == "record":
+                try:
+                    r = requests.get(UPSTREAMS[upstream] + path, params=query, timeout=30)
+                    body = r.json()
+                except (requests.RequestException, ValueError) as e:
+                    return self._send(502, {"error": f"upstream failed: {e}"}, headers)
+
+                entry = {
+                    "upstream": upstream,
+                    "path": path,
+                    "query": query,
+                    "status": r.status_code,
+                    "headers": {"Content-Type": r.headers.get("Content-Type", "application/json")},
+                    "body": body,
+                }
+                if r.status_code == 200:
+                    cassette.save(entry)
+            else:
+                entry = cassette.lookup(upstream, path, query)
+                if entry is None:
+                    return self._send(404, {"error": "not recorded", "path": path, "query": query}, headers)
+
+            return self._send(entry["status"], entry["body"], {**entry["headers"], **headers})
+
+    return Handler
+
+
+def serve(mode: str, options):
+    cassette = Cassette(Path(options.cassette))
+    if mode == "replay":
+        cassette.load()
+
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(mode, cassette, options))
+    print(f"[{mode.upper()}] listening on http://{options.host}:{server.server_port}", flush=True)
+    print(f"[{mode.upper()}] export API_STANDIN_URL=http://{options.host}:{server.server_port}", flush=True)
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Binance/CoinGecko record-replay stand-in")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--cassette", default=str(CASSETTE_DIR))
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--weight-limit", type=int, default=0, help="Binance weight per minute (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(args.mode, args)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,33 +1,39 @@
 import sys
 
-from ai.src.train_price import train_price_model
-from ai.src.train_direction import train_direction_model
 from ai.src.market_cap import get_supported
+from ai.src.feature_panel import iter_panels
+from ai.src.train_pool import run
 
 # 時間軸の定義
 INTERVALS = ["1h", "1d", "1w"]
 DEFAULT_HORIZON = 1
 
 
-def train_symbol_by_interval(symbol: str, interval: str, horizons: list):
-    """
-    特定の銘柄と時間軸に対して、指定された全ホライゾンの学習を実行する
-    """
-    for h in horizons:
-        print(f"  -> {symbol} | interval={interval} | horizon={h}")
-        try:
-            train_price_model(symbol, interval, h)
-            train_direction_model(symbol, interval, h)
-        except Exception as e:
-            print(f"    [ERROR] {symbol}_{interval} training failed: {e}")
+def parse_horizons(spec: str) -> list[int]:
+    horizons = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            horizons.extend(range(int(lo), int(hi) + 1))
+        else:
+            horizons.append(int(part))
+    return horizons
 
 
 if __name__ == "__main__":
 
-    # コマンドライン引数から予測ホライゾンを取得
-    if len(sys.argv) > 1:
+    # --force: 入力が変わっていないモデルも学習し直す（train_fingerprint）
+    # --incremental: 既存モデルに直近データの木を足して古い木を捨てる（train_incremental）
+    # --joint: 全ホライゾンを1つのモデルにまとめて学習する（train_joint）
+    force = "--force" in sys.argv
+    incremental = "--incremental" in sys.argv
+    joint = "--joint" in sys.argv
+    args = [a for a in sys.argv[1:] if a not in ("--force", "--incremental", "--joint")]
+
+    # コマンドライン引数から予測ホライゾンを取得（3 / 1,3,6 / 1-30）
+    if args:
         try:
-            horizons = [int(sys.argv[1])]
+            horizons = parse_horizons(args[0])
         except ValueError:
             print("[ERROR] Horizon must be an integer.")
             sys.exit(1)
@@ -36,19 +42,25 @@ if __name__ == "__main__":
 
     print(f"🚀 Starting Auto Training Pipeline (Horizons: {horizons})")
 
-    # 修正のポイント: インターバルを外側のループにする
+    # 各インターバルごとに、その時間軸でサポートされている銘柄リストを動的に取得
+    # これにより 1h のリストに含まれない銘柄も 1w で救済される
+    universe = {}
     for interval in INTERVALS:
-        print(f"\n--- Processing Interval: {interval} ---")
-        
-        # 各インターバルごとに、その時間軸でサポートされている銘柄リストを動的に取得
-        # これにより 1h のリストに含まれない銘柄も 1w で救済される
         symbols_data = get_supported(interval)
-        symbols = [s["symbol"] for s in symbols_data]
-        
-        print(f"[FETCHED] {len(symbols)} symbols for {interval}")
+        universe[interval] = [s["symbol"] for s in symbols_data]
+        print(f"[FETCHED] {len(universe[interval])} symbols for {interval}")
+
+    def jobs():
+        # 特徴量はインターバルごとにパネルでまとめて計算し、学習はプロセスプールに回す
+        for interval in INTERVALS:
+            print(f"\n--- Processing Interval: {interval} ---")
+            for panel in iter_panels(universe[interval], interval):
+                for symbol in panel.symbols:
+                    yield {"symbol": symbol, "interval": interval, "horizons": horizons,
+                           "df_feat": panel.frame(symbol), "force": force, "incremental": incremental,
+                           "joint": joint}
 
-        for symbol in symbols:
-            train_symbol_by_interval(symbol, interval, horizons)
+    run(jobs(), total=sum(len(s) for s in universe.values()))
 
     print("\n" + "="*50)
     print("🏁 [COMPLETED] All intervals processed.")
@@ -1,37 +1,28 @@
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.calibration import CalibratedClassifierCV
-import joblib
 import os
-import pandas as pd
-import numpy as np
 
-from ai.src.features import make_features
+from ai.src.feature_store import load_features
+from ai.src.kline_store import has_klines
+from ai.src import model_registry, train_fingerprint
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "ai", "data", "raw")
 MODEL_DIR = os.path.join(BASE_DIR, "ai", "models")
 
+DIRECTION_PARAMS = {
+    "n_estimators": 300,
+    "max_depth": 8,
+    "random_state": 42,
+}
+CALIBRATION = "sigmoid"
 
-def load_csv(symbol, interval):
-    path = f"{DATA_DIR}/{symbol}_{interval}.csv"
-    if not os.path.exists(path):
-        return None
-    return pd.read_csv(path)
 
-
-def train_direction_model(symbol: str, interval: str, horizon: int):
-
-    df = load_csv(symbol, interval)
-    if df is None:
-        print(f"[SKIP] {symbol} {interval} (no csv)")
-        return
-
-    df_feat = make_features(df)
-
-    if len(df_feat) <= horizon + 50:
-        print(f"[SKIP] {symbol} {interval} (data too small: {len(df_feat)})")
-        return
+def direction_dataset(df_feat, horizon: int):
+    """
+    特徴量フレームから (X, y) を作る（y は horizon 本先が上昇 1 / 横ばい 0 / 下落 -1）。
+    """
+    df_feat = df_feat.copy()
 
     # ==========================
     # ターゲット作成
@@ -53,8 +44,41 @@ def train_direction_model(symbol: str, interval: str, horizon: int):
         if col not in ["open_time", "future_price", "direction"]
     ]
 
-    X = df_feat[feature_cols]
-    y = df_feat["direction"]
+    return df_feat[feature_cols], df_feat["direction"]
+
+
+def train_direction_model(symbol: str, interval: str, horizon: int, df_feat=None, n_jobs: int = -1,
+                          force: bool = False):
+    """
+    入力が前回の学習から変わっていなければスキップする（train_fingerprint。force で無視）。
+
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+
+    if df_feat is None:
+        if not has_klines(symbol, interval):
+            print(f"[SKIP] {symbol} {interval} (no klines)")
+            return
+
+        df_feat = load_features(symbol, interval)
+    else:
+        df_feat = df_feat.copy()
+
+    if len(df_feat) <= horizon + 50:
+        print(f"[SKIP] {symbol} {interval} (data too small: {len(df_feat)})")
+        return
+
+    model_path = f"{MODEL_DIR}/{symbol}_{interval}_direction_h{horizon}.pkl"
+    fp = train_fingerprint.fingerprint(
+        "direction", interval, horizon, {**DIRECTION_PARAMS, "calibration": CALIBRATION}, df_feat
+    )
+    train, reason = train_fingerprint.should_train(model_path, fp, force)
+    if not train:
+        print(f"[SKIP] {symbol} {interval} direction h{horizon} ({reason})")
+        return
+
+    X, y = direction_dataset(df_feat, horizon)
 
     # ==========================
     # クラス分布チェック
@@ -76,16 +100,11 @@ def train_direction_model(symbol: str, interval: str, horizon: int):
     # ==========================
     # モデル
     # ==========================
-    base_model = RandomForestClassifier(
-        n_estimators=300,
-        max_depth=8,
-        random_state=42,
-        n_jobs=-1
-    )
+    base_model = RandomForestClassifier(**DIRECTION_PARAMS, n_jobs=n_jobs)
 
     calibrated_model = CalibratedClassifierCV(
         estimator=base_model,
-        method="sigmoid",
+        method=CALIBRATION,
         cv=cv_folds
     )
 
@@ -96,8 +115,9 @@ def train_direction_model(symbol: str, interval: str, horizon: int):
     # ==========================
     os.makedirs(MODEL_DIR, exist_ok=True)
 
-    model_path = f"{MODEL_DIR}/{symbol}_{interval}_direction_h{horizon}.pkl"
-
-    joblib.dump(calibrated_model, model_path)
+    model_registry.dump(calibrated_model, model_path)
+    train_fingerprint.save(model_path, fp)
+    model_registry.register(model_path, metrics={"rows": len(X), "classes": {str(k): int(v) for k, v in class_counts.items()}})
 
     print(f"[OK] Direction calibrated: {symbol} {interval} h{horizon} (cv={cv_folds})")
+    return model_path
@@ -0,0 +1,150 @@
+# ai/src/train_fingerprint.py
+#
+# 学習の入力フィンガープリント（入力が変わっていないモデルの再学習を省く）。
+#
+# モデル ai/models/{symbol}_{interval}_{kind}_h{horizon}.pkl の横に
+# 同名の .json を置き、学習時の入力を記録する:
+#
+#   static: kind / interval / horizon / ハイパーパラメータ / 特徴量バージョン / scikit-learn のバージョン
+#   data:   学習に使った特徴量フレームの行数・最終 open_time・内容のハッシュ・直近のボラティリティ
+#           （最終行は確定前の足で値が更新され続けるので除く）
+#
+# 再学習の判定（should_train）:
+#   - force（引数 or TRAIN_FORCE=1）            → 学習
+#   - モデルか記録が無い / static が違う         → 学習
+#   - data が同じ                               → スキップ（同じ入力・同じ random_state なので同じモデルになる）
+#   - 直近 VOL_WINDOW 本のリターンの標準偏差が前回の学習時から VOL_CHANGE 以上変わった → 学習（相場の局面が変わった）
+#   - 増えた行が MIN_NEW_ROWS 未満かつモデルが MAX_AGE より新しい → スキップ、それ以外（行が減った場合も）は学習
+#     MIN_NEW_ROWS は毎時の同期で1日に増える本数（1h: 24, 1d: 1）より大きくしてあるので、
+#     値動きが落ち着いている銘柄は毎晩ではなく週1回程度の学習になる
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import sklearn
+
+from ai.src.feature_store import FEATURE_VERSION
+
+
+# 再学習に必要な新しい行数と、これを過ぎたら行数に関係なく学習し直すモデルの年齢（秒）
+MIN_NEW_ROWS = {"1h": 7 * 24, "1d": 7, "1w": 4}
+MAX_AGE = {"1h": 7 * 86400, "1d": 30 * 86400, "1w": 90 * 86400}
+
+# ボラティリティを測る直近の本数と、再学習するボラティリティの変化率
+VOL_WINDOW = {"1h": 7 * 24, "1d": 30, "1w": 12}
+VOL_CHANGE = 0.5
+
+
+def _forced() -> bool:
+    return os.getenv("TRAIN_FORCE", "").lower() in ("1", "true", "yes")
+
+
+def _volatility(df_feat, interval: str) -> float | None:
+    if "close" not in df_feat.columns:
+        return None
+    close = df_feat["close"].to_numpy(dtype=np.float64)[-(VOL_WINDOW.get(interval, 30) + 1):]
+    if len(close) < 3 or not np.all(close[:-1] > 0):
+        return None
+    return float(np.std(np.diff(close) / close[:-1]))
+
+
+def data_fingerprint(df_feat, interval: str | None = None) -> dict:
+    """
+    特徴量フレーム（ターゲット付与前）の内容から作る。最終行（確定前の足）は含めない。
+    """
+    df_feat = df_feat.iloc[:-1]
+    values = np.ascontiguousarray(df_feat.to_numpy(dtype=np.float64))
+    h = hashlib.sha1(values.tobytes())
+    h.update(",".join(map(str, df_feat.columns)).encode())
+    return {
+        "rows": len(df_feat),
+        "last_open_time": int(df_feat["open_time"].iloc[-1]) if len(df_feat) else None,
+        "hash": h.hexdigest(),
+        "volatility": _volatility(df_feat, interval),
+    }
+
+
+def fingerprint(kind: str, interval: str, horizon: int, params: dict, df_feat) -> dict:
+    return {
+        "static": {
+            "kind": kind,
+            "interval": interval,
+            "horizon": horizon,
+            "params": params,
+            "feature_version": FEATURE_VERSION,
+            "sklearn": sklearn.__version__,
+        },
+        "data": data_fingerprint(df_feat, interval),
+    }
+
+
+def meta_path(model_path) -> Path:
+    return Path(model_path).with_suffix(".json")
+
+
+def load(model_path) -> dict | None:
+    path = meta_path(model_path)
+    if not Path(model_path).exists() or not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except ValueError:
+        return None
+
+
+def should_train(model_path, fp: dict, force: bool = False) -> tuple[bool, str]:
+    """
+    Returns:
+        (学習するか, 理由)
+    """
+    if force or _forced():
+        return True, "forced"
+
+    prev = load(model_path)
+    if prev is None:
+        return True, "no fingerprint"
+
+    if prev.get("static") != fp["static"]:
+        return True, "config changed"
+
+    old, new = prev["data"], fp["data"]
+    if old == new:
+        return False, "unchanged"
+
+    interval = fp["static"]["interval"]
+    age = time.time() - prev.get("trained_at", 0)
+    new_rows = new["rows"] - old["rows"]
+
+    if old.get("volatility") and new.get("volatility") is not None:
+        change = abs(new["volatility"] / old["volatility"] - 1)
+        if change >= VOL_CHANGE:
+            return True, f"volatility changed {change:.0%}"
+
+    if 0 <= new_rows < MIN_NEW_ROWS.get(interval, 1) and age < MAX_AGE.get(interval, 0):
+        return False, f"{new_rows} new rows, model {age / 3600:.0f}h old"
+
+    return True, f"{new_rows} new rows"
+
+
+def save(model_path, fp: dict, incremental: bool = False):
+    """
+    incremental=True（train_incremental の差分更新）のときは、最後に全量で学習した時刻
+    full_trained_at を引き継いで更新回数 updates を数える。
+    """
+    now = time.time()
+    prev = load(model_path) if incremental else None
+    meta = {
+        **fp,
+        "trained_at": now,
+        "full_trained_at": prev.get("full_trained_at", prev.get("trained_at", now)) if prev else now,
+        "updates": prev.get("updates", 0) + 1 if prev else 0,
+    }
+
+    path = meta_path(model_path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, path)
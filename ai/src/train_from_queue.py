@@ -1,17 +1,11 @@
 from ai.src.train_queue import pop_next, mark_done
-from ai.src.fetch_data import fetch_klines
+from ai.src.kline_sync import sync_klines
 from ai.src.train_price import train_price_model
 from ai.src.train_direction import train_direction_model
-import os
-
-RAW_DIR = "ai/data/raw"
 
 def ensure_csv(symbol, interval):
-    path = f"{RAW_DIR}/{symbol}_{interval}.csv"
-    if os.path.exists(path):
-        return
-    df = fetch_klines(symbol, interval, 1000)
-    df.to_csv(path, index=False)
+    # 未取得なら直近 1000 本、あればウォーターマークからの差分（kline_sync）
+    sync_klines([symbol], interval)
 
 
 def main():
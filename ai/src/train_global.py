@@ -0,0 +1,186 @@
+# ai/src/train_global.py
+#
+# 全銘柄をまとめたグローバルモデルの学習（インターバル × ホライゾンごとに1つ）。
+#
+# 銘柄ごとのモデルは 銘柄 × インターバル × ホライゾン × 2 個になり、学習・保存・読み込みが
+# 銘柄数に比例して増える。ここでは feature_panel で全銘柄の特徴量を一括計算し、
+# global_models.normalize で銘柄に依らない形にしたものを縦に積んで1つのモデルを学習する。
+#   - 価格: horizon 本先の終値の変化率を RandomForestRegressor で
+#   - 方向: train_direction と同じ CalibratedClassifierCV(RandomForestClassifier)
+# 学習に使うのは各銘柄の直近 MAX_ROWS_PER_SYMBOL 行まで、1本の木が見る行数は MAX_SAMPLES まで
+# （銘柄が増えても学習時間が頭打ちになるように）。
+#
+# 使い方:
+#   python -m ai.src.train_global [horizons] [--force]   （horizons は 3 / 1,3,6 / 1-30）
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from ai.src import model_registry, train_fingerprint, universe
+from ai.src.feature_panel import iter_panels
+from ai.src.features import feature_lookback
+from ai.src.global_models import GlobalModel, model_path, normalize
+from ai.src.kline_store import list_symbols
+from ai.src.train_all_auto import parse_horizons
+from ai.src.train_direction import CALIBRATION, DIRECTION_PARAMS
+from ai.src.train_price import MODEL_DIR, PRICE_PARAMS
+
+
+INTERVALS = ["1h", "1d", "1w"]
+
+# 各銘柄から学習に使う直近の行数
+MAX_ROWS_PER_SYMBOL = {"1h": 4000, "1d": 1500, "1w": 300}
+
+# 1本の木のブートストラップ標本の上限
+MAX_SAMPLES = 200_000
+
+# 学習に必要な銘柄数・行数
+MIN_SYMBOLS = 2
+MIN_ROWS = 500
+
+
+# =====================
+# Dataset
+# =====================
+
+def market_caps() -> dict:
+    """
+    {"BTCUSDT": 時価総額(USD), ...}（CoinGecko のキャッシュが無ければ空）
+    """
+    try:
+        coins = universe.coingecko_markets()
+    except Exception as e:
+        print(f"[WARN] market caps unavailable: {e}")
+        return {}
+    return {f"{c['symbol'].upper()}USDT": c.get("market_cap") for c in coins if c.get("market_cap")}
+
+
+def load_panel_frames(interval: str, symbols=None) -> dict:
+    """
+    {symbol: 特徴量フレーム（make_features と同じ列。直近 MAX_ROWS_PER_SYMBOL 行）}
+    """
+    symbols = symbols if symbols is not None else list_symbols(interval)
+    rows = MAX_ROWS_PER_SYMBOL.get(interval, 1500)
+
+    frames = {}
+    for panel in iter_panels(symbols, interval, tail=rows + feature_lookback()):
+        for symbol in panel.symbols:
+            df = panel.frame(symbol).tail(rows).reset_index(drop=True)
+            if len(df):
+                frames[symbol] = df
+    return frames
+
+
+def global_dataset(frames: dict, horizon: int, caps: dict):
+    """
+    Returns:
+        (X, 終値の変化率, 方向, open_time) を銘柄ごとに縦に積んだもの
+    """
+    parts = []
+    for symbol, df in frames.items():
+        close = df["close"].to_numpy(dtype=np.float64)
+        if len(close) <= horizon:
+            continue
+        change = close[horizon:] / close[:-horizon] - 1
+
+        X = normalize(df.iloc[:-horizon], caps.get(symbol))
+        X["_change"] = change
+        X["_open_time"] = df["open_time"].to_numpy()[:-horizon]
+        parts.append(X[np.isfinite(change)])
+
+    if not parts:
+        return None
+
+    data = pd.concat(parts, ignore_index=True)
+    change = data.pop("_change")
+    open_time = data.pop("_open_time")
+    direction = np.sign(change).astype(np.int64)
+    return data, change, direction, open_time
+
+
+# =====================
+# Train
+# =====================
+
+def train_global_model(interval: str, horizon: int, frames: dict | None = None, caps: dict | None = None,
+                       n_jobs: int = -1, force: bool = False):
+    """
+    frames を渡した場合（load_panel_frames 済み）はホライゾン間で特徴量計算を共有する。
+
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+    frames = frames if frames is not None else load_panel_frames(interval)
+    caps = caps if caps is not None else market_caps()
+
+    if len(frames) < MIN_SYMBOLS:
+        print(f"[SKIP] global {interval} h{horizon} (symbols: {len(frames)} < {MIN_SYMBOLS})")
+        return None
+
+    dataset = global_dataset(frames, horizon, caps)
+    if dataset is None or len(dataset[0]) < MIN_ROWS:
+        print(f"[SKIP] global {interval} h{horizon} (data too small)")
+        return None
+    X, change, direction, open_time = dataset
+
+    path = model_path(MODEL_DIR, interval, horizon)
+    params = {
+        "price": PRICE_PARAMS,
+        "direction": DIRECTION_PARAMS,
+        "calibration": CALIBRATION,
+        "max_rows_per_symbol": MAX_ROWS_PER_SYMBOL.get(interval),
+        "max_samples": MAX_SAMPLES,
+        "symbols": sorted(frames),
+    }
+    fp_frame = X.assign(open_time=open_time.to_numpy(), target=change.to_numpy())
+    fp = train_fingerprint.fingerprint("global", interval, horizon, params, fp_frame)
+    train, reason = train_fingerprint.should_train(path, fp, force)
+    if not train:
+        print(f"[SKIP] global {interval} h{horizon} ({reason})")
+        return None
+
+    max_samples = MAX_SAMPLES if len(X) > MAX_SAMPLES else None
+    t0 = time.perf_counter()
+
+    price = RandomForestRegressor(**PRICE_PARAMS, max_samples=max_samples, n_jobs=n_jobs)
+    price.fit(X, change)
+
+    direction_model = CalibratedClassifierCV(
+        estimator=RandomForestClassifier(**DIRECTION_PARAMS, max_samples=max_samples, n_jobs=n_jobs),
+        method=CALIBRATION,
+        cv=3,
+    )
+    direction_model.fit(X, direction)
+
+    model_registry.dump(GlobalModel(interval, horizon, price, direction_model, caps), path)
+    train_fingerprint.save(path, fp)
+    model_registry.register(path, metrics={"rows": len(X), "symbols": len(frames)})
+
+    print(f"[OK] Global model: {interval} h{horizon} symbols={len(frames)} rows={len(X)} "
+          f"({time.perf_counter() - t0:.1f}s)")
+    return path
+
+
+def main():
+    force = "--force" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    horizons = parse_horizons(args[0]) if args else [1]
+
+    caps = market_caps()
+    for interval in INTERVALS:
+        frames = load_panel_frames(interval)
+        print(f"\n--- Global {interval}: {len(frames)} symbols ---")
+        for h in horizons:
+            try:
+                train_global_model(interval, h, frames=frames, caps=caps, force=force)
+            except Exception as e:
+                print(f"[ERROR] global {interval} h{h}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# ai/src/train_incremental.py
+#
+# ランダムフォレストの差分更新（スライディングフォレスト）。
+#
+# 全量の再学習（300本 × 全履歴、direction は CV の fold ごとにもう数本の森）の代わりに:
+#   1. 保存済みのモデルを読み、直近のデータだけで UPDATE_TREES 本の木を warm_start で追加する
+#   2. 古い方から同じ本数を捨てて木の本数（予算）を一定に保つ
+#   3. direction は CalibratedClassifierCV の各 fold の森に同じ更新をかけ、
+#      シグモイド較正だけを直近の検証区間で取り直す（森の再学習はしない）
+# 学習するのは前回からの新しい行（最低 MIN_RECENT_ROWS 行）だけなので、コストは新しいデータ量に比例する。
+#
+# モデルが無い・設定（static フィンガープリント）が変わった・最後の全量学習から MAX_AGE を過ぎた・
+# データの行数が減った場合は全量で学習し直す（train_price / train_direction に任せる）。
+
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import label_binarize
+
+from ai.src import model_registry, train_fingerprint
+from ai.src.feature_store import load_features
+from ai.src.kline_store import has_klines
+from ai.src.train_direction import CALIBRATION, DIRECTION_PARAMS, direction_dataset, train_direction_model
+from ai.src.train_price import MODEL_DIR, PRICE_PARAMS, price_dataset, train_price_model
+
+
+# 1回の更新で入れ替える木の本数（300本の森なら 10 回で一巡）
+UPDATE_TREES = 30
+
+# 追加する木の学習に使う最低行数
+MIN_RECENT_ROWS = {"1h": 500, "1d": 120, "1w": 26}
+
+# direction の較正に使う直近区間（差分データの末尾）の割合
+CALIBRATION_FRACTION = 0.3
+
+
+# =====================
+# Forest
+# =====================
+
+def slide_forest(forest, X, y, n_new: int, seed: int, n_jobs: int = -1):
+    """
+    forest に (X, y) で学習した n_new 本を追加し、古い方から n_new 本を捨てる（in-place）。
+    """
+    budget = len(forest.estimators_)
+    forest.set_params(warm_start=True, n_estimators=budget + n_new, random_state=seed, n_jobs=n_jobs)
+    forest.fit(X, y)
+
+    forest.estimators_ = forest.estimators_[n_new:]
+    forest.set_params(warm_start=False, n_estimators=budget)
+    return forest
+
+
+def recalibrate(model, X, y):
+    """
+    CalibratedClassifierCV の各 fold のシグモイド較正を (X, y) で取り直す（in-place）。
+    sklearn の _fit_calibrator と同じ対応（2クラスなら正例側の1本、多クラスなら one-vs-rest）。
+    """
+    classes = model.classes_
+    Y = label_binarize(y, classes=classes)
+
+    for cc in model.calibrated_classifiers_:
+        proba = cc.estimator.predict_proba(X)
+        predictions = proba[:, 1:] if proba.shape[1] == 2 else proba
+        pos_class_indices = np.searchsorted(classes, cc.estimator.classes_)
+        for class_idx, pred, calibrator in zip(pos_class_indices, predictions.T, cc.calibrators):
+            calibrator.fit(pred, Y[:, class_idx])
+    return model
+
+
+# =====================
+# Update
+# =====================
+
+def _plan(model_path, fp: dict) -> tuple[str, str, int]:
+    """
+    Returns:
+        ("full" | "update" | "skip", 理由, 前回からの新しい行数)
+    """
+    prev = train_fingerprint.load(model_path)
+    if prev is None:
+        return "full", "no model", 0
+    if prev.get("static") != fp["static"]:
+        return "full", "config changed", 0
+
+    interval = fp["static"]["interval"]
+    new_rows = fp["data"]["rows"] - prev["data"]["rows"]
+    if new_rows < 0:
+        return "full", "data shrank", 0
+
+    full_at = prev.get("full_trained_at", prev.get("trained_at", 0))
+    if time.time() - full_at >= train_fingerprint.MAX_AGE.get(interval, 0):
+        return "full", "full refit due", 0
+
+    train, reason = train_fingerprint.should_train(model_path, fp)
+    if not train:
+        return "skip", reason, new_rows
+    return "update", reason, new_rows
+
+
+def _load_frame(symbol: str, interval: str, df_feat):
+    if df_feat is not None:
+        return df_feat.copy()
+    if not has_klines(symbol, interval):
+        print(f"[SKIP] {symbol} {interval} (no klines)")
+        return None
+    return load_features(symbol, interval)
+
+
+def _recent(interval: str, horizon: int, new_rows: int) -> int:
+    return max(new_rows + horizon, MIN_RECENT_ROWS.get(interval, 120))
+
+
+def update_price_model(symbol: str, interval: str, horizon: int = 1, df_feat=None, n_jobs: int = -1):
+    """
+    価格モデルを差分更新する（必要なら全量学習）。
+
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+    df_feat = _load_frame(symbol, interval, df_feat)
+    if df_feat is None:
+        return None
+
+    model_path = MODEL_DIR / f"{symbol}_{interval}_price_h{horizon}.pkl"
+    fp = train_fingerprint.fingerprint("price", interval, horizon, PRICE_PARAMS, df_feat)
+    mode, reason, new_rows = _plan(model_path, fp)
+
+    if mode == "full":
+        print(f"[FULL] {symbol} {interval} price h{horizon} ({reason})")
+        return train_price_model(symbol, interval, horizon, df_feat=df_feat, n_jobs=n_jobs, force=True)
+    if mode == "skip":
+        print(f"[SKIP] {symbol} {interval} price h{horizon} ({reason})")
+        return None
+
+    X, y = price_dataset(df_feat, horizon)
+    recent = _recent(interval, horizon, new_rows)
+
+    seed = fp["data"]["last_open_time"] % (2 ** 31)
+    model = joblib.load(model_path)
+    slide_forest(model, X.iloc[-recent:], y.iloc[-recent:], UPDATE_TREES, seed, n_jobs)
+
+    model_registry.dump(model, model_path)
+    train_fingerprint.save(model_path, fp, incremental=True)
+    model_registry.register(model_path, metrics={"rows": min(recent, len(X)), "incremental": True})
+
+    print(f"[UPDATE] {symbol} {interval} price h{horizon} (+{UPDATE_TREES} trees on {min(recent, len(X))} rows)")
+    return model_path
+
+
+def update_direction_model(symbol: str, interval: str, horizon: int, df_feat=None, n_jobs: int = -1):
+    """
+    方向モデル（CalibratedClassifierCV）を差分更新する（必要なら全量学習）。
+
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+    df_feat = _load_frame(symbol, interval, df_feat)
+    if df_feat is None:
+        return None
+
+    model_path = Path(f"{MODEL_DIR}/{symbol}_{interval}_direction_h{horizon}.pkl")
+    fp = train_fingerprint.fingerprint(
+        "direction", interval, horizon, {**DIRECTION_PARAMS, "calibration": CALIBRATION}, df_feat
+    )
+    mode, reason, new_rows = _plan(model_path, fp)
+
+    def full(why: str):
+        print(f"[FULL] {symbol} {interval} direction h{horizon} ({why})")
+        return train_direction_model(symbol, interval, horizon, df_feat=df_feat, n_jobs=n_jobs, force=True)
+
+    if mode == "full":
+        return full(reason)
+    if mode == "skip":
+        print(f"[SKIP] {symbol} {interval} direction h{horizon} ({reason})")
+        return None
+
+    X, y = direction_dataset(df_feat, horizon)
+    recent = min(_recent(interval, horizon, new_rows), len(X))
+    n_cal = max(1, int(recent * CALIBRATION_FRACTION))
+    X_fit, y_fit = X.iloc[-recent:-n_cal], y.iloc[-recent:-n_cal]
+    X_cal, y_cal = X.iloc[-n_cal:], y.iloc[-n_cal:]
+
+    model = joblib.load(model_path)
+
+    # warm_start は追加分の y からクラスを取り直すので、直近に全クラスが揃っていないと既存の木と噛み合わない
+    classes = np.unique(y_fit)
+    if any(not np.array_equal(classes, cc.estimator.classes_) for cc in model.calibrated_classifiers_):
+        return full("recent window lacks a class")
+
+    seed = fp["data"]["last_open_time"] % (2 ** 31)
+    for i, cc in enumerate(model.calibrated_classifiers_):
+        slide_forest(cc.estimator, X_fit, y_fit, UPDATE_TREES, seed + i, n_jobs)
+    recalibrate(model, X_cal, y_cal)
+
+    model_registry.dump(model, model_path)
+    train_fingerprint.save(model_path, fp, incremental=True)
+    model_registry.register(model_path, metrics={"rows": recent, "incremental": True})
+
+    print(f"[UPDATE] {symbol} {interval} direction h{horizon} "
+          f"(+{UPDATE_TREES} trees x {len(model.calibrated_classifiers_)} folds, recalibrated on {n_cal} rows)")
+    return model_path
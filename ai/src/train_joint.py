@@ -0,0 +1,142 @@
+# ai/src/train_joint.py
+#
+# 価格・方向 × 全ホライゾンをまとめて学習する。
+#
+# train_price_model / train_direction_model をホライゾンごとに呼ぶと、森の本数が
+# 2 × ホライゾン数（direction は CV の fold ごとにさらに 3 倍）になる。ここでは
+#   - 特徴量は1回だけ読み、全ホライゾンのターゲットを一度に作る
+#   - 価格: 全ホライゾンを出力に持つ RandomForestRegressor 1つ
+#   - 方向: 全ホライゾンを出力に持つ RandomForestClassifier 1つ。較正は時系列の末尾
+#     CALIBRATION_FRACTION を検証区間にした森で推定し、全データで学習し直した森に適用する
+#     （CalibratedClassifierCV(ensemble=False) と同じ考え方）
+# として、ホライゾンを増やしても森はグループあたり 3 つのまま。
+#
+# 多出力の森は全出力のターゲットが揃う行（末尾 max(horizons) 本を除く）でしか学習できないので、
+# ホライゾンを 2 の冪ごとのグループ（horizon_models.horizon_groups: [1], [2, 3], [4..7], ...）に分けて
+# グループごとに学習する。h1 はホライゾンごとの学習と同じ行数を使い、どのホライゾンも落ちる直近の行は h 本未満
+# （1〜30 なら 5 グループ・森 15 個）。成果物は ai.src.horizon_models.HorizonGroups。
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LogisticRegression
+
+from ai.src import model_registry, train_fingerprint
+from ai.src.feature_store import load_features
+from ai.src.horizon_models import HorizonGroups, MultiHorizonModel, horizon_groups
+from ai.src.kline_store import has_klines
+from ai.src.train_direction import CALIBRATION, DIRECTION_PARAMS
+from ai.src.train_price import MODEL_DIR, PRICE_PARAMS
+
+
+CALIBRATION_FRACTION = 0.2
+
+
+def joint_path(symbol: str, interval: str):
+    return MODEL_DIR / f"{symbol}_{interval}_joint.pkl"
+
+
+def joint_dataset(df_feat, horizons):
+    """
+    Returns:
+        (X, 価格ターゲット (n, H), 方向ターゲット (n, H))
+    """
+    df = df_feat.reset_index(drop=True)
+    close = df["close"].to_numpy(dtype=np.float64)
+    n, H = len(df), len(horizons)
+
+    future = np.full((n, H), np.nan)
+    for j, h in enumerate(horizons):
+        future[:n - h, j] = close[h:]
+
+    rows = ~np.isnan(future).any(axis=1)
+    future = future[rows]
+    direction = np.sign(future - close[rows, None]).astype(np.int64)
+
+    feature_cols = [col for col in df.columns if col != "open_time"]
+    return df.loc[rows, feature_cols], future, direction
+
+
+def _squeeze(Y: np.ndarray) -> np.ndarray:
+    # 出力が1本のときは 1 次元で渡す（sklearn の列ベクトル警告を避ける）
+    return Y[:, 0] if Y.shape[1] == 1 else Y
+
+
+def fit_calibration(forest, X, Y) -> list[dict]:
+    """
+    ホライゾン i・クラス c ごとに、森の確率 p から 1[y == c] へのシグモイド（Platt scaling）を当てる。
+    検証区間に片方のラベルしか無いクラスは較正しない（生の確率を使う）。
+    """
+    proba = forest.predict_proba(X)
+    proba = proba if isinstance(proba, list) else [proba]
+    classes = forest.classes_ if isinstance(forest.classes_, list) else [forest.classes_]
+
+    calib = []
+    for i, (p, cls) in enumerate(zip(proba, classes)):
+        per_class = {}
+        for j, c in enumerate(cls):
+            target = (Y[:, i] == c).astype(int)
+            if target.min() == target.max():
+                continue
+            lr = LogisticRegression(C=1e4).fit(p[:, [j]], target)
+            per_class[int(c)] = (float(lr.coef_[0, 0]), float(lr.intercept_[0]))
+        calib.append(per_class)
+    return calib
+
+
+def fit_group(X, Y_price, Y_dir, horizons, n_jobs: int = -1) -> MultiHorizonModel:
+    price = RandomForestRegressor(**PRICE_PARAMS, n_jobs=n_jobs)
+    price.fit(X, _squeeze(Y_price))
+
+    n_cal = max(1, int(len(X) * CALIBRATION_FRACTION))
+    holdout = RandomForestClassifier(**DIRECTION_PARAMS, n_jobs=n_jobs)
+    holdout.fit(X.iloc[:-n_cal], _squeeze(Y_dir[:-n_cal]))
+    calib = fit_calibration(holdout, X.iloc[-n_cal:], Y_dir[-n_cal:])
+
+    direction = RandomForestClassifier(**DIRECTION_PARAMS, n_jobs=n_jobs)
+    direction.fit(X, _squeeze(Y_dir))
+
+    return MultiHorizonModel(horizons, price, direction, calib)
+
+
+def train_joint_model(symbol: str, interval: str, horizons, df_feat=None, n_jobs: int = -1,
+                      force: bool = False):
+    """
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+    horizons = sorted(set(int(h) for h in horizons))
+
+    if df_feat is None:
+        if not has_klines(symbol, interval):
+            print(f"[SKIP] {symbol} {interval} (no klines)")
+            return None
+        df_feat = load_features(symbol, interval)
+
+    model_path = joint_path(symbol, interval)
+    params = {"price": PRICE_PARAMS, "direction": DIRECTION_PARAMS, "calibration": CALIBRATION,
+              "groups": horizon_groups(horizons)}
+    fp = train_fingerprint.fingerprint("joint", interval, horizons, params, df_feat)
+    train, reason = train_fingerprint.should_train(model_path, fp, force)
+    if not train:
+        print(f"[SKIP] {symbol} {interval} joint h{horizons[0]}-{horizons[-1]} ({reason})")
+        return None
+
+    datasets = [(group, joint_dataset(df_feat, group)) for group in horizon_groups(horizons)]
+
+    # 一番行の少ない（最大ホライゾンの）グループで判定する
+    min_data_rows = 20 if interval == "1w" else 150
+    rows = min(len(X) for _, (X, _, _) in datasets)
+    if rows < min_data_rows:
+        print(f"[SKIP] {symbol} {interval} (data too small: {rows} < {min_data_rows})")
+        return None
+
+    groups = [fit_group(X, Y_price, Y_dir, group, n_jobs) for group, (X, Y_price, Y_dir) in datasets]
+    rows_per_group = {f"h{g[0]}-{g[-1]}": len(X) for g, (X, _, _) in datasets}
+
+    model_registry.dump(HorizonGroups(groups), model_path)
+    train_fingerprint.save(model_path, fp)
+    model_registry.register(model_path, metrics={"rows": rows_per_group, "horizons": horizons})
+
+    print(f"[OK] Joint model: {symbol} {interval} horizons={horizons[0]}-{horizons[-1]} ({len(horizons)}) "
+          f"groups={len(groups)} rows={max(rows_per_group.values())}")
+    return model_path
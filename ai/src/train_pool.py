@@ -0,0 +1,278 @@
+# ai/src/train_pool.py
+#
+# 学習ジョブ（銘柄 × インターバル × ホライゾン群）をプロセスプールで並列に回すオーケストレータ。
+#
+# - CPU 予算: cgroup の CPU 上限（cpu.max / cfs_quota）と CPU アフィニティから使えるコア数を決める
+#   （TRAIN_CPUS で上書き可）。os.cpu_count() はホストのコア数なのでコンテナでは使わない
+# - 予算を「プロセス数（外側）× RandomForest の n_jobs（内側）」に分ける。BLAS / OpenMP のスレッドも
+#   threadpoolctl で内側の数に絞り、プロセス同士でコアを奪い合わないようにする
+# - 失敗の隔離: ジョブ内の例外はそのジョブの失敗として記録するだけ。ワーカーが落ちて
+#   プールが壊れた場合は作り直し、実行中だったジョブを1本ずつ単独でやり直して原因のジョブだけを失敗にする
+# - 実行中のジョブ数を抑えて投入する（特徴量 DataFrame を渡すジョブでもメモリが膨らまない）
+# - 進捗と全体のスループット（models/min）を表示する
+
+import math
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from threadpoolctl import threadpool_limits
+
+from ai.src.feature_store import load_features
+from ai.src.kline_store import has_klines
+from ai.src.train_direction import train_direction_model
+from ai.src.train_incremental import update_direction_model, update_price_model
+from ai.src.train_joint import train_joint_model
+from ai.src.train_price import train_price_model
+
+
+# ワーカー1プロセスあたりのジョブ数（これを超えたらプロセスを作り直してメモリを返す）
+MAX_TASKS_PER_CHILD = 50
+
+# プロセスあたりの内側スレッド数の上限（RandomForest 300本ならこのくらいで頭打ち）
+MAX_INNER_JOBS = 4
+
+
+# =====================
+# CPU budget
+# =====================
+
+def _cgroup_cpus() -> float | None:
+    # cgroup v2
+    path = Path("/sys/fs/cgroup/cpu.max")
+    if path.exists():
+        quota, period = path.read_text().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1
+    quota_path = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period_path = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota_path.exists() and period_path.exists():
+        quota = int(quota_path.read_text())
+        if quota > 0:
+            return quota / int(period_path.read_text())
+    return None
+
+
+def cpu_budget() -> int:
+    """
+    このプロセスが使ってよいコア数。
+    """
+    if os.getenv("TRAIN_CPUS"):
+        return max(1, int(os.getenv("TRAIN_CPUS")))
+
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        quota = _cgroup_cpus()
+    except (OSError, ValueError):
+        quota = None
+    if quota is not None:
+        cpus = min(cpus, max(1, math.floor(quota)))
+    return max(1, cpus)
+
+
+def split_budget(cpus: int, jobs: int, inner: int | None = None) -> tuple[int, int]:
+    """
+    (プロセス数, プロセスあたりの n_jobs) を返す。
+
+    ジョブが多ければプロセスを増やし（木の並列より効率が良い）、
+    ジョブがコア数より少ないときだけ余ったコアを内側に回す。
+    """
+    jobs = max(1, jobs)
+    if inner is None:
+        inner = min(MAX_INNER_JOBS, max(1, cpus // jobs))
+    inner = max(1, min(inner, cpus))
+    workers = max(1, min(jobs, cpus // inner))
+    return workers, inner
+
+
+# =====================
+# Worker
+# =====================
+
+def _init_worker(inner: int):
+    # 子プロセスの BLAS / OpenMP スレッド数を固定する（以後そのプロセスでずっと有効）
+    os.environ["OMP_NUM_THREADS"] = str(inner)
+    threadpool_limits(limits=inner)
+
+
+def _run_job(job: dict, inner: int) -> dict:
+    """
+    job: {"symbol", "interval", "horizons", "df_feat"(任意), "force"(任意), "incremental"(任意), "joint"(任意)}
+    1つのジョブ内で price / direction × 全ホライゾンを学習する。失敗は結果に記録して返す。
+    incremental なら train_incremental の差分更新（必要なときだけ全量学習）、
+    joint なら train_joint で全ホライゾンを1つのモデルにまとめて学習する。
+    """
+    symbol, interval = job["symbol"], job["interval"]
+    result = {"symbol": symbol, "interval": interval, "trained": 0, "skipped": 0, "errors": []}
+    t0 = time.perf_counter()
+
+    df_feat = job.get("df_feat")
+    if df_feat is None:
+        if not has_klines(symbol, interval):
+            result["skipped"] = 2 * len(job["horizons"])
+            result["seconds"] = time.perf_counter() - t0
+            return result
+        # 特徴量はホライゾン・モデル種別で共通なので1回だけ読む
+        df_feat = load_features(symbol, interval)
+
+    if job.get("joint"):
+        # 1つの成果物で price / direction × 全ホライゾンを賄うので、モデル数はその分だけ数える
+        n_models = 2 * len(job["horizons"])
+        try:
+            path = train_joint_model(symbol, interval, job["horizons"], df_feat=df_feat, n_jobs=inner,
+                                     force=job.get("force", False))
+        except Exception as e:
+            result["errors"].append(f"joint: {e!r}")
+            traceback.print_exc()
+        else:
+            result["trained" if path is not None else "skipped"] += n_models
+        result["seconds"] = time.perf_counter() - t0
+        return result
+
+    if job.get("incremental") and not job.get("force"):
+        trainers = (("price", update_price_model), ("direction", update_direction_model))
+        kwargs = {}
+    else:
+        trainers = (("price", train_price_model), ("direction", train_direction_model))
+        kwargs = {"force": job.get("force", False)}
+
+    for h in job["horizons"]:
+        for kind, train in trainers:
+            try:
+                path = train(symbol, interval, h, df_feat=df_feat, n_jobs=inner, **kwargs)
+            except Exception as e:
+                result["errors"].append(f"{kind} h{h}: {e!r}")
+                traceback.print_exc()
+                continue
+            if path is None:
+                result["skipped"] += 1
+            else:
+                result["trained"] += 1
+
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+# =====================
+# Orchestrator
+# =====================
+
+def run(jobs, total: int | None = None, cpus: int | None = None, inner: int | None = None) -> dict:
+    """
+    jobs（dict のイテラブル。ジェネレータ可）をプロセスプールで学習する。
+
+    Args:
+        total: ジョブ総数（ジェネレータで len が取れないときの予算配分用）
+        cpus:  CPU 予算（省略時は cpu_budget()）
+        inner: プロセスあたりの n_jobs（省略時は split_budget が決める）
+
+    Returns:
+        {"jobs", "trained", "skipped", "failed": [(symbol, interval, 理由)], "seconds", "models_per_min", ...}
+    """
+    if total is None:
+        jobs = list(jobs)
+        total = len(jobs)
+
+    cpus = cpus or cpu_budget()
+    workers, inner = split_budget(cpus, total, inner)
+    print(f"[POOL] cpus={cpus} workers={workers} n_jobs/worker={inner} jobs={total}")
+
+    jobs = iter(jobs)
+    retry = []
+    retried = set()
+    summary = {"jobs": 0, "trained": 0, "skipped": 0, "failed": [], "job_seconds": 0.0}
+    t0 = time.perf_counter()
+
+    def record(result: dict):
+        summary["jobs"] += 1
+        summary["trained"] += result["trained"]
+        summary["skipped"] += result["skipped"]
+        summary["job_seconds"] += result.get("seconds", 0.0)
+        for err in result["errors"]:
+            summary["failed"].append((result["symbol"], result["interval"], err))
+            print(f"[ERROR] {result['symbol']} {result['interval']} {err}")
+
+        elapsed = time.perf_counter() - t0
+        rate = summary["trained"] / (elapsed / 60) if elapsed > 0 else 0.0
+        print(f"[{summary['jobs']}/{total}] {result['symbol']} {result['interval']} "
+              f"trained={result['trained']} ({result.get('seconds', 0.0):.1f}s) | {rate:.1f} models/min")
+
+    def limit(in_flight) -> int:
+        # やり直し中のジョブは1本ずつ単独で流す（落ちたらそのジョブが原因と確定できる）
+        if retry or any((j["symbol"], j["interval"]) in retried for j in in_flight.values()):
+            return 1
+        return workers * 2
+
+    def next_job():
+        if retry:
+            return retry.pop()
+        return next(jobs, None)
+
+    while True:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(inner,),
+            max_tasks_per_child=MAX_TASKS_PER_CHILD,
+        )
+        in_flight = {}
+        broken = False
+
+        try:
+            while True:
+                while len(in_flight) < limit(in_flight):
+                    job = next_job()
+                    if job is None:
+                        break
+                    in_flight[pool.submit(_run_job, job, inner)] = job
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for f in done:
+                    job = in_flight.pop(f)
+                    try:
+                        record(f.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        in_flight[f] = job
+                    except Exception as e:
+                        record({"symbol": job["symbol"], "interval": job["interval"],
+                                "trained": 0, "skipped": 0, "errors": [f"worker: {e!r}"]})
+                if broken:
+                    break
+        finally:
+            pool.shutdown(wait=not broken, cancel_futures=True)
+
+        if not broken:
+            break
+
+        # どのジョブがワーカーを落としたかは分からないので、実行中だった分を1本ずつやり直す。
+        # 単独で流して落ちたジョブ（1回やり直し済み）は失敗とする
+        for job in in_flight.values():
+            key = (job["symbol"], job["interval"])
+            if key in retried or len(in_flight) == 1:
+                record({"symbol": job["symbol"], "interval": job["interval"],
+                        "trained": 0, "skipped": 0, "errors": ["worker process died"]})
+            else:
+                retried.add(key)
+                retry.append(job)
+        print(f"[POOL] worker died; restarting pool ({len(retry)} jobs to retry one by one)")
+
+    seconds = time.perf_counter() - t0
+    summary["seconds"] = round(seconds, 1)
+    summary["models_per_min"] = round(summary["trained"] / (seconds / 60), 2) if seconds > 0 else 0.0
+    summary["workers"] = workers
+    summary["inner_jobs"] = inner
+
+    print(f"[POOL] done: {summary['trained']} models, {summary['skipped']} skipped, "
+          f"{len(summary['failed'])} failed in {seconds / 60:.1f} min "
+          f"({summary['models_per_min']} models/min, workers={workers} x n_jobs={inner})")
+    return summary
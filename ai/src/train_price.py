@@ -1,10 +1,11 @@
 import os
 from pathlib import Path
-import joblib
-import pandas as pd
 
 from sklearn.ensemble import RandomForestRegressor
-from ai.src.features import make_features, make_price_target
+from ai.src.feature_store import load_features
+from ai.src.features import make_price_target
+from ai.src.kline_store import has_klines, list_symbols
+from ai.src import model_registry, train_fingerprint
 
 
 # =====================
@@ -12,61 +13,88 @@ from ai.src.features import make_features, make_price_target
 # =====================
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
-RAW_DIR = BASE_DIR / "ai" / "data" / "raw"
 MODEL_DIR = BASE_DIR / "ai" / "models"
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+PRICE_PARAMS = {
+    "n_estimators": 300,
+    "max_depth": 6,
+    "random_state": 42,
+}
+
 
 # =====================
-# Train One
+# Dataset
 # =====================
 
-def train_price_model(symbol: str, interval: str, horizon: int = 1):
+def price_dataset(df_feat, horizon: int):
+    """
+    特徴量フレームから (X, y) を作る（y は horizon 本先の終値。末尾の未確定分は落とす）。
+    """
+    df = df_feat.copy()
+    df["target"] = make_price_target(df, horizon=horizon)
+    df = df.dropna()
+
+    feature_cols = [
+        col for col in df.columns
+        if col not in ["target", "open_time"]
+    ]
+    return df[feature_cols], df["target"]
 
-    path = RAW_DIR / f"{symbol}_{interval}.csv"
 
-    if not path.exists():
-        print(f"[SKIP] {symbol} {interval} (CSV not found)")
-        return
+# =====================
+# Train One
+# =====================
 
-    df = pd.read_csv(path)
+def train_price_model(symbol: str, interval: str, horizon: int = 1, df_feat=None, n_jobs: int = -1,
+                      force: bool = False):
+    """
+    df_feat を渡した場合（feature_panel で一括計算済み）は読み込みと特徴量計算を省く。
+    n_jobs は RandomForest の並列数（train_pool から呼ぶときはプロセスごとの割り当て分）。
+    入力が前回の学習から変わっていなければスキップする（train_fingerprint。force で無視）。
+
+    Returns:
+        保存したモデルのパス（スキップ時は None）
+    """
+    if df_feat is None:
+        if not has_klines(symbol, interval):
+            print(f"[SKIP] {symbol} {interval} (klines not found)")
+            return
+
+        df_feat = load_features(symbol, interval)
+    else:
+        df_feat = df_feat.copy()
 
-    df_feat = make_features(df)
-    df_feat["target"] = make_price_target(df_feat, horizon=horizon)
-    df_feat = df_feat.dropna()
+    model_path = MODEL_DIR / f"{symbol}_{interval}_price_h{horizon}.pkl"
+    fp = train_fingerprint.fingerprint("price", interval, horizon, PRICE_PARAMS, df_feat)
+    train, reason = train_fingerprint.should_train(model_path, fp, force)
+    if not train:
+        print(f"[SKIP] {symbol} {interval} price h{horizon} ({reason})")
+        return
+
+    X, y = price_dataset(df_feat, horizon)
 
     # --- 修正箇所: 時間軸(interval)に応じて最低必要行数を可変にする ---
     # 週足(1w)はデータ密度が低いため、20行（約5ヶ月分）あれば学習を許可する。
     # 日足(1d)・時間足(1h)は、精度担保のため従来の150行を維持。
     min_data_rows = 20 if interval == "1w" else 150
 
-    if len(df_feat) < min_data_rows:
-        print(f"[SKIP] {symbol} {interval} (data too small: {len(df_feat)} < {min_data_rows})")
+    if len(X) < min_data_rows:
+        print(f"[SKIP] {symbol} {interval} (data too small: {len(X)} < {min_data_rows})")
         return
     # -------------------------------------------------------------
 
-    feature_cols = [
-        col for col in df_feat.columns
-        if col not in ["target", "open_time"]
-    ]
-
-    X = df_feat[feature_cols]
-    y = df_feat["target"]
-
-    model = RandomForestRegressor(
-        n_estimators=300,
-        max_depth=6,
-        random_state=42,
-        n_jobs=-1
-    )
+    model = RandomForestRegressor(**PRICE_PARAMS, n_jobs=n_jobs)
 
     model.fit(X, y)
 
-    model_path = MODEL_DIR / f"{symbol}_{interval}_price_h{horizon}.pkl"
-    joblib.dump(model, model_path)
+    model_registry.dump(model, model_path)
+    train_fingerprint.save(model_path, fp)
+    model_registry.register(model_path, metrics={"rows": len(X)})
 
     print(f"[OK] saved {model_path.name}")
+    return model_path
 
 
 # =====================
@@ -75,21 +103,20 @@ def train_price_model(symbol: str, interval: str, horizon: int = 1):
 
 def main():
 
-    files = [f for f in os.listdir(RAW_DIR) if f.endswith(".csv")]
+    series = [
+        (symbol, interval)
+        for interval in ["1h", "1d", "1w"]
+        for symbol in list_symbols(interval)
+    ]
 
-    print(f"Found {len(files)} CSV files\n")
+    print(f"Found {len(series)} kline series\n")
 
-    for file in files:
+    for symbol, interval in series:
         try:
-            name = file.replace(".csv", "")
-            # ファイル名が symbol_interval.csv であることを想定
-            if "_" not in name: continue
-            
-            symbol, interval = name.rsplit("_", 1)
             train_price_model(symbol, interval, horizon=1)
 
         except Exception as e:
-            print(f"[ERROR] {file} -> {e}")
+            print(f"[ERROR] {symbol}_{interval} -> {e}")
 
     print("\nPrice training completed.")
 
@@ -1,27 +1,17 @@
 from datetime import datetime
 from ai.src.market_cap import get_supported
-from ai.src.fetch_data import fetch_klines
+from ai.src.kline_sync import sync_klines
 from ai.src.train_price import train_price_model
 from ai.src.train_direction import train_direction_model
-import os
 
-RAW_DIR = "ai/data/raw"
-
-INTERVALS = {
-    "1h": 1000,
-    "1d": 1000,
-}
+INTERVALS = ["1h", "1d"]
 
 HORIZONS = [1, 7]
 
 
-def ensure_csv(symbol, interval, limit):
-    path = f"{RAW_DIR}/{symbol}_{interval}.csv"
-    if os.path.exists(path):
-        return
-    df = fetch_klines(symbol, interval, limit)
-    df.to_csv(path, index=False)
-    print(f"[FETCH] {path}")
+def ensure_csv(symbol, interval):
+    # 未取得なら直近 1000 本、あればウォーターマークからの差分（kline_sync）
+    sync_klines([symbol], interval)
 
 
 def main():
@@ -34,8 +24,8 @@ def main():
 
     for c in coins:
         symbol = c["symbol"]
-        for interval, limit in INTERVALS.items():
-            ensure_csv(symbol, interval, limit)
+        for interval in INTERVALS:
+            ensure_csv(symbol, interval)
 
             for h in HORIZONS:
                 print(f"[TRAIN] {symbol} {interval} h={h}")
@@ -0,0 +1,243 @@
+# ai/src/universe.py
+#
+# 銘柄ユニバースのスナップショット（exchangeInfo / 24h ticker / CoinGecko markets）。
+#
+# - 上流ごとに TTL を持ち、TTL 内は再取得しない（プロセスをまたいで flock で1回に制限）
+# - ETag / Last-Modified による条件付きリクエスト（304 なら本体を再取得しない）
+# - 必要な項目だけに絞ったコンパクトな形で ai/data/universe/{name}.json に保存
+# - 読み込みはプロセス内でメモリに保持し、ファイルの mtime が変わったときだけ読み直す
+#
+# ジョブは refresh()/get(..., allow_fetch=True) で更新し、API は allow_fetch=False で
+# ディスク上のスナップショットだけを読む（リクエスト中にネットワークへ出ない）。
+
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from ai.src.api_endpoints import BINANCE_API_URL, COINGECKO_API_URL
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+UNIVERSE_DIR = BASE_DIR / "ai" / "data" / "universe"
+
+
+# =====================
+# Compact forms
+# =====================
+
+def _compact_exchange_info(data):
+    return {
+        s["symbol"]: {
+            "base": s["baseAsset"],
+            "quote": s["quoteAsset"],
+            "status": s["status"],
+        }
+        for s in data["symbols"]
+    }
+
+
+def _compact_ticker_24h(data):
+    def num(v):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return 0.0
+
+    return {
+        t["symbol"]: {
+            "last_price": num(t.get("lastPrice")),
+            "quote_volume": num(t.get("quoteVolume")),
+            "price_change_pct": num(t.get("priceChangePercent")),
+        }
+        for t in data
+    }
+
+
+def _compact_coingecko_markets(data):
+    keys = ["id", "symbol", "name", "image", "current_price", "market_cap", "market_cap_rank"]
+    return [{k: c.get(k) for k in keys} for c in data]
+
+
+SOURCES = {
+    "exchange_info": {
+        "url": f"{BINANCE_API_URL}/api/v3/exchangeInfo",
+        "params": None,
+        "ttl": 6 * 60 * 60,
+        "compact": _compact_exchange_info,
+    },
+    "ticker_24h": {
+        "url": f"{BINANCE_API_URL}/api/v3/ticker/24hr",
+        "params": None,
+        "ttl": 10 * 60,
+        "compact": _compact_ticker_24h,
+    },
+    "coingecko_markets": {
+        "url": f"{COINGECKO_API_URL}/api/v3/coins/markets",
+        "params": {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": 300,
+            "page": 1,
+        },
+        "ttl": 12 * 60 * 60,
+        "compact": _compact_coingecko_markets,
+    },
+}
+
+
+# =====================
+# Disk
+# =====================
+
+def snapshot_path(name: str) -> Path:
+    return UNIVERSE_DIR / f"{name}.json"
+
+
+def _read(name: str) -> dict | None:
+    path = snapshot_path(name)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _write(name: str, snapshot: dict):
+    path = snapshot_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(snapshot, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def _is_fresh(snapshot: dict | None, ttl: float) -> bool:
+    return snapshot is not None and time.time() - snapshot["fetched_at"] < ttl
+
+
+# =====================
+# Fetch
+# =====================
+
+def refresh(name: str, force: bool = False) -> dict:
+    """
+    TTL 切れなら上流から取得してスナップショットを更新する。
+    同時に複数プロセスが呼んでも取得は1回だけ。
+    """
+    source = SOURCES[name]
+    UNIVERSE_DIR.mkdir(parents=True, exist_ok=True)
+
+    with open(UNIVERSE_DIR / f".{name}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        snapshot = _read(name)
+        if not force and _is_fresh(snapshot, source["ttl"]):
+            return snapshot
+
+        headers = {}
+        if snapshot is not None:
+            if snapshot.get("etag"):
+                headers["If-None-Match"] = snapshot["etag"]
+            if snapshot.get("last_modified"):
+                headers["If-Modified-Since"] = snapshot["last_modified"]
+
+        r = requests.get(source["url"], params=source["params"], headers=headers, timeout=30)
+
+        if r.status_code == 304 and snapshot is not None:
+            snapshot["fetched_at"] = time.time()
+            _write(name, snapshot)
+            print(f"[UNIVERSE] {name}: not modified")
+            return snapshot
+
+        r.raise_for_status()
+
+        snapshot = {
+            "fetched_at": time.time(),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "data": source["compact"](r.json()),
+        }
+        _write(name, snapshot)
+        print(f"[UNIVERSE] {name}: refreshed ({len(snapshot['data'])} entries)")
+        return snapshot
+
+
+# =====================
+# In-memory access
+# =====================
+
+_lock = threading.Lock()
+_memory: dict[str, dict] = {}
+
+
+def _load(name: str, allow_fetch: bool) -> dict:
+    if allow_fetch:
+        snapshot = _read(name)
+        if not _is_fresh(snapshot, SOURCES[name]["ttl"]):
+            refresh(name)
+
+    path = snapshot_path(name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"Universe snapshot not found: {name}. "
+            f"Run python -m ai.src.universe first."
+        )
+
+    entry = _memory.get(name)
+    if entry is not None and entry["mtime"] == mtime:
+        return entry
+
+    with _lock:
+        entry = {"mtime": mtime, "snapshot": _read(name), "index": {}}
+        _memory[name] = entry
+        return entry
+
+
+def get(name: str, allow_fetch: bool = False):
+    """
+    スナップショットのデータ部分を返す（メモリ上の共有オブジェクトなので変更しないこと）。
+    """
+    return _load(name, allow_fetch)["snapshot"]["data"]
+
+
+def _indexed(name: str, key: str, build, allow_fetch: bool):
+    entry = _load(name, allow_fetch)
+    if key not in entry["index"]:
+        entry["index"][key] = build(entry["snapshot"]["data"])
+    return entry["index"][key]
+
+
+def usdt_trading_symbols(allow_fetch: bool = False) -> frozenset[str]:
+    return _indexed(
+        "exchange_info",
+        "usdt_trading",
+        lambda data: frozenset(
+            s for s, info in data.items()
+            if info["status"] == "TRADING" and info["quote"] == "USDT" and s.endswith("USDT")
+        ),
+        allow_fetch,
+    )
+
+
+def coingecko_markets(allow_fetch: bool = False) -> list[dict]:
+    return get("coingecko_markets", allow_fetch)
+
+
+def tickers_24h(allow_fetch: bool = False) -> dict:
+    return get("ticker_24h", allow_fetch)
+
+
+def main():
+    for name in SOURCES:
+        try:
+            refresh(name)
+        except Exception as e:
+            print(f"[ERROR] {name}: {e}")
+
+
+if __name__ == "__main__":
+    main()
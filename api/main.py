@@ -1,4 +1,6 @@
 import json
+import os
+import threading
 import traceback
 from pathlib import Path
 from datetime import datetime, timezone
@@ -8,9 +10,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 
-from ai.src.predict import predict
+from ai.src.predict import cache_stats, predict, warm_up
 from ai.src.dto import build_prediction_dto
 from ai.src.market_cap import get_supported
+from ai.src.quote_aggregator import get_quotes, venue_stats
 from ai.src.repository.db import get_connection
 
 
@@ -24,6 +27,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 CACHE_DIR = BASE_DIR / "ai" / "data" / "cache"
 LOG_DIR = BASE_DIR / "logs"
 
+# 起動時に読み込んでおくモデル（時価総額上位 N 銘柄の 1h / horizon 1。0 なら読み込まない）
+MODEL_WARMUP_TOP = int(os.getenv("MODEL_WARMUP_TOP", "0"))
+
 templates = Jinja2Templates(
     directory=str(BASE_DIR / "api" / "templates")
 )
@@ -35,6 +41,22 @@ app.mount(
 )
 
 
+@app.on_event("startup")
+def warm_model_cache():
+    if MODEL_WARMUP_TOP <= 0:
+        return
+
+    def run():
+        try:
+            loaded = warm_up(MODEL_WARMUP_TOP)
+            print(f"[WARMUP] {loaded} models loaded ({cache_stats()['bytes'] / 1e6:.0f} MB)")
+        except Exception as e:
+            print(f"[WARMUP] failed: {e}")
+
+    # リクエストの受付を待たせないように裏で読む
+    threading.Thread(target=run, daemon=True).start()
+
+
 # =====================
 # SEO helper
 # =====================
@@ -250,6 +272,29 @@ def api_market_overview(interval: str = Query("1h"), limit: int = Query(20, ge=1
         return {"items": data.get("items", [])[:limit], "meta": data.get("meta", {})}
     except Exception as e: return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.get("/api/live-price")
+def api_live_price(symbols: str = Query(..., description="Comma separated, e.g. BTCUSDT,ETHUSDT")):
+    try: return {"items": get_quotes([s.strip().upper() for s in symbols.split(",") if s.strip()][:300]), "meta": {"venues": venue_stats()}}
+    except Exception as e: return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/api/model-cache")
+def api_model_cache():
+    return cache_stats()
+
+@app.get("/api/kline-gaps")
+def api_kline_gaps():
+    path = CACHE_DIR / "kline_gaps.json"
+    if not path.exists(): return JSONResponse(status_code=503, content={"error": "Kline gap metrics not ready"})
+    try: return json.loads(path.read_text())
+    except Exception as e: return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/api/model-store")
+def api_model_store():
+    path = CACHE_DIR / "model_store.json"
+    if not path.exists(): return JSONResponse(status_code=503, content={"error": "Model store usage not ready"})
+    try: return json.loads(path.read_text())
+    except Exception as e: return JSONResponse(status_code=500, content={"error": str(e)})
+
 @app.get("/accuracy")
 def get_accuracy(symbol: str = Query(...), interval: str = Query("1h")):
     path = CACHE_DIR / f"market_overview_{interval}.json"
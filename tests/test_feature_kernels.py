@@ -0,0 +1,109 @@
+# tests/test_feature_kernels.py
+#
+# NumPy カーネル（ai.src.feature_kernels）と pandas の基準実装の一致。
+# 基準は feature_bench と同じ: 同じ行・列・dtype で、値は相対誤差 RTOL（同値の窓の std は ATOL）以内。
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai.src import feature_kernels as K
+from ai.src.feature_bench import ATOL, RTOL, synthetic_klines
+from ai.src.features import make_features
+
+
+def assert_backends_match(df, tail=None):
+    a = make_features(df, tail=tail, backend="pandas")
+    b = make_features(df, tail=tail, backend="numpy")
+    pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=RTOL, atol=ATOL)
+    return a
+
+
+@pytest.mark.parametrize("n", [0, 1, 19, 21, 60, 700, 5000])
+@pytest.mark.parametrize("seed", range(3))
+def test_synthetic(n, seed):
+    assert_backends_match(synthetic_klines(n, seed))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_tail(seed):
+    assert_backends_match(synthetic_klines(3000, seed), tail=64)
+
+
+def test_nan_rows():
+    df = synthetic_klines(600, 1)
+    df.loc[100, "close"] = np.nan
+    df.loc[250:253, ["close", "volume"]] = np.nan
+    df.loc[400, "volume"] = np.nan
+    df.loc[590:, "close"] = np.nan
+    out = assert_backends_match(df)
+
+    # NaN の行と、それを窓に含む行は落ちる（EMA は NaN をまたいで続く）
+    assert not out.index.isin([100, 250, 253, 400]).any()
+    assert out.index.isin(range(300, 400)).any()
+
+
+def test_zero_volume():
+    df = synthetic_klines(600, 2)
+    df.loc[100:130, "volume"] = 0
+    df.loc[300, "volume"] = 0
+    out = assert_backends_match(df)
+
+    # 0 → 0 は 0/0、0 → 正は inf で、どちらも NaN として落ちる
+    assert not out.index.isin([101, 131, 301]).any()
+    assert (out["volume_ma"] >= 0).all()
+
+
+@pytest.mark.parametrize("close", [np.linspace(100, 130, 40), np.full(40, 100.0)], ids=["rising", "flat"])
+def test_rsi_without_losses(close):
+    # 14 本の下落が 0（avg_loss == 0）の RSI は NaN にして行ごと落とす
+    df = synthetic_klines(400, 3)
+    df.loc[200:239, "close"] = close
+    out = assert_backends_match(df)
+    assert not out.index.isin(range(214, 240)).any()
+    assert out.index.isin(range(240, 400)).any()
+
+
+def test_all_nan():
+    df = synthetic_klines(100, 0)
+    df[["close", "volume"]] = np.nan
+    assert assert_backends_match(df).empty
+
+
+# =====================
+# Kernels
+# =====================
+
+def _with_nan(n, seed):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(100, 5, n)
+    x[rng.random(n) < 0.05] = np.nan
+    x[:3] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_kernels_with_nan(seed):
+    x = _with_nan(500, seed)
+    s = pd.Series(x)
+
+    for periods in (1, 3, 6):
+        np.testing.assert_allclose(K.pct_change(x, periods), s.pct_change(periods), rtol=RTOL)
+    np.testing.assert_allclose(K.diff(x), s.diff(), rtol=RTOL)
+    for window in (5, 14, 20):
+        np.testing.assert_allclose(K.rolling_mean(x, window), s.rolling(window).mean(), rtol=RTOL)
+        np.testing.assert_allclose(K.rolling_std(x, window), s.rolling(window).std(), rtol=RTOL, atol=ATOL)
+    for span in (20, 50):
+        np.testing.assert_allclose(K.ewm_mean(x, span), s.ewm(span=span, adjust=False).mean(), rtol=RTOL)
+
+
+def test_ewm_panel():
+    # パネル（銘柄 × 時間）: 左詰めの NaN、途中の NaN、全部 NaN の行
+    rng = np.random.default_rng(0)
+    x = rng.normal(100, 5, (4, 300))
+    x[1, 50:60] = np.nan
+    x[2, :30] = np.nan
+    x[3] = np.nan
+    out = K.ewm_mean(x, 50)
+    for row, expected in zip(out, x):
+        np.testing.assert_allclose(row, pd.Series(expected).ewm(span=50, adjust=False).mean(), rtol=RTOL)
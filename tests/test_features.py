@@ -0,0 +1,72 @@
+# tests/test_features.py
+#
+# tail モード（推論用）の make_features が全履歴で計算した同じ行と一致するか。
+# 基準は feature_lookback の定義どおり |差| <= EMA_TOLERANCE * close（EMA 以外の列は丸め誤差程度まで）。
+
+import numpy as np
+import pytest
+
+from ai.src.feature_bench import ATOL, TAIL_RTOL, synthetic_klines
+from ai.src.features import (
+    EMA_COLUMNS,
+    EMA_SPANS,
+    EMA_TOLERANCE,
+    FEATURE_COLUMNS,
+    feature_lookback,
+    make_features,
+)
+
+
+TAIL = 64
+
+
+def assert_tail_matches(df, backend):
+    t = make_features(df, tail=TAIL, backend=backend)
+    full = make_features(df, backend=backend)
+
+    # 全履歴の末尾 TAIL 本のうち特徴量が揃った行と同じ行が返る
+    expected = full[full.index.isin(df.index[-TAIL:])]
+    assert t.index.equals(expected.index)
+    assert list(t.columns) == list(expected.columns)
+    assert set(FEATURE_COLUMNS) <= set(t.columns)
+
+    close = np.abs(expected["close"].to_numpy(dtype=np.float64))
+    for col in t.columns:
+        x = t[col].to_numpy(dtype=np.float64)
+        y = expected[col].to_numpy(dtype=np.float64)
+        err = np.abs(x - y)
+        assert (err <= EMA_TOLERANCE * close).all(), f"{col}: max err {(err / close).max():.3g} of close"
+        if col not in EMA_COLUMNS:
+            np.testing.assert_allclose(x, y, rtol=TAIL_RTOL, atol=ATOL, err_msg=col)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+@pytest.mark.parametrize("interval", ["1h", "1d"])
+@pytest.mark.parametrize("seed", range(3))
+def test_tail_matches_full_history(interval, seed, backend):
+    df = synthetic_klines(5000, seed, interval)
+    assert_tail_matches(df, backend)
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+@pytest.mark.parametrize("interval", ["1h", "1d"])
+def test_tail_shorter_than_lookback(interval, backend):
+    # 履歴が feature_lookback() より短いときは tail でも全履歴と同じ計算になる
+    df = synthetic_klines(feature_lookback() - 1, 0, interval)
+    assert_tail_matches(df, backend)
+
+    t = make_features(df, tail=TAIL, backend=backend)
+    full = make_features(df, backend=backend)
+    np.testing.assert_array_equal(t.to_numpy(dtype=np.float64), full.tail(TAIL).to_numpy(dtype=np.float64))
+
+
+@pytest.mark.parametrize("backend", ["pandas", "numpy"])
+def test_tail_longer_than_history(backend):
+    df = synthetic_klines(TAIL // 2, 0)
+    assert make_features(df, tail=TAIL, backend=backend).index.equals(make_features(df, backend=backend).index)
+
+
+def test_lookback_covers_ema_tolerance():
+    # 開始時点のずれが価格の 100% でも、2本の EMA の誤差の和が EMA_TOLERANCE に収まる
+    k = feature_lookback()
+    assert sum((1 - 2 / (span + 1)) ** k for span in EMA_SPANS.values()) <= EMA_TOLERANCE
@@ -0,0 +1,118 @@
+# tests/test_flat_forest.py
+#
+# .forest（ai.src.flat_forest）に書き出して読み直したモデルと sklearn の予測が一致するか。
+# 学習・推論とも n_jobs=1 なので木の足し合わせの順序も同じで、値は完全に一致する。
+
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from ai.src import flat_forest
+from ai.src.features import FEATURE_COLUMNS
+from ai.src.horizon_models import HorizonGroups, MultiHorizonModel, horizon_groups
+from ai.src.train_joint import fit_calibration
+
+
+N_ROWS = 400
+PARAMS = {"n_estimators": 20, "max_depth": 6, "random_state": 42, "n_jobs": 1}
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(N_ROWS, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    X.iloc[rng.random(N_ROWS) < 0.05, 2] = np.nan  # 欠損値の分岐（missing_left）も通す
+    signal = X["return"].to_numpy() + 0.5 * X["rsi"].to_numpy()
+    return X, signal
+
+
+def rows(model, X):
+    # 学習に使った行・しきい値の前後を突く行・欠損値を含む行
+    probe = pd.DataFrame(flat_forest.probe_rows(model), columns=X.columns)
+    probe.iloc[::7, 2] = np.nan
+    return pd.concat([X, probe], ignore_index=True)
+
+
+def export(model, tmp_path, name):
+    path = tmp_path / f"TESTUSDT_1h_{name}.pkl"
+    joblib.dump(model, path)
+    flat_forest.export(path, check=False)
+    return flat_forest.load_artifact(path)
+
+
+def test_regressor(data, tmp_path):
+    X, signal = data
+    model = RandomForestRegressor(**PARAMS).fit(X, 100 + signal)
+    flat = export(model, tmp_path, "price_h1")
+
+    assert isinstance(flat, flat_forest.FlatForest)
+    assert list(flat.feature_names_in_) == FEATURE_COLUMNS
+    Xp = rows(model, X)
+    np.testing.assert_array_equal(flat.predict(Xp), model.predict(Xp))
+
+
+def test_calibrated_classifier(data, tmp_path):
+    X, signal = data
+    y = (signal > 0).astype(int)
+    model = CalibratedClassifierCV(RandomForestClassifier(**PARAMS), method="sigmoid", cv=3).fit(X, y)
+    flat = export(model, tmp_path, "direction_h1")
+
+    assert isinstance(flat, flat_forest.FlatCalibrated)
+    np.testing.assert_array_equal(flat.classes_, model.classes_)
+    Xp = rows(model, X)
+    np.testing.assert_array_equal(flat.predict_proba(Xp), model.predict_proba(Xp))
+    np.testing.assert_array_equal(flat.predict(Xp), model.predict(Xp))
+
+
+def _joint(X, signal, horizons):
+    # train_joint.fit_group と同じ構成（多出力の森と末尾の行でのシグモイド較正）を小さく作る
+    Y_price = np.column_stack([100 + np.roll(signal, -h) for h in horizons])
+    Y_dir = np.column_stack([np.sign(np.roll(signal, -h)).astype(int) for h in horizons])
+    y_price = Y_price[:, 0] if len(horizons) == 1 else Y_price
+    y_dir = Y_dir[:, 0] if len(horizons) == 1 else Y_dir
+
+    price = RandomForestRegressor(**PARAMS).fit(X, y_price)
+    direction = RandomForestClassifier(**PARAMS).fit(X, y_dir)
+    calib = fit_calibration(direction, X.iloc[-100:], Y_dir[-100:])
+    return MultiHorizonModel(horizons, price, direction, calib)
+
+
+def test_joint_groups(data, tmp_path):
+    X, signal = data
+    horizons = [1, 2, 3, 4, 5]
+    model = HorizonGroups([_joint(X, signal, g) for g in horizon_groups(horizons)])
+    flat = export(model, tmp_path, "joint")
+
+    assert isinstance(flat, HorizonGroups)
+    assert [g.horizons for g in flat.groups] == [g.horizons for g in model.groups]
+    Xp = rows(model, X)
+    for g, flat_g in zip(model.groups, flat.groups, strict=True):
+        np.testing.assert_array_equal(flat_g.predict_prices(Xp), g.predict_prices(Xp))
+        for i in range(len(g.horizons)):
+            np.testing.assert_array_equal(flat_g.direction_classes(i), g.direction_classes(i))
+            np.testing.assert_array_equal(flat_g.predict_direction_proba(Xp, i), g.predict_direction_proba(Xp, i))
+
+    for h in horizons:
+        np.testing.assert_array_equal(flat.price_model(h).predict(Xp), model.price_model(h).predict(Xp))
+        np.testing.assert_array_equal(
+            flat.direction_model(h).predict_proba(Xp), model.direction_model(h).predict_proba(Xp)
+        )
+
+
+def test_stale_forest_falls_back_to_pkl(data, tmp_path):
+    # pkl の方が新しい .forest は使わない
+    X, signal = data
+    model = RandomForestRegressor(**PARAMS).fit(X, signal)
+    path = tmp_path / "TESTUSDT_1h_price_h1.pkl"
+    joblib.dump(model, path)
+    flat_forest.export(path, check=False)
+    joblib.dump(model, path)
+    forest = flat_forest.flat_path(path)
+    stat = path.stat()
+    os.utime(forest, ns=(stat.st_atime_ns, stat.st_mtime_ns - 1))
+    assert isinstance(flat_forest.load_artifact(path), RandomForestRegressor)